@@ -0,0 +1,50 @@
+import xlsxwriter
+
+from .media import ensure_media_dir
+from .media import media_path
+from .media import unique_filename
+
+
+class ReportWriter:
+    """
+    Writes an excel report into a new file in the media directory. The workbook is written
+    in constant memory mode, so rows must be written in ascending order and column widths
+    must be set before the first row is written. Use as a context manager:
+
+        with ReportWriter("report") as report:
+            sheet = report.add_worksheet(widths=[100, 80])
+            report.write_row(sheet, 0, ["Name", "Count"], report.format(bold=True))
+        serve_media(report.filename, "application/xlsx", delete=True)
+    """
+
+    def __init__(self, name):
+        ensure_media_dir()
+        self.filename = unique_filename(name, "xlsx")
+        self.workbook = xlsxwriter.Workbook(media_path(self.filename), {"constant_memory": True})
+        self.formats = {}
+
+    def format(self, **properties):
+        """Returns the cell format with the given properties, formats are only added once."""
+        key = tuple(sorted(properties.items()))
+        if key not in self.formats:
+            self.formats[key] = self.workbook.add_format(properties)
+        return self.formats[key]
+
+    def add_worksheet(self, name=None, widths=()):
+        """Add a worksheet and set the widths of its columns in pixels."""
+        worksheet = self.workbook.add_worksheet(name)
+        for col, width in enumerate(widths):
+            worksheet.set_column_pixels(col, col, width)
+        return worksheet
+
+    def write_row(self, worksheet, row, values, cell_format=None):
+        worksheet.write_row(row, 0, values, cell_format)
+
+    def close(self):
+        self.workbook.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
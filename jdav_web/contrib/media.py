@@ -1,4 +1,5 @@
 import os
+import uuid
 from wsgiref.util import FileWrapper
 
 from django import template
@@ -23,9 +24,15 @@ def media_dir():
     return os.path.join(settings.MEDIA_ROOT, "memberlists")
 
 
-def serve_media(filename, content_type):
+def unique_filename(name, extension):
+    """Returns a filename starting with `name`, which is not used by any other request."""
+    return f"{name}_{uuid.uuid4().hex[:8]}.{extension}"
+
+
+def serve_media(filename, content_type, delete=False):
     """
-    Serve the media file with the given `filename` as an HTTP response.
+    Serve the media file with the given `filename` as an HTTP response. If `delete` is set,
+    the file is removed once it is read, use this for files generated for a single request.
     """
     with open(media_path(filename), "rb") as f:
         response = HttpResponse(FileWrapper(f))
@@ -36,6 +43,8 @@ def serve_media(filename, content_type):
             if content_type == "application/pdf"
             else "attachment; filename=" + filename
         )
+    if delete:
+        os.remove(media_path(filename))
 
     return response
 
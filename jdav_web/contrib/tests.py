@@ -1,8 +1,12 @@
+import os
 from datetime import timedelta
 from unittest.mock import Mock
 from unittest.mock import patch
 
 from contrib.admin import CommonAdminMixin
+from contrib.excel import ReportWriter
+from contrib.media import media_path
+from contrib.media import serve_media
 from contrib.models import CommonModel
 from contrib.rules import has_global_perm
 from django.contrib import admin
@@ -263,3 +267,30 @@ class UtilsTestCase(TestCase):
         # Dates should be consecutive weeks
         self.assertEqual(result[1] - result[0], timedelta(days=7))
         self.assertEqual(result[2] - result[1], timedelta(days=7))
+
+
+class ReportWriterTestCase(TestCase):
+    def test_unique_filenames(self):
+        with ReportWriter("report") as first, ReportWriter("report") as second:
+            first.write_row(first.add_worksheet(widths=[100]), 0, ["a", 1])
+            second.add_worksheet()
+        self.assertNotEqual(first.filename, second.filename)
+        self.assertTrue(first.filename.startswith("report_"))
+        self.assertTrue(os.path.exists(media_path(first.filename)))
+        os.remove(media_path(first.filename))
+        os.remove(media_path(second.filename))
+
+    def test_format_cache(self):
+        report = ReportWriter("report")
+        self.assertIs(report.format(bold=True, border=1), report.format(border=1, bold=True))
+        self.assertIsNot(report.format(bold=True), report.format(bold=True, border=1))
+        report.close()
+        os.remove(media_path(report.filename))
+
+    def test_serve_and_delete(self):
+        with ReportWriter("report") as report:
+            report.write_row(report.add_worksheet(), 0, ["a"])
+        response = serve_media(report.filename, "application/xlsx", delete=True)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.content.startswith(b"PK"))
+        self.assertFalse(os.path.exists(media_path(report.filename)))
@@ -16,7 +16,7 @@ from django.shortcuts import render
 from django.urls import reverse
 from django.utils.safestring import mark_safe
 from django.utils.translation import gettext_lazy as _
-from members.pdf import render_tex_with_attachments
+from members.documents import serve_document
 from utils import get_member
 
 from .models import Bill
@@ -56,13 +56,34 @@ class BillOnStatementInline(CommonAdminInlineMixin, admin.TabularInline):
 class StatementAdmin(ExtraButtonsMixin, CommonAdminMixin, admin.ModelAdmin):
     documentation_url = "user_manual/finance.html"
     fields = ["short_description", "explanation", "excursion", "status"]
-    list_display = ["__str__", "total_pretty", "created_by", "submitted_date", "status_badge"]
+    list_display = [
+        "__str__",
+        "total_pretty",
+        "is_valid",
+        "created_by",
+        "submitted_date",
+        "status_badge",
+    ]
+    list_select_related = ["excursion", "created_by"]
     list_filter = ["status"]
     search_fields = ("excursion__name", "short_description")
     ordering = ["-submitted_date"]
     inlines = [BillOnStatementInline]
     list_per_page = 25
 
+    def total_pretty(self, obj):
+        # use the persisted summary to avoid calculating the total for every row
+        return "{}€".format(obj.summary_total)
+
+    total_pretty.short_description = _("Total")
+    total_pretty.admin_order_field = "summary_total"
+
+    def is_valid(self, obj):
+        return obj.summary_validity == Statement.VALID
+
+    is_valid.boolean = True
+    is_valid.short_description = _("Ready to confirm")
+
     def has_change_permission(self, request, obj=None):
         if obj is None:
             return super().has_change_permission(request)
@@ -164,17 +185,18 @@ class StatementAdmin(ExtraButtonsMixin, CommonAdminMixin, admin.ModelAdmin):
 
         if statement.excursion:
             memberlist = statement.excursion
-            context = dict(
-                self.admin_site.each_context(request),
-                title=_("Finance overview"),
-                opts=self.opts,
-                memberlist=memberlist,
-                object=memberlist,
-                ljp_contributions=memberlist.payable_ljp_contributions,
-                total_relative_costs=memberlist.total_relative_costs,
-                **memberlist.statement.template_context(),
-            )
-            return render(request, "admin/freizeit_finance_overview.html", context=context)
+            with memberlist.statement.calculating():
+                context = dict(
+                    self.admin_site.each_context(request),
+                    title=_("Finance overview"),
+                    opts=self.opts,
+                    memberlist=memberlist,
+                    object=memberlist,
+                    ljp_contributions=memberlist.payable_ljp_contributions,
+                    total_relative_costs=memberlist.total_relative_costs,
+                    **memberlist.statement.template_context(),
+                )
+                return render(request, "admin/freizeit_finance_overview.html", context=context)
         else:
             context = dict(
                 self.admin_site.each_context(request),
@@ -368,19 +390,20 @@ class StatementAdmin(ExtraButtonsMixin, CommonAdminMixin, admin.ModelAdmin):
                     args=(statement.pk,),
                 )
             )
-        context = dict(
-            self.admin_site.each_context(request),
-            title=_("View submitted statement"),
-            view_header=_("Overview"),
-            opts=self.opts,
-            statement=statement,
-            object=statement,
-            settings=settings,
-            transaction_issues=statement.transaction_issues,
-            **statement.template_context(),
-        )
+        with statement.calculating():
+            context = dict(
+                self.admin_site.each_context(request),
+                title=_("View submitted statement"),
+                view_header=_("Overview"),
+                opts=self.opts,
+                statement=statement,
+                object=statement,
+                settings=settings,
+                transaction_issues=statement.transaction_issues,
+                **statement.template_context(),
+            )
 
-        return render(request, "admin/overview_submitted_statement.html", context=context)
+            return render(request, "admin/overview_submitted_statement.html", context=context)
 
     @extra_button(
         _("Reduce transactions"),
@@ -455,18 +478,7 @@ class StatementAdmin(ExtraButtonsMixin, CommonAdminMixin, admin.ModelAdmin):
                     args=(statement.pk,),
                 )
             )
-        excursion = statement.excursion
-        context = dict(
-            statement=statement.template_context(), excursion=excursion, settings=settings
-        )
-
-        pdf_filename = (
-            f"{excursion.code}_{excursion.name}_Zuschussbeleg" if excursion else "Abrechnungsbeleg"
-        )
-        attachments = [bill.proof.path for bill in statement.bills_covered if bill.proof]
-        return render_tex_with_attachments(
-            pdf_filename, "finance/statement_summary.tex", context, attachments
-        )
+        return serve_document(request, "statement_summary", statement)
 
     statement_summary_view.short_description = _("Download summary")
 
@@ -6,3 +6,6 @@ class FinanceConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "finance"
     verbose_name = _("Finance")
+
+    def ready(self):
+        from . import signals  # noqa: F401
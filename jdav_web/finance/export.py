@@ -0,0 +1,170 @@
+import csv
+import logging
+import os
+import re
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from itertools import groupby
+
+import django
+import xlsxwriter
+from contrib.media import media_path
+from django.db import connections
+from members.pdf import build_sandbox
+from members.pdf import publish
+from utils import normalize_filename
+
+from .models import Statement
+from .models import Transaction
+
+TRANSACTION_FIELDS = [
+    "ledger",
+    "paid_on",
+    "statement",
+    "recipient",
+    "iban",
+    "reference",
+    "amount",
+]
+
+# number of transactions fetched from the database at once
+CHUNK_SIZE = 2000
+
+logger = logging.getLogger(__name__)
+
+
+def confirmed_transactions(start, end):
+    """Returns all confirmed transactions paid between `start` and `end`, ordered by ledger."""
+    return (
+        Transaction.objects.filter(confirmed=True, confirmed_date__date__range=(start, end))
+        .select_related("ledger", "member", "statement")
+        .order_by("ledger__name", "ledger", "confirmed_date", "pk")
+    )
+
+
+def by_ledger(transactions):
+    """Iterate over the transactions in chunks and group them by ledger."""
+    return groupby(transactions.iterator(chunk_size=CHUNK_SIZE), lambda t: t.ledger)
+
+
+def transaction_row(ledger, trans):
+    return {
+        "ledger": ledger.name if ledger else "",
+        "paid_on": trans.confirmed_date.date().isoformat(),
+        "statement": str(trans.statement),
+        "recipient": trans.member.name,
+        "iban": trans.member.iban,
+        "reference": trans.reference,
+        "amount": trans.amount,
+    }
+
+
+def export_transactions_csv(transactions, file_handle):
+    """Write the transactions to `file_handle` as CSV, one block per ledger."""
+    writer = csv.DictWriter(file_handle, fieldnames=TRANSACTION_FIELDS)
+    writer.writeheader()
+    for ledger, group in by_ledger(transactions):
+        for trans in group:
+            writer.writerow(transaction_row(ledger, trans))
+
+
+def worksheet_name(ledger, used):
+    # excel restricts worksheet names to 31 characters without some special characters
+    base = re.sub(r"[\[\]:*?/\\]", "_", ledger.name if ledger else "-")[:28] or "-"
+    name, i = base, 1
+    while name.lower() in used:
+        name, i = f"{base}_{i}", i + 1
+    used.add(name.lower())
+    return name
+
+
+def export_transactions_xlsx(transactions, path):
+    """Write the transactions to an excel file at `path` with one worksheet per ledger."""
+    workbook = xlsxwriter.Workbook(path, {"constant_memory": True})
+    bold = workbook.add_format({"bold": True})
+    money = workbook.add_format({"num_format": "#,##0.00 €"})
+    bold_money = workbook.add_format({"bold": True, "num_format": "#,##0.00 €"})
+    used = set()
+    for ledger, group in by_ledger(transactions):
+        worksheet = workbook.add_worksheet(worksheet_name(ledger, used))
+        for col, field in enumerate(TRANSACTION_FIELDS[1:]):
+            worksheet.write(0, col, field, bold)
+        row, total = 0, 0
+        for trans in group:
+            row += 1
+            values = transaction_row(ledger, trans)
+            for col, field in enumerate(TRANSACTION_FIELDS[1:-1]):
+                worksheet.write(row, col, values[field])
+            worksheet.write_number(row, len(TRANSACTION_FIELDS) - 2, trans.amount, money)
+            total += trans.amount
+        worksheet.write(row + 1, 0, "total", bold)
+        worksheet.write_number(row + 1, len(TRANSACTION_FIELDS) - 2, total, bold_money)
+    if not used:
+        workbook.add_worksheet()
+    workbook.close()
+
+
+def _setup_worker():
+    django.setup()
+
+
+def _render_summary(statement_pk):
+    statement = Statement.objects.select_related("excursion").get(pk=statement_pk)
+    return statement.render_summary(save_only=True, unique=True)
+
+
+def render_summaries(statement_pks, workers=None):
+    """
+    Render the summaries of the given statements and yield the names of the created files
+    in the media directory in the order of `statement_pks`, each as soon as it is ready.
+    The summaries are compiled in a pool of `workers` processes, or in this process if
+    `workers` is 0.
+    """
+    if workers == 0:
+        for pk in statement_pks:
+            yield _render_summary(pk)
+        return
+    # database connections must not be shared with the worker processes
+    connections.close_all()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_setup_worker) as pool:
+        yield from pool.map(_render_summary, statement_pks)
+
+
+def year_end_export(start, end, summaries=False, workers=None):
+    """
+    Export all confirmed transactions paid between `start` and `end` as CSV and excel file
+    and optionally the summaries of the corresponding statements. Everything is packed into
+    one zip file in the media directory. Returns the name of the zip file and the pks of the
+    statements whose summaries could not be rendered and are therefore missing.
+    """
+    transactions = confirmed_transactions(start, end)
+    name = normalize_filename(f"Finanzexport_{start:%d_%m_%Y}-{end:%d_%m_%Y}", append_date=False)
+    filename_zip = name + ".zip"
+    missing = []
+    with build_sandbox() as build_dir:
+        path = os.path.join(build_dir, filename_zip)
+        with zipfile.ZipFile(path, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+            csv_path = os.path.join(build_dir, name + ".csv")
+            with open(csv_path, "w", encoding="utf-8", newline="") as f:
+                export_transactions_csv(transactions, f)
+            archive.write(csv_path, name + ".csv")
+
+            xlsx_path = os.path.join(build_dir, name + ".xlsx")
+            export_transactions_xlsx(transactions, xlsx_path)
+            archive.write(xlsx_path, name + ".xlsx")
+
+            if summaries:
+                statement_pks = list(
+                    transactions.order_by("statement")
+                    .values_list("statement", flat=True)
+                    .distinct()
+                )
+                for pk, filename in zip(statement_pks, render_summaries(statement_pks, workers)):
+                    if not os.path.exists(media_path(filename)):
+                        logger.error(f"Summary of statement {pk} could not be rendered.")
+                        missing.append(pk)
+                        continue
+                    archive.write(media_path(filename), f"summaries/{pk}_{filename}")
+                    os.remove(media_path(filename))
+        publish(path, filename_zip)
+    return filename_zip, missing
@@ -0,0 +1,42 @@
+import datetime
+
+from contrib.media import media_path
+from django.core.management.base import BaseCommand
+from finance.export import year_end_export
+
+
+def parse_date(value):
+    return datetime.datetime.strptime(value, "%Y-%m-%d").date()
+
+
+class Command(BaseCommand):
+    help = "Export all confirmed transactions of a time range grouped by ledger into a zip file"
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--from", dest="start", type=parse_date, help="First day, e.g. 2025-01-01"
+        )
+        parser.add_argument("--to", dest="end", type=parse_date, help="Last day, e.g. 2025-12-31")
+        parser.add_argument(
+            "--summaries", action="store_true", help="Include the summaries of all statements"
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=None,
+            help="Number of processes compiling the summaries, 0 compiles them in this process",
+        )
+
+    def handle(self, *args, **options):
+        year = datetime.date.today().year - 1
+        start = options["start"] or datetime.date(year, 1, 1)
+        end = options["end"] or datetime.date(start.year, 12, 31)
+        filename, missing = year_end_export(
+            start, end, summaries=options["summaries"], workers=options["workers"]
+        )
+        for pk in missing:
+            self.stderr.write(
+                self.style.WARNING(f"The summary of statement {pk} could not be rendered.")
+            )
+        self.stdout.write(media_path(filename))
@@ -0,0 +1,34 @@
+from django.db import migrations
+from django.db import models
+
+
+def backfill_summaries(apps, _schema_editor):
+    # the amounts are calculated from bills, transactions, excursions and settings, so reuse
+    # the current implementation
+    from finance.tasks import refresh_statement_summaries
+
+    refresh_statement_summaries()
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("finance", "0013_statement_settings_snapshot"),
+        # the calculation loads members, which need their current columns
+        ("members", "0049_member_activity_score"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="statement",
+            name="summary_total",
+            field=models.DecimalField(
+                decimal_places=2, default=0, editable=False, max_digits=8, verbose_name="Total"
+            ),
+        ),
+        migrations.AddField(
+            model_name="statement",
+            name="summary_validity",
+            field=models.IntegerField(default=4, editable=False, verbose_name="Validity"),
+        ),
+        migrations.RunPython(backfill_summaries, migrations.RunPython.noop),
+    ]
@@ -1,4 +1,6 @@
 import re
+import threading
+from contextlib import contextmanager
 from decimal import Decimal
 from itertools import groupby
 
@@ -8,8 +10,10 @@ from contrib.models import CommonModel
 from contrib.rules import has_global_perm
 from django.conf import settings
 from django.db import models
+from django.db import transaction as db_transaction
 from django.db.models import Sum
 from django.utils import timezone
+from django.utils.functional import cached_property
 from django.utils.html import format_html
 from django.utils.translation import gettext_lazy as _
 from mailer.mailutils import send as send_mail
@@ -51,6 +55,83 @@ class TransactionIssue:
         return self.target - self.current
 
 
+class StatementCalculation:
+    """
+    Snapshot of the data from which the amounts of a statement are calculated. Every part
+    is loaded at most once, see `Statement.calculating`.
+    """
+
+    def __init__(self, statement):
+        self.statement = statement
+        self.excursion = statement.excursion
+
+    @cached_property
+    def bills(self):
+        return list(self.statement.bill_set.select_related("paid_by"))
+
+    @cached_property
+    def transactions(self):
+        return list(self.statement.transaction_set.select_related("member", "ledger"))
+
+    @cached_property
+    def allowance_to(self):
+        return list(self.statement.allowance_to.all())
+
+    @cached_property
+    def jugendleiter(self):
+        return list(self.excursion.jugendleiter.all()) if self.excursion is not None else []
+
+    @cached_property
+    def ljpproposal(self):
+        return getattr(self.excursion, "ljpproposal", None)
+
+    @cached_property
+    def staff_count(self):
+        return len(self.jugendleiter)
+
+    @cached_property
+    def participant_count(self):
+        return self.excursion.participant_count
+
+    @cached_property
+    def old_participant_count(self):
+        return self.excursion.old_participant_count
+
+    @cached_property
+    def approved_staff_count(self):
+        return self.excursion.approved_staff_count
+
+    @cached_property
+    def theoretic_ljp_participant_count(self):
+        return self.excursion.theoretic_ljp_participant_count
+
+    @cached_property
+    def ljp_participant_count(self):
+        return self.excursion.ljp_participant_count
+
+    @cached_property
+    def total_seminar_days(self):
+        return self.excursion.total_seminar_days
+
+    @cached_property
+    def ljp_duration(self):
+        return min(self.excursion.duration, self.total_seminar_days)
+
+
+# statements whose summaries are refreshed after an ongoing bulk edit, see `Statement.editing`
+_summary_refresh = threading.local()
+
+
+def _suspended_summaries():
+    if not hasattr(_summary_refresh, "suspended"):
+        _summary_refresh.suspended = set()
+    return _summary_refresh.suspended
+
+
+def summary_refresh_suspended(statement_pk):
+    return statement_pk in _suspended_summaries()
+
+
 class StatementManager(models.Manager):
     def get_queryset(self):
         return super().get_queryset().filter(status=Statement.UNSUBMITTED)
@@ -136,6 +217,13 @@ class Statement(CommonModel):
         blank=True,
         help_text=_("Financial settings captured at time of submission/confirmation."),
     )
+    # calculated amounts for list views, kept up to date by `refresh_summary`
+    summary_total = models.DecimalField(
+        verbose_name=_("Total"), default=0, decimal_places=2, max_digits=8, editable=False
+    )
+    summary_validity = models.IntegerField(
+        verbose_name=_("Validity"), default=VALID, editable=False
+    )
     submitted_date = models.DateTimeField(verbose_name=_("Submitted on"), default=None, null=True)
     confirmed_date = models.DateTimeField(verbose_name=_("Paid on"), default=None, null=True)
 
@@ -193,6 +281,79 @@ class Statement(CommonModel):
     def __str__(self):
         return str(self.title)
 
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self.invalidate_calculation()
+        if not summary_refresh_suspended(self.pk):
+            self.refresh_summary()
+
+    def refresh_from_db(self, *args, **kwargs):
+        super().refresh_from_db(*args, **kwargs)
+        self.invalidate_calculation()
+
+    @property
+    def calculation(self):
+        """
+        The data from which the amounts of this statement are calculated. Inside of
+        `calculating` this is a snapshot that is shared by all amounts, otherwise every access
+        loads the current data.
+        """
+        return self.__dict__.get("_calculation") or StatementCalculation(self)
+
+    @contextmanager
+    def calculating(self):
+        """
+        Evaluate all amounts of this statement inside this context from one snapshot of
+        bills, transactions, allowance recipients and participants, which are then loaded
+        only once. Nested contexts share the snapshot.
+        """
+        if "_calculation" in self.__dict__:
+            yield self._calculation
+            return
+        self._calculation = StatementCalculation(self)
+        try:
+            yield self._calculation
+        finally:
+            self.__dict__.pop("_calculation", None)
+
+    def invalidate_calculation(self):
+        """Drop the current snapshot, e.g. after the statement or its bills were edited."""
+        if "_calculation" in self.__dict__:
+            self._calculation = StatementCalculation(self)
+
+    @contextmanager
+    def editing(self):
+        """
+        Atomically edit the statement, its bills and transactions, e.g. in bulk. The summary
+        is refreshed once at the end instead of after every change.
+        """
+        suspended = _suspended_summaries()
+        if self.pk in suspended:
+            with db_transaction.atomic():
+                yield
+            return
+        suspended.add(self.pk)
+        try:
+            with db_transaction.atomic():
+                yield
+                self.invalidate_calculation()
+                suspended.discard(self.pk)
+                self.refresh_summary()
+        finally:
+            suspended.discard(self.pk)
+
+    def refresh_summary(self):
+        """
+        Recompute `summary_total` and `summary_validity`. This is called whenever the
+        statement, its bills, transactions or the associated excursion are changed.
+        """
+        with self.calculating():
+            self.summary_total = self.total
+            self.summary_validity = self.validity
+        Statement.objects.filter(pk=self.pk).update(
+            summary_total=self.summary_total, summary_validity=self.summary_validity
+        )
+
     def _get_setting(self, key: str):
         if self.submitted and self.settings_snapshot and key in self.settings_snapshot:
             return float(self.settings_snapshot[key])
@@ -252,12 +413,13 @@ class Statement(CommonModel):
           total still differs from the transaction total.)
         - If the statement is associated with an excursion: allowances, subsidies, LJP paiment and org fee.
         """
+        calculation = self.calculation
         needed_paiments = [
-            (b.paid_by, b.amount) for b in self.bill_set.all() if b.costs_covered and b.paid_by
+            (b.paid_by, b.amount) for b in calculation.bills if b.costs_covered and b.paid_by
         ]
 
         if self.excursion is not None:
-            needed_paiments.extend([(yl, self.allowance_per_yl) for yl in self.allowance_to.all()])
+            needed_paiments.extend([(yl, self.allowance_per_yl) for yl in calculation.allowance_to])
         if self.subsidy_to:
             needed_paiments.append((self.subsidy_to, self.total_subsidies))
 
@@ -276,7 +438,7 @@ class Statement(CommonModel):
             )
         )
 
-        transactions = sorted(self.transaction_set.all(), key=lambda trans: trans.member.pk)
+        transactions = sorted(calculation.transactions, key=lambda trans: trans.member.pk)
         current = dict(
             map(
                 lambda p: (p[0], sum([t.amount for t in p[1]])),
@@ -304,7 +466,7 @@ class Statement(CommonModel):
 
     @property
     def ledgers_configured(self):
-        return all([trans.ledger is not None for trans in self.transaction_set.all()])
+        return all([trans.ledger is not None for trans in self.calculation.transactions])
 
     @property
     def transactions_match_expenses(self):
@@ -318,8 +480,8 @@ class Statement(CommonModel):
             # it is allowed that less allowances are utilized than youth leaders are enlisted
             return False
         if self.excursion is not None:
-            yls = self.excursion.jugendleiter.all()
-            for yl in self.allowance_to.all():
+            yls = self.calculation.jugendleiter
+            for yl in self.calculation.allowance_to:
                 if yl not in yls:
                     return False
         return True
@@ -332,7 +494,7 @@ class Statement(CommonModel):
         docstring of `transaction_issues`.
         """
         total_transactions = 0
-        for transaction in self.transaction_set.all():
+        for transaction in self.calculation.transactions:
             total_transactions += transaction.amount
         return self.total == total_transactions
 
@@ -351,16 +513,17 @@ class Statement(CommonModel):
         - `Statement.INVALID_TOTAL`:
           The total amount of transactions differs from the calculated total payout.
         """
-        if not self.transactions_match_expenses:
-            return Statement.NON_MATCHING_TRANSACTIONS
-        if not self.ledgers_configured:
-            return Statement.MISSING_LEDGER
-        if not self.allowance_to_valid:
-            return Statement.INVALID_ALLOWANCE_TO
-        if not self.total_valid:
-            return Statement.INVALID_TOTAL
-        else:
-            return Statement.VALID
+        with self.calculating():
+            if not self.transactions_match_expenses:
+                return Statement.NON_MATCHING_TRANSACTIONS
+            if not self.ledgers_configured:
+                return Statement.MISSING_LEDGER
+            if not self.allowance_to_valid:
+                return Statement.INVALID_ALLOWANCE_TO
+            if not self.total_valid:
+                return Statement.INVALID_TOTAL
+            else:
+                return Statement.VALID
 
     def is_valid(self):
         return self.validity == Statement.VALID
@@ -379,83 +542,106 @@ class Statement(CommonModel):
         self.status = self.CONFIRMED
         self.confirmed_date = timezone.now()
         self.confirmed_by = confirmer
-        for trans in self.transaction_set.all():
-            trans.confirmed = True
-            trans.confirmed_date = timezone.now()
-            trans.confirmed_by = confirmer
-            trans.save()
-        self.save()
+        with self.editing():
+            self.transaction_set.update(
+                confirmed=True, confirmed_date=self.confirmed_date, confirmed_by=confirmer
+            )
+            self.save()
         return True
 
     def generate_transactions(self):
+        """
+        Create the transactions for all required payments in one query. Returns `False` and
+        creates no transactions, if a covered bill has no payer.
+        """
+        with self.calculating():
+            transactions = self._needed_transactions()
+        if transactions is None:
+            return False
+        with self.editing():
+            Transaction.objects.bulk_create(transactions)
+        return True
+
+    def _needed_transactions(self):
+        transactions = []
         # bills
-        for bill in self.bill_set.all():
+        for bill in self.calculation.bills:
             if not bill.costs_covered:
                 continue
             if not bill.paid_by:
-                return False
+                return None
             ref = "{}: {}".format(str(self), bill.short_description)
-            Transaction(
-                statement=self,
-                member=bill.paid_by,
-                amount=bill.amount,
-                confirmed=False,
-                reference=ref,
-            ).save()
+            transactions.append(
+                Transaction(
+                    statement=self,
+                    member=bill.paid_by,
+                    amount=bill.amount,
+                    confirmed=False,
+                    reference=ref,
+                )
+            )
 
         # excursion specific
         if self.excursion is None:
-            return True
+            return transactions
 
         # allowance
-        for yl in self.allowance_to.all():
+        for yl in self.calculation.allowance_to:
             ref = _("Allowance for %(excu)s") % {"excu": self.excursion.name}
-            Transaction(
-                statement=self,
-                member=yl,
-                amount=self.allowance_per_yl,
-                confirmed=False,
-                reference=ref,
-            ).save()
+            transactions.append(
+                Transaction(
+                    statement=self,
+                    member=yl,
+                    amount=self.allowance_per_yl,
+                    confirmed=False,
+                    reference=ref,
+                )
+            )
 
         # subsidies (i.e. night and transportation costs)
         if self.subsidy_to:
             ref = _("Night and travel costs for %(excu)s") % {"excu": self.excursion.name}
-            Transaction(
-                statement=self,
-                member=self.subsidy_to,
-                amount=self.total_subsidies,
-                confirmed=False,
-                reference=ref,
-            ).save()
+            transactions.append(
+                Transaction(
+                    statement=self,
+                    member=self.subsidy_to,
+                    amount=self.total_subsidies,
+                    confirmed=False,
+                    reference=ref,
+                )
+            )
 
         if self.total_org_fee:
             # if no subsidy receiver is given but org fees have to be paid. Just pick one of allowance receivers
             ref = _("reduced by org fee")
-            Transaction(
-                statement=self,
-                member=self.org_fee_payant,
-                amount=-self.total_org_fee,
-                confirmed=False,
-                reference=ref,
-            ).save()
+            transactions.append(
+                Transaction(
+                    statement=self,
+                    member=self.org_fee_payant,
+                    amount=-self.total_org_fee,
+                    confirmed=False,
+                    reference=ref,
+                )
+            )
 
         if self.ljp_to:
             ref = _("LJP-Contribution %(excu)s") % {"excu": self.excursion.name}
-            Transaction(
-                statement=self,
-                member=self.ljp_to,
-                amount=self.paid_ljp_contributions,
-                confirmed=False,
-                reference=ref,
-            ).save()
+            transactions.append(
+                Transaction(
+                    statement=self,
+                    member=self.ljp_to,
+                    amount=self.paid_ljp_contributions,
+                    confirmed=False,
+                    reference=ref,
+                )
+            )
 
-        return True
+        return transactions
 
     def reduce_transactions(self):
         # to minimize the number of needed bank transactions, we bundle transactions from same ledger to
         # same member
-        transactions = self.transaction_set.all()
+        transactions = self.transaction_set.select_related("member", "ledger")
         if any(t.ledger is None for t in transactions):
             return
 
@@ -466,6 +652,7 @@ class Statement(CommonModel):
             return (trans.member, trans.ledger)
 
         transactions = sorted(transactions, key=sort_key)
+        reduced, obsolete = [], []
         for pair, transaction_group in groupby(transactions, group_key):
             member, ledger = pair
             grp = list(transaction_group)
@@ -474,16 +661,23 @@ class Statement(CommonModel):
 
             new_amount = sum(trans.amount for trans in grp)
             new_ref = ", ".join(f"{trans.reference} EUR{trans.amount: .2f}" for trans in grp)
-            Transaction(
-                statement=self,
-                member=member,
-                amount=new_amount,
-                confirmed=False,
-                reference=new_ref,
-                ledger=ledger,
-            ).save()
-            for trans in grp:
-                trans.delete()
+            reduced.append(
+                Transaction(
+                    statement=self,
+                    member=member,
+                    amount=new_amount,
+                    confirmed=False,
+                    reference=new_ref,
+                    ledger=ledger,
+                )
+            )
+            obsolete.extend(trans.pk for trans in grp)
+
+        if not reduced:
+            return
+        with self.editing():
+            Transaction.objects.filter(pk__in=obsolete).delete()
+            Transaction.objects.bulk_create(reduced)
 
     @property
     def total_bills(self):
@@ -492,21 +686,21 @@ class Statement(CommonModel):
     @property
     def bills_covered(self):
         """Returns the bills that are marked for reimbursement by the finance officer"""
-        return [bill for bill in self.bill_set.all() if bill.costs_covered]
+        return [bill for bill in self.calculation.bills if bill.costs_covered]
 
     @property
     def bills_without_proof(self):
         """Returns the bills that lack a proof file"""
-        return [bill for bill in self.bill_set.all() if not bill.proof]
+        return [bill for bill in self.calculation.bills if not bill.proof]
 
     @property
     def total_bills_theoretic(self):
-        return sum([bill.amount for bill in self.bill_set.all()])
+        return sum([bill.amount for bill in self.calculation.bills])
 
     @property
     def total_bills_not_covered(self):
         """Returns the sum of bills that are not marked for reimbursement by the finance officer"""
-        return sum([bill.amount for bill in self.bill_set.all()]) - self.total_bills
+        return sum([bill.amount for bill in self.calculation.bills]) - self.total_bills
 
     @property
     def euro_per_km(self):
@@ -537,7 +731,7 @@ class Statement(CommonModel):
 
     @property
     def allowances_paid(self):
-        return self.allowance_to.count()
+        return len(self.calculation.allowance_to)
 
     @property
     def total_allowance(self):
@@ -571,7 +765,7 @@ class Statement(CommonModel):
         if self.excursion is None:
             return 0
 
-        return cvt_to_decimal(self.total_staff / self.excursion.staff_count)
+        return cvt_to_decimal(self.total_staff / self.calculation.staff_count)
 
     @property
     def total_org_fee_theoretical(self):
@@ -581,7 +775,7 @@ class Statement(CommonModel):
         return cvt_to_decimal(
             self._get_setting("EXCURSION_ORG_FEE")
             * self.excursion.duration
-            * self.excursion.old_participant_count
+            * self.calculation.old_participant_count
         )
 
     @property
@@ -591,8 +785,8 @@ class Statement(CommonModel):
             return cvt_to_decimal(0)
 
         # if the excursion is for qualification, we don't charge org fees for older participants.
-        if hasattr(self.excursion, "ljpproposal"):
-            proposal = getattr(self.excursion, "ljpproposal")
+        proposal = self.calculation.ljpproposal
+        if proposal is not None:
             if proposal.goal == proposal.LJP_QUALIFICATION:
                 return cvt_to_decimal(0)
 
@@ -602,7 +796,7 @@ class Statement(CommonModel):
     def org_fee_payant(self):
         if self.total_org_fee == 0:
             return None
-        return self.subsidy_to if self.subsidy_to else self.allowance_to.all()[0]
+        return self.subsidy_to if self.subsidy_to else self.calculation.allowance_to[0]
 
     @property
     def total_subsidies(self):
@@ -642,7 +836,7 @@ class Statement(CommonModel):
         if self.excursion is None:
             return 0
 
-        return min(self.excursion.staff_count, self.admissible_staff_count)
+        return min(self.calculation.staff_count, self.admissible_staff_count)
 
     @property
     def admissible_staff_count(self):
@@ -651,12 +845,12 @@ class Statement(CommonModel):
         if self.excursion is None:
             return 0
         else:
-            return self.excursion.approved_staff_count
+            return self.calculation.approved_staff_count
 
     @property
     def paid_ljp_contributions(self):
-        if hasattr(self.excursion, "ljpproposal") and self.ljp_to:
-            if self.excursion.theoretic_ljp_participant_count < 5:
+        if self.calculation.ljpproposal is not None and self.ljp_to:
+            if self.calculation.theoretic_ljp_participant_count < 5:
                 return 0
 
             return cvt_to_decimal(
@@ -664,8 +858,8 @@ class Statement(CommonModel):
                     # if total costs are more than the max amount of the LJP contribution, we pay the max amount, reduced by taxes
                     (1 - self._get_setting("LJP_TAX"))
                     * self._get_setting("LJP_CONTRIBUTION_PER_DAY")
-                    * self.excursion.ljp_participant_count
-                    * self.excursion.ljp_duration,
+                    * self.calculation.ljp_participant_count
+                    * self.calculation.ljp_duration,
                     # if the total costs are less than the max amount, we pay up to 90% of the total costs, reduced by taxes
                     (1 - self._get_setting("LJP_TAX"))
                     * 0.9
@@ -692,12 +886,17 @@ class Statement(CommonModel):
         return self.total_bills_theoretic + self.total_allowance
 
     def total_pretty(self):
-        return "{}€".format(self.total)
+        with self.calculating():
+            return "{}€".format(self.total)
 
     total_pretty.short_description = _("Total")
-    total_pretty.admin_order_field = "total"
+    total_pretty.admin_order_field = "summary_total"
 
     def template_context(self):
+        with self.calculating():
+            return self._template_context()
+
+    def _template_context(self):
         context = {
             "total_bills": self.total_bills,
             "total_bills_theoretic": self.total_bills_theoretic,
@@ -728,14 +927,14 @@ class Statement(CommonModel):
                 "allowance_to": self.allowance_to,
                 "paid_ljp_contributions": self.paid_ljp_contributions,
                 "ljp_to": self.ljp_to,
-                "theoretic_ljp_participant_count": self.excursion.theoretic_ljp_participant_count,
-                "ljp_participant_count": self.excursion.ljp_participant_count,
-                "participant_count": self.excursion.participant_count,
-                "total_seminar_days": self.excursion.total_seminar_days,
+                "theoretic_ljp_participant_count": self.calculation.theoretic_ljp_participant_count,
+                "ljp_participant_count": self.calculation.ljp_participant_count,
+                "participant_count": self.calculation.participant_count,
+                "total_seminar_days": self.calculation.total_seminar_days,
                 "ljp_tax": self._get_setting("LJP_TAX") * 100,
                 "total_org_fee_theoretical": self.total_org_fee_theoretical,
                 "total_org_fee": self.total_org_fee,
-                "old_participant_count": self.excursion.old_participant_count,
+                "old_participant_count": self.calculation.old_participant_count,
                 "total_staff_paid": self.total_staff_paid,
                 "org_fee": cvt_to_decimal(self._get_setting("EXCURSION_ORG_FEE")),
             }
@@ -750,9 +949,10 @@ class Statement(CommonModel):
             .annotate(amount=Sum("amount"))
         )
 
-    def send_summary(self, cc=None):
+    def render_summary(self, save_only=False, unique=False):
         """
-        Sends a summary of the statement to the central office of the association.
+        Renders the summary of the statement including all proofs of covered bills. Summaries
+        of statements without excursion share their name, pass `unique` to avoid collisions.
         """
         excursion = self.excursion
         context = dict(statement=self.template_context(), excursion=excursion, settings=settings)
@@ -760,9 +960,20 @@ class Statement(CommonModel):
             f"{excursion.code}_{excursion.name}_Zuschussbeleg" if excursion else "Abrechnungsbeleg"
         )
         attachments = [bill.proof.path for bill in self.bills_covered if bill.proof]
-        filename = render_tex_with_attachments(
-            pdf_filename, "finance/statement_summary.tex", context, attachments, save_only=True
+        return render_tex_with_attachments(
+            pdf_filename,
+            "finance/statement_summary.tex",
+            context,
+            attachments,
+            save_only=save_only,
+            unique=unique,
         )
+
+    def send_summary(self, cc=None):
+        """
+        Sends a summary of the statement to the central office of the association.
+        """
+        filename = self.render_summary(save_only=True)
         send_mail(
             _("Statement summary for %(title)s") % {"title": self.title},
             settings.SEND_STATEMENT_SUMMARY.format(statement=self.title),
@@ -0,0 +1,107 @@
+from django.contrib.contenttypes.models import ContentType
+from django.db.models.signals import m2m_changed
+from django.db.models.signals import post_delete
+from django.db.models.signals import post_save
+from django.db.models.signals import pre_delete
+from django.dispatch import receiver
+from members.models import Freizeit
+from members.models import Intervention
+from members.models import LJPProposal
+from members.models import NewMemberOnList
+
+from .models import Bill
+from .models import BillOnExcursionProxy
+from .models import BillOnStatementProxy
+from .models import Statement
+from .models import summary_refresh_suspended
+from .models import Transaction
+
+
+def refresh_summaries(statements):
+    for statement in statements:
+        if not summary_refresh_suspended(statement.pk):
+            statement.refresh_summary()
+
+
+def refresh_excursion_summaries(excursion_pks):
+    refresh_summaries(Statement.objects.filter(excursion__in=excursion_pks))
+
+
+@receiver(post_save, sender=Bill)
+@receiver(post_delete, sender=Bill)
+@receiver(post_save, sender=BillOnExcursionProxy)
+@receiver(post_delete, sender=BillOnExcursionProxy)
+@receiver(post_save, sender=BillOnStatementProxy)
+@receiver(post_delete, sender=BillOnStatementProxy)
+@receiver(post_save, sender=Transaction)
+@receiver(post_delete, sender=Transaction)
+def on_statement_item_changed(sender, instance, **kwargs):
+    if not summary_refresh_suspended(instance.statement_id):
+        refresh_summaries(Statement.objects.filter(pk=instance.statement_id))
+
+
+@receiver(m2m_changed, sender=Statement.allowance_to.through)
+def on_allowance_to_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        if action.startswith("post_"):
+            instance.refresh_summary()
+    elif action == "pre_clear":
+        # `instance` is a member and `pk_set` is not provided on clear
+        instance._cleared_statement_pks = list(
+            instance.receives_allowance_for_statements.values_list("pk", flat=True)
+        )
+    elif action == "post_clear":
+        refresh_summaries(Statement.objects.filter(pk__in=instance._cleared_statement_pks))
+    elif action.startswith("post_"):
+        refresh_summaries(Statement.objects.filter(pk__in=pk_set))
+
+
+@receiver(post_save, sender=Freizeit)
+def on_excursion_saved(sender, instance, **kwargs):
+    refresh_excursion_summaries([instance.pk])
+
+
+@receiver(pre_delete, sender=Freizeit)
+def on_excursion_deleting(sender, instance, **kwargs):
+    # the statement is detached from the excursion on deletion, so remember it
+    instance._statement_pks = list(
+        Statement.objects.filter(excursion=instance).values_list("pk", flat=True)
+    )
+
+
+@receiver(post_delete, sender=Freizeit)
+def on_excursion_deleted(sender, instance, **kwargs):
+    refresh_summaries(Statement.objects.filter(pk__in=getattr(instance, "_statement_pks", [])))
+
+
+@receiver(m2m_changed, sender=Freizeit.jugendleiter.through)
+def on_excursion_jugendleiter_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        if action.startswith("post_"):
+            refresh_excursion_summaries([instance.pk])
+    elif action == "pre_clear":
+        # `instance` is a member and `pk_set` is not provided on clear
+        instance._cleared_excursion_pks = list(instance.freizeit_set.values_list("pk", flat=True))
+    elif action == "post_clear":
+        refresh_excursion_summaries(instance._cleared_excursion_pks)
+    elif action.startswith("post_"):
+        refresh_excursion_summaries(pk_set)
+
+
+@receiver(post_save, sender=NewMemberOnList)
+@receiver(post_delete, sender=NewMemberOnList)
+def on_member_on_list_changed(sender, instance, **kwargs):
+    if instance.content_type_id == ContentType.objects.get_for_model(Freizeit).pk:
+        refresh_excursion_summaries([instance.object_id])
+
+
+@receiver(post_save, sender=LJPProposal)
+@receiver(post_delete, sender=LJPProposal)
+def on_ljp_proposal_changed(sender, instance, **kwargs):
+    refresh_excursion_summaries([instance.excursion_id])
+
+
+@receiver(post_save, sender=Intervention)
+@receiver(post_delete, sender=Intervention)
+def on_intervention_changed(sender, instance, **kwargs):
+    refresh_summaries(Statement.objects.filter(excursion__ljpproposal=instance.ljp_proposal_id))
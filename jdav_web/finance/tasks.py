@@ -0,0 +1,16 @@
+from celery import shared_task
+
+from .models import Statement
+
+
+@shared_task
+def refresh_statement_summaries():
+    """
+    Recompute the summaries of all statements. This is meant to run nightly, since the
+    calculated amounts also depend on the ages of the participants and on the settings.
+    """
+    no = 0
+    for statement in Statement.objects.select_related("excursion").iterator():
+        statement.refresh_summary()
+        no += 1
+    return no
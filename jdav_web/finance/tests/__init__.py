@@ -1,6 +1,7 @@
 # ruff: noqa F403
 
 from .admin import *
+from .export import *
 from .migrations import *
 from .models import *
 from .rules import *
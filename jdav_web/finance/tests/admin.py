@@ -7,9 +7,11 @@ from django.contrib.messages import get_messages
 from django.contrib.messages.middleware import MessageMiddleware
 from django.contrib.messages.storage.fallback import FallbackStorage
 from django.contrib.sessions.middleware import SessionMiddleware
+from django.db import connection
 from django.test import Client
 from django.test import RequestFactory
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
@@ -97,6 +99,24 @@ class StatementUnSubmittedAdminTestCase(AdminTestCase):
         self.admin.save_model(request, new_statement, None, change=False)
         self.assertEqual(new_statement.created_by, self.member)
 
+    def _changelist_query_count(self):
+        c = self._login("superuser")
+        url = reverse("admin:finance_statement_changelist")
+        with CaptureQueriesContext(connection) as queries:
+            response = c.get(url)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        return len(queries)
+
+    def test_changelist_query_count(self):
+        """Test that the number of queries of the changelist does not depend on the statements"""
+        count = self._changelist_query_count()
+        for i in range(10):
+            statement = Statement.objects.create(short_description=f"Statement {i}", night_cost=0)
+            Bill.objects.create(
+                statement=statement, amount=10, costs_covered=True, paid_by=self.member
+            )
+        self.assertEqual(self._changelist_query_count(), count)
+
     def test_has_delete_permission(self):
         """Test if unsubmitted statements may be deleted"""
         request = self.factory.post("/")
@@ -0,0 +1,199 @@
+import csv
+import datetime
+import hashlib
+import io
+import os
+import subprocess
+import tempfile
+import zipfile
+from unittest.mock import patch
+
+import openpyxl
+from contrib.media import media_dir
+from contrib.media import media_path
+from django.conf import settings
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+from finance.export import export_transactions_csv
+from finance.export import worksheet_name
+from finance.export import year_end_export
+from finance.models import Bill
+from finance.models import Ledger
+from finance.models import Statement
+from finance.models import Transaction
+from members.models import MALE
+from members.models import Member
+from pypdf import PdfReader
+from pypdf import PdfWriter
+
+
+class YearEndExportTestCase(TestCase):
+    def setUp(self):
+        self.fritz = Member.objects.create(
+            prename="Fritz",
+            lastname="Wulter",
+            birth_date=timezone.now().date(),
+            email=settings.TEST_MAIL,
+            gender=MALE,
+        )
+        self.travel = Ledger.objects.create(name="travel")
+        self.food = Ledger.objects.create(name="food")
+        self.st = Statement.objects.create(short_description="A statement", night_cost=0)
+        self.st2 = Statement.objects.create(short_description="Another statement", night_cost=0)
+        paid_on = timezone.make_aware(datetime.datetime(2024, 6, 1, 12))
+        for statement, ledger, amount in [
+            (self.st, self.travel, 10),
+            (self.st, self.food, 20),
+            (self.st2, self.travel, 30),
+        ]:
+            Transaction.objects.create(
+                reference="reimbursement",
+                amount=amount,
+                ledger=ledger,
+                member=self.fritz,
+                statement=statement,
+                confirmed=True,
+                confirmed_date=paid_on,
+            )
+        # neither confirmed nor in the time range
+        Transaction.objects.create(
+            reference="open", amount=40, ledger=self.food, member=self.fritz, statement=self.st2
+        )
+        Transaction.objects.create(
+            reference="old",
+            amount=50,
+            ledger=self.food,
+            member=self.fritz,
+            statement=self.st2,
+            confirmed=True,
+            confirmed_date=paid_on - datetime.timedelta(days=365),
+        )
+
+    def test_export(self):
+        filename, missing = year_end_export(datetime.date(2024, 1, 1), datetime.date(2024, 12, 31))
+        self.assertEqual(missing, [])
+        with zipfile.ZipFile(media_path(filename)) as archive:
+            names = archive.namelist()
+            self.assertEqual(len(names), 2)
+            csv_name = next(name for name in names if name.endswith(".csv"))
+            rows = list(csv.DictReader(io.StringIO(archive.read(csv_name).decode())))
+            xlsx_name = next(name for name in names if name.endswith(".xlsx"))
+            workbook = openpyxl.load_workbook(io.BytesIO(archive.read(xlsx_name)))
+        # the transactions are grouped by ledger
+        self.assertEqual([row["ledger"] for row in rows], ["food", "travel", "travel"])
+        self.assertEqual([row["amount"] for row in rows], ["20.00", "10.00", "30.00"])
+        self.assertEqual(workbook.sheetnames, ["food", "travel"])
+        self.assertEqual(workbook["travel"].cell(4, 6).value, 40)
+
+    def test_export_summaries(self):
+        def render_summary(statement, save_only=False, unique=False):
+            filename = f"summary_{statement.pk}.pdf"
+            with open(media_path(filename), "w") as f:
+                f.write(str(statement))
+            return filename
+
+        with patch.object(Statement, "render_summary", render_summary):
+            filename, _ = year_end_export(
+                datetime.date(2024, 1, 1), datetime.date(2024, 12, 31), summaries=True, workers=0
+            )
+        with zipfile.ZipFile(media_path(filename)) as archive:
+            summaries = sorted(name for name in archive.namelist() if name.startswith("summaries/"))
+        self.assertEqual(
+            summaries,
+            [
+                f"summaries/{self.st.pk}_summary_{self.st.pk}.pdf",
+                f"summaries/{self.st2.pk}_summary_{self.st2.pk}.pdf",
+            ],
+        )
+
+    @patch("members.pdf.subprocess.run")
+    def test_export_summaries_with_same_name(self, mock_run):
+        def pdflatex(args, cwd, **kwargs):
+            # the page width identifies the compiled source
+            with open(os.path.join(cwd, args[-1]), "rb") as f:
+                width = 100 + int(hashlib.sha256(f.read()).hexdigest(), 16) % 1000
+            writer = PdfWriter()
+            writer.add_blank_page(width=width, height=100)
+            writer.write(os.path.join(cwd, args[-1].replace(".tex", ".pdf")))
+            return subprocess.CompletedProcess(args, 0, "", "")
+
+        mock_run.side_effect = pdflatex
+        # neither statement has an excursion, so both summaries have the same name
+        Bill.objects.create(
+            statement=self.st, short_description="Food", amount=20, costs_covered=True
+        )
+        Bill.objects.create(
+            statement=self.st2, short_description="Train", amount=30, costs_covered=True
+        )
+        with tempfile.TemporaryDirectory() as tmp, self.settings(MEDIA_ROOT=tmp):
+            filename, _ = year_end_export(
+                datetime.date(2024, 1, 1), datetime.date(2024, 12, 31), summaries=True, workers=0
+            )
+            with zipfile.ZipFile(media_path(filename)) as archive:
+                summaries = [
+                    archive.read(name)
+                    for name in archive.namelist()
+                    if name.startswith("summaries/")
+                ]
+            # the rendered summaries are removed once they are archived
+            self.assertFalse(any(name.endswith(".pdf") for name in os.listdir(media_dir())))
+        widths = {float(PdfReader(io.BytesIO(pdf)).pages[0].mediabox.width) for pdf in summaries}
+        self.assertEqual(len(summaries), 2)
+        self.assertEqual(len(widths), 2)
+
+    @patch("members.pdf.subprocess.run")
+    def test_export_summaries_compilation_failure(self, mock_run):
+        def pdflatex(args, cwd, **kwargs):
+            # only the second summary compiles
+            if mock_run.call_count == 1:
+                return subprocess.CompletedProcess(args, 1, "", "")
+            writer = PdfWriter()
+            writer.add_blank_page(width=100, height=100)
+            writer.write(os.path.join(cwd, args[-1].replace(".tex", ".pdf")))
+            return subprocess.CompletedProcess(args, 0, "", "")
+
+        mock_run.side_effect = pdflatex
+        with tempfile.TemporaryDirectory() as tmp, self.settings(MEDIA_ROOT=tmp):
+            filename, missing = year_end_export(
+                datetime.date(2024, 1, 1), datetime.date(2024, 12, 31), summaries=True, workers=0
+            )
+            with zipfile.ZipFile(media_path(filename)) as archive:
+                summaries = [name for name in archive.namelist() if name.startswith("summaries/")]
+        self.assertEqual(missing, [self.st.pk])
+        self.assertEqual(len(summaries), 1)
+        self.assertTrue(summaries[0].startswith(f"summaries/{self.st2.pk}_"))
+
+        # the command reports the missing summaries
+        mock_run.reset_mock()
+        out, err = io.StringIO(), io.StringIO()
+        with tempfile.TemporaryDirectory() as tmp, self.settings(MEDIA_ROOT=tmp):
+            call_command(
+                "export_finances",
+                "--from",
+                "2024-01-01",
+                "--summaries",
+                "--workers",
+                "0",
+                stdout=out,
+                stderr=err,
+            )
+        self.assertIn(f"statement {self.st.pk}", err.getvalue())
+        self.assertTrue(out.getvalue().strip().endswith(".zip"))
+
+    def test_export_without_ledger(self):
+        Transaction.objects.update(ledger=None)
+        out = io.StringIO()
+        export_transactions_csv(Transaction.objects.filter(confirmed=True), out)
+        self.assertEqual(len(out.getvalue().splitlines()), 5)
+
+    def test_worksheet_name(self):
+        used = set()
+        self.assertEqual(worksheet_name(Ledger(name="a/b"), used), "a_b")
+        self.assertEqual(worksheet_name(Ledger(name="A/B"), used), "A_B_1")
+        self.assertEqual(worksheet_name(None, used), "-")
+
+    def test_command(self):
+        out = io.StringIO()
+        call_command("export_finances", "--from", "2024-01-01", stdout=out)
+        self.assertTrue(out.getvalue().strip().endswith("Finanzexport_01_01_2024-31_12_2024.zip"))
@@ -2,6 +2,7 @@ import django.test
 from django.conf import settings
 from django.db import connection
 from django.db.migrations.executor import MigrationExecutor
+from finance.models import Statement
 
 
 class StatusMigrationTestCase(django.test.TransactionTestCase):
@@ -117,3 +118,34 @@ class StatementSettingsSnapshotMigrationTestCase(django.test.TransactionTestCase
             float(settings.MAX_NIGHT_COST),
         )
         self.assertEqual(unsubmitted.settings_snapshot, {})
+
+
+class StatementSummaryMigrationTestCase(django.test.TransactionTestCase):
+    app = "finance"
+    migrate_from = [("finance", "0013_statement_settings_snapshot")]
+    migrate_to = [("finance", "0014_statement_summary")]
+
+    def setUp(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.migrate_from)
+        old_apps = executor.loader.project_state(self.migrate_from).apps
+        Statement = old_apps.get_model(self.app, "Statement")
+        Bill = old_apps.get_model(self.app, "Bill")
+
+        self.empty = Statement.objects.create(short_description="Empty Statement")
+        self.statement = Statement.objects.create(short_description="Statement", status=1)
+        Bill.objects.create(
+            statement=self.statement, short_description="Food", amount=42, costs_covered=True
+        )
+
+    def test_summaries_backfilled(self):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(self.migrate_to)
+
+        for pk in [self.empty.pk, self.statement.pk]:
+            statement = Statement.objects.get(pk=pk)
+            with statement.calculating():
+                self.assertEqual(statement.summary_total, statement.total)
+                self.assertEqual(statement.summary_validity, statement.validity)
+        self.assertEqual(Statement.objects.get(pk=self.statement.pk).summary_total, 42)
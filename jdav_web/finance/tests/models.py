@@ -2,8 +2,10 @@ from decimal import Decimal
 
 from dateutil.relativedelta import relativedelta
 from django.conf import settings
+from django.db import connection
 from django.test import override_settings
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from finance.models import Bill
@@ -18,6 +20,7 @@ from finance.models import StatementUnSubmitted
 from finance.models import StatementUnSubmittedManager
 from finance.models import Transaction
 from finance.models import TransactionIssue
+from finance.tasks import refresh_statement_summaries
 from members.models import DIVERSE
 from members.models import FAHRGEMEINSCHAFT_ANREISE
 from members.models import Freizeit
@@ -558,6 +561,36 @@ class StatementTestCase(TestCase):
         bill.save()
         self.assertTrue(self.st2.transactions_match_expenses)
 
+    def test_generate_transactions_unpaid(self):
+        bill = self.st3.bill_set.all()[0]
+        bill.paid_by = None
+        bill.save()
+        # no transactions are created at all, if a covered bill has no payer
+        self.assertFalse(self.st3.generate_transactions())
+        self.assertEqual(self.st3.transaction_set.count(), 0)
+
+    def test_bulk_transactions(self):
+        self.st3.submit(submitter=self.fritz)
+        self.st3.generate_transactions()
+        self.st3.transaction_set.update(ledger=self.personal_account)
+        self.st3.refresh_summary()
+        # reducing writes all transactions at once and refreshes the summary only once
+        with CaptureQueriesContext(connection) as ctx:
+            self.st3.reduce_transactions()
+        writes = [q["sql"].split()[0] for q in ctx.captured_queries if "SELECT" not in q["sql"]]
+        self.assertEqual(writes.count("DELETE"), 1)
+        self.assertEqual(writes.count("INSERT"), 1)
+        self.assertEqual(writes.count("UPDATE"), 1)
+        self.assertEqual(self.st3.transaction_set.count(), self.staff_count + 1)
+        self.st3.refresh_from_db()
+        self.assertEqual(self.st3.summary_validity, Statement.VALID)
+        self.assertEqual(self.st3.summary_total, self.st3.total)
+
+        self.assertTrue(self.st3.confirm(confirmer=self.fritz))
+        self.assertFalse(self.st3.transaction_set.filter(confirmed=False).exists())
+        self.st3.refresh_from_db()
+        self.assertEqual(self.st3.summary_validity, Statement.VALID)
+
     def test_statement_without_excursion(self):
         # should be all 0, since no excursion is associated
         self.assertEqual(self.st.real_staff_count, 0)
@@ -642,6 +675,62 @@ class StatementTestCase(TestCase):
         # without excursion
         self.assertFalse("euro_per_km" in self.st2.template_context())
 
+    def test_calculating(self):
+        self.st3.generate_transactions()
+        with self.st3.calculating():
+            context = self.st3.template_context()
+            validity = self.st3.validity
+            # all amounts are evaluated from the snapshot
+            with self.assertNumQueries(0):
+                self.assertEqual(self.st3.template_context(), context)
+                self.assertEqual(self.st3.validity, validity)
+                self.st3.transaction_issues
+        # outside of the context, every access loads the current data
+        with self.assertNumQueries(1):
+            self.st3.total_bills
+
+    def test_invalidate_calculation(self):
+        with self.st2.calculating():
+            total = self.st2.total_bills
+            Bill.objects.create(statement=self.st2, amount=10, costs_covered=True)
+            self.assertEqual(self.st2.total_bills, total)
+            self.st2.invalidate_calculation()
+            self.assertEqual(self.st2.total_bills, total + 10)
+            # saving the statement invalidates the snapshot as well
+            Bill.objects.create(statement=self.st2, amount=5, costs_covered=True)
+            self.st2.save()
+            self.assertEqual(self.st2.total_bills, total + 15)
+
+    def test_summary(self):
+        for statement in [self.st, self.st2, self.st3]:
+            statement.refresh_from_db()
+            self.assertEqual(statement.summary_total, statement.total)
+            self.assertEqual(statement.summary_validity, statement.validity)
+
+        # changes to bills, transactions and the excursion are reflected
+        Bill.objects.create(statement=self.st2, amount=10, costs_covered=True, paid_by=self.fritz)
+        self.st3.generate_transactions()
+        m = Member.objects.create(
+            prename="Peter",
+            lastname="Walter",
+            birth_date=timezone.now().date() - timezone.timedelta(days=30 * 365),
+            email=settings.TEST_MAIL,
+            gender=DIVERSE,
+        )
+        NewMemberOnList.objects.create(member=m, memberlist=self.st3.excursion)
+        self.st3.allowance_to.remove(self.st3.allowance_to.first())
+        for statement in [self.st2, self.st3]:
+            statement.refresh_from_db()
+            self.assertEqual(statement.summary_total, statement.total)
+            self.assertEqual(statement.summary_validity, statement.validity)
+        self.assertEqual(self.st2.summary_validity, Statement.NON_MATCHING_TRANSACTIONS)
+
+    def test_refresh_statement_summaries(self):
+        Statement.objects.update(summary_total=0)
+        self.assertEqual(refresh_statement_summaries(), Statement.objects.count())
+        self.st3.refresh_from_db()
+        self.assertEqual(self.st3.summary_total, self.st3.total)
+
     def test_grouped_bills(self):
         bills = self.st2.grouped_bills()
         self.assertTrue("amount" in bills[0])
@@ -23,6 +23,12 @@ MEDIA_URL = "/media/"
 MEDIA_ROOT = get_var(
     "django", "media_root", default=os.path.join((os.path.join(BASE_DIR, os.pardir)), "media")
 )
+# Maximal size in bytes of the cache of compiled pdf documents
+PDF_CACHE_SIZE = get_var("django", "pdf_cache_size", default=100 * 1024 * 1024)
+# Generate heavy documents (e.g. SJR applications) by background tasks instead of in the request
+ASYNC_DOCUMENTS = get_var("django", "async_documents", default=False)
+# Days after which finished document jobs and their files are removed
+DOCUMENT_JOB_EXPIRY = get_var("django", "document_job_expiry", default=7)
 
 # Use Open ID Connect if possible
 OIDC_ENABLED = get_var("oidc", "enabled", default=False)
@@ -21,5 +21,13 @@ CELERY_EMAIL_TASK_CONFIG = {
     "rate_limit": "10/m"  # * CELERY_EMAIL_CHUNK_SIZE (default: 10)
 }
 
+# number of recipients handled by one task when delivering messages in the background
+DELIVERY_CHUNK_SIZE = get_var("mail", "delivery_chunk_size", default=50)
+# rate limit of the background tasks sending one chunk of mails each, by default mails are
+# sent at the pace of CELERY_EMAIL_TASK_CONFIG, i.e. 10 tasks of 10 mails per minute
+DELIVERY_RATE_LIMIT = get_var(
+    "mail", "delivery_rate_limit", default=f"{max(1, 100 // DELIVERY_CHUNK_SIZE)}/m"
+)
+
 DEFAULT_SENDING_MAIL = get_var("mail", "default_sending_address", default="kompass@localhost")
 DEFAULT_SENDING_NAME = get_var("mail", "default_sending_name", default="Kompass")
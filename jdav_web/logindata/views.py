@@ -4,6 +4,7 @@ from django.http import HttpResponseRedirect
 from django.shortcuts import render
 from django.urls import reverse
 from django.utils.translation import gettext_lazy as _
+from members.models import get_by_key
 from members.models import Member
 
 from .models import initial_user_setup
@@ -60,7 +61,7 @@ def register(request):
     if not key:
         return render_register_failed(request)
     try:
-        member = Member.objects.get(invite_as_user_key=key)
+        member = get_by_key(Member.objects, "invite_as_user_key", key)
     except (Member.DoesNotExist, Member.MultipleObjectsReturned):
         return render_register_failed(request)
 
@@ -1,11 +1,33 @@
-import xlsxwriter
-from contrib.media import ensure_media_dir
-from contrib.media import media_path
+from contrib.excel import ReportWriter
 from contrib.media import serve_media
 from django.contrib import admin
 
 from .models import Termin
 
+OVERVIEW_HEADERS = [
+    "Titel",
+    "Untertitel",
+    "Von",
+    "Bis",
+    "Gruppe",
+    "Kategorie",
+    "Technik",
+    "Kondition",
+    "Saison",
+    "Eventart",
+    "Klassifizierung",
+    "Höhenmeter (Meter)",
+    "Strecke (Kilometer)",
+    "Etappendauer (Stunden)",
+    "Voraussetzungen",
+    "Beschreibung",
+    "Ausrüstung",
+    "Max. Teilnehmerzahl",
+    "Organisator",
+    "Telefonnummer",
+    "Emailadresse",
+]
+
 
 class TerminAdmin(admin.ModelAdmin):
     list_display = ("title", "start_date", "end_date", "group", "category", "responsible")
@@ -14,56 +36,39 @@ class TerminAdmin(admin.ModelAdmin):
     actions = ["make_overview"]
 
     def make_overview(self, request, queryset):
-        ensure_media_dir()
-        filename = "termine.xlsx"
-        workbook = xlsxwriter.Workbook(media_path(filename))
-        bold = workbook.add_format({"bold": True})
-        worksheet = workbook.add_worksheet()
-        worksheet.write(0, 0, "Titel", bold)
-        worksheet.write(0, 1, "Untertitel", bold)
-        worksheet.write(0, 2, "Von", bold)
-        worksheet.write(0, 3, "Bis", bold)
-        worksheet.write(0, 4, "Gruppe", bold)
-        worksheet.write(0, 5, "Kategorie", bold)
-        worksheet.write(0, 6, "Technik", bold)
-        worksheet.write(0, 7, "Kondition", bold)
-        worksheet.write(0, 8, "Saison", bold)
-        worksheet.write(0, 9, "Eventart", bold)
-        worksheet.write(0, 10, "Klassifizierung", bold)
-        worksheet.write(0, 11, "Höhenmeter (Meter)", bold)
-        worksheet.write(0, 12, "Strecke (Kilometer)", bold)
-        worksheet.write(0, 13, "Etappendauer (Stunden)", bold)
-        worksheet.write(0, 14, "Voraussetzungen", bold)
-        worksheet.write(0, 15, "Beschreibung", bold)
-        worksheet.write(0, 16, "Ausrüstung", bold)
-        worksheet.write(0, 17, "Max. Teilnehmerzahl", bold)
-        worksheet.write(0, 18, "Organisator", bold)
-        worksheet.write(0, 19, "Telefonnummer", bold)
-        worksheet.write(0, 20, "Emailadresse", bold)
-        for row, termin in enumerate(queryset):
-            worksheet.write(row + 2, 0, termin.title)
-            worksheet.write(row + 2, 1, termin.subtitle)
-            worksheet.write(row + 2, 2, termin.start_date.strftime("%d.%m.%Y"))
-            worksheet.write(row + 2, 3, termin.end_date.strftime("%d.%m.%Y"))
-            worksheet.write(row + 2, 4, termin.group)
-            worksheet.write(row + 2, 5, termin.category)
-            worksheet.write(row + 2, 6, termin.technik)
-            worksheet.write(row + 2, 7, termin.condition)
-            worksheet.write(row + 2, 8, termin.saison)
-            worksheet.write(row + 2, 9, termin.eventart)
-            worksheet.write(row + 2, 10, termin.klassifizierung)
-            worksheet.write(row + 2, 11, termin.anforderung_hoehe)
-            worksheet.write(row + 2, 12, termin.anforderung_strecke)
-            worksheet.write(row + 2, 13, termin.anforderung_dauer)
-            worksheet.write(row + 2, 14, termin.voraussetzungen)
-            worksheet.write(row + 2, 15, termin.description)
-            worksheet.write(row + 2, 16, termin.equipment)
-            worksheet.write(row + 2, 17, termin.max_participants)
-            worksheet.write(row + 2, 18, termin.responsible)
-            worksheet.write(row + 2, 19, termin.phone)
-            worksheet.write(row + 2, 20, termin.email)
-        workbook.close()
-        return serve_media(filename, "application/xlsx")
+        with ReportWriter("termine") as report:
+            bold = report.format(bold=True)
+            worksheet = report.add_worksheet()
+            report.write_row(worksheet, 0, OVERVIEW_HEADERS, bold)
+            for row, termin in enumerate(queryset.iterator(), start=2):
+                report.write_row(
+                    worksheet,
+                    row,
+                    [
+                        termin.title,
+                        termin.subtitle,
+                        termin.start_date.strftime("%d.%m.%Y"),
+                        termin.end_date.strftime("%d.%m.%Y"),
+                        termin.group,
+                        termin.category,
+                        termin.technik,
+                        termin.condition,
+                        termin.saison,
+                        termin.eventart,
+                        termin.klassifizierung,
+                        termin.anforderung_hoehe,
+                        termin.anforderung_strecke,
+                        termin.anforderung_dauer,
+                        termin.voraussetzungen,
+                        termin.description,
+                        termin.equipment,
+                        termin.max_participants,
+                        termin.responsible,
+                        termin.phone,
+                        termin.email,
+                    ],
+                )
+        return serve_media(report.filename, "application/xlsx", delete=True)
 
     make_overview.short_description = "Termine in Excel Liste überführen"
 
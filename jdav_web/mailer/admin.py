@@ -19,6 +19,8 @@ from .models import EmailAddress
 from .models import EmailAddressForm
 from .models import Message
 from .models import MessageForm
+from .tasks import deliver_message
+from .tasks import retry_failed_deliveries
 
 # from easy_select2 import apply_select2
 
@@ -56,18 +58,19 @@ class MessageAdmin(
         "subject",
         "get_recipients",
         "sent",
+        "delivery_progress",
     )
     search_fields = ("subject",)
     list_filter = ("sent",)
     change_form_template = "mailer/change_form.html"
-    readonly_fields = ("sent",)
+    readonly_fields = ("sent", "delivery_progress")
     # formfield_overrides = {
     #    models.ManyToManyField: {'widget': forms.CheckboxSelectMultiple},
     #    models.ForeignKey: {'widget': apply_select2(forms.Select)}
     # }
 
     inlines = [AttachmentInline]
-    actions = ["send_message"]
+    actions = ["send_message", "send_message_in_background", "retry_failed_deliveries"]
     form = MessageForm
     filter_horizontal = ("to_members", "reply_to")
 
@@ -95,6 +98,24 @@ class MessageAdmin(
 
     send_message.short_description = _("Send message")
 
+    def send_message_in_background(self, request, queryset):
+        for msg in queryset:
+            deliver_message_in_background(msg, request)
+
+    send_message_in_background.short_description = _("Send message in background")
+
+    def retry_failed_deliveries(self, request, queryset):
+        sender = get_sender(request)
+        if sender is None:
+            return
+        chunks = sum(retry_failed_deliveries(msg, sender) for msg in queryset)
+        if chunks:
+            messages.success(request, _("Retrying failed deliveries."))
+        else:
+            messages.info(request, _("There are no failed deliveries."))
+
+    retry_failed_deliveries.short_description = _("Retry failed deliveries")
+
     def response_change(self, request, obj):
         if "_send" in request.POST:
             submit_message(obj, request)
@@ -117,8 +138,11 @@ class MessageAdmin(
         return form
 
 
-def submit_message(msg, request):
-    sender = None
+def get_sender(request):
+    """
+    Returns the member of the requesting user if they may send messages. Otherwise
+    an error message is added and `None` is returned.
+    """
     if not hasattr(request.user, "member"):
         messages.error(
             request,
@@ -126,7 +150,7 @@ def submit_message(msg, request):
                 "Your account is not connected to a member. Please contact your system administrator."
             ),
         )
-        return
+        return None
     sender = request.user.member
     if not sender.has_internal_email():
         messages.error(
@@ -136,6 +160,13 @@ def submit_message(msg, request):
             )
             % {"domains": ", ".join(settings.ALLOWED_EMAIL_DOMAINS_FOR_INVITE_AS_USER)},
         )
+        return None
+    return sender
+
+
+def submit_message(msg, request):
+    sender = get_sender(request)
+    if sender is None:
         return
     success = msg.submit(sender)
     if success == NOT_SENT:
@@ -152,5 +183,16 @@ def submit_message(msg, request):
         )
 
 
+def deliver_message_in_background(msg, request):
+    sender = get_sender(request)
+    if sender is None:
+        return
+    deliver_message(msg, sender)
+    messages.success(
+        request,
+        _("Message %(subject)s is being sent in the background.") % {"subject": msg.subject},
+    )
+
+
 admin.site.register(Message, MessageAdmin)
 admin.site.register(EmailAddress, EmailAddressAdmin)
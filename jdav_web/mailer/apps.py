@@ -5,3 +5,6 @@ from django.utils.translation import gettext_lazy as _
 class MailerConfig(AppConfig):
     name = "mailer"
     verbose_name = _("mailer")
+
+    def ready(self):
+        from . import signals  # noqa: F401
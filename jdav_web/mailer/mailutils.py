@@ -1,8 +1,13 @@
 import logging
+import mimetypes
+import os
+from email import encoders
+from email.mime.base import MIMEBase
 
 from django.conf import settings
 from django.core import mail
 from django.core.mail import EmailMessage
+from django.core.mail.message import DEFAULT_ATTACHMENT_MIME_TYPE
 
 logger = logging.getLogger(__name__)
 
@@ -26,10 +31,11 @@ def send(
         kwargs = {}
     if sender == settings.DEFAULT_SENDING_MAIL:
         sender = addr_with_name(settings.DEFAULT_SENDING_MAIL, settings.DEFAULT_SENDING_NAME)
-    url = prepend_base_url("/newsletter/unsubscribe")
-    headers = {"List-Unsubscribe": "<{unsubscribe_url}>".format(unsubscribe_url=url)}
-    if message_id is not None:
-        headers["Message-ID"] = message_id
+    headers = get_headers(message_id)
+
+    # encode attachments once and share them between all mails
+    if attachments is not None:
+        attachments = [prepare_attachment(attach) for attach in attachments]
 
     # construct mails
     mails = []
@@ -39,7 +45,7 @@ def send(
         )
         if attachments is not None:
             for attach in attachments:
-                email.attach_file(attach)
+                email.attach(attach)
         mails.append(email)
     try:
         # connect to smtp server
@@ -57,6 +63,80 @@ def send(
     )
 
 
+def prepare_attachment(path):
+    """
+    Read the file at `path` and encode it as a MIME part. The returned part can be
+    attached to any number of `EmailMessage`s, so the file is read and encoded only once.
+    """
+    filename = os.path.basename(path)
+    mimetype, _ = mimetypes.guess_type(filename)
+    basetype, subtype = (mimetype or DEFAULT_ATTACHMENT_MIME_TYPE).split("/", 1)
+    part = MIMEBase(basetype, subtype)
+    with open(path, "rb") as f:
+        part.set_payload(f.read())
+    encoders.encode_base64(part)
+    try:
+        filename.encode("ascii")
+    except UnicodeEncodeError:
+        filename = ("utf-8", "", filename)
+    part.add_header("Content-Disposition", "attachment", filename=filename)
+    return part
+
+
+def get_headers(message_id=None):
+    url = prepend_base_url("/newsletter/unsubscribe")
+    headers = {"List-Unsubscribe": "<{unsubscribe_url}>".format(unsubscribe_url=url)}
+    if message_id is not None:
+        headers["Message-ID"] = message_id
+    return headers
+
+
+def get_delivery_connection():
+    """
+    Returns a connection that actually delivers mails. The celery email backend only
+    queues mails, so if it is configured, the backend wrapped by it is used instead.
+    """
+    backend = settings.EMAIL_BACKEND
+    if backend == "djcelery_email.backends.CeleryEmailBackend":
+        backend = getattr(
+            settings, "CELERY_EMAIL_BACKEND", "django.core.mail.backends.smtp.EmailBackend"
+        )
+    return mail.get_connection(backend)
+
+
+def send_each(items, build_emails, on_result):
+    """
+    Send the mails of all `items` over a single connection returned by
+    `get_delivery_connection`. `build_emails` returns the list of `EmailMessage`s of an item
+    and `on_result` is called for every item with the exception raised while building or
+    sending its mails, or with `None` if they were sent. If no connection can be opened, all
+    items fail. Returns the number of items whose mails were sent.
+    """
+    connection = get_delivery_connection()
+    try:
+        connection.open()
+    except Exception as e:
+        logger.error(f"Caught exception while connecting to mail server: {e}")
+        for item in items:
+            on_result(item, e)
+        return 0
+
+    sent = 0
+    try:
+        for item in items:
+            try:
+                connection.send_messages(build_emails(item))
+            except Exception as e:
+                logger.error(f"Caught exception while sending email for {item}: {e}")
+                on_result(item, e)
+            else:
+                on_result(item, None)
+                sent += 1
+    finally:
+        connection.close()
+    return sent
+
+
 def get_content(content, registration_complete=True):
     prepend = settings.PREPEND_INCOMPLETE_REGISTRATION_TEXT
     text = "{prepend}{content}".format(
@@ -72,6 +152,10 @@ def get_unsubscribe_link(member):
 
 def get_echo_link(member):
     key = member.generate_echo_key()
+    return get_echo_link_by_key(key)
+
+
+def get_echo_link_by_key(key):
     return prepend_base_url("/members/echo?key={}".format(key))
 
 
@@ -87,8 +171,7 @@ def get_invitation_confirm_link(key):
     return prepend_base_url("/members/waitinglist/invitation/confirm?key={}".format(key))
 
 
-def get_wait_confirmation_link(waiter):
-    key = waiter.generate_wait_confirmation_key()
+def get_wait_confirmation_link(key):
     return prepend_base_url("/members/waitinglist/confirm?key={}".format(key))
 
 
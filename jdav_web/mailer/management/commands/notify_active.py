@@ -2,21 +2,18 @@ from django.conf import settings
 from django.core.management.base import BaseCommand
 from django.utils.translation import gettext_lazy as _
 from mailer.mailutils import send
-from members.models import annotate_activity_score
 from members.models import Member
 
 
 class Command(BaseCommand):
     help = "Congratulates the most active members"
-    requires_system_checks = False
+    requires_system_checks = []
 
     def handle(self, *args, **options):
-        qs = list(
-            reversed(annotate_activity_score(Member.objects.all()).order_by("_activity_score"))
-        )[: settings.CONGRATULATE_MEMBERS_MAX]
+        qs = Member.objects.order_by("-activity_score")[: settings.CONGRATULATE_MEMBERS_MAX]
         for position, member in enumerate(qs):
             positiontext = "{}. ".format(position + 1) if position > 0 else ""
-            score = member._activity_score
+            score = member.activity_score
             if score < 5:
                 level = 1
             elif score >= 5 and score < 10:
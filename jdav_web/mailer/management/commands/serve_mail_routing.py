@@ -0,0 +1,115 @@
+import logging
+import os
+import socketserver
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from mailer.routing import reply_addrs
+from mailer.routing import RoutingIndex
+
+logger = logging.getLogger(__name__)
+
+# maximal length of a socketmap request as used by postfix
+MAX_REQUEST_LENGTH = 100000
+
+
+def read_netstring(stream):
+    """Read one netstring from `stream`. Returns `None` if the stream is closed."""
+    length = b""
+    while True:
+        c = stream.read(1)
+        if not c:
+            return None
+        if c == b":":
+            break
+        if not c.isdigit() or len(length) > len(str(MAX_REQUEST_LENGTH)):
+            raise ValueError("Malformed netstring length")
+        length += c
+    length = int(length)
+    if length > MAX_REQUEST_LENGTH:
+        raise ValueError("Netstring too long")
+    data = stream.read(length)
+    if len(data) != length or stream.read(1) != b",":
+        raise ValueError("Malformed netstring")
+    return data.decode()
+
+
+def netstring(data):
+    encoded = data.encode()
+    return b"%d:%s," % (len(encoded), encoded)
+
+
+def resolve(index, request):
+    """
+    Answer a socketmap request of the form `<map> <key>`. The supported maps are:
+
+    - `forward`: the forward addresses of an association address, the key is the local part
+    - `assoc`: the association address of the youth leader with the given email
+    - `reply`: the reply to addresses of a message, the key is the message id or the subject
+    """
+    name, _, key = request.partition(" ")
+    try:
+        close_old_connections()
+        if name == "forward":
+            result = ",".join(index.forward_addrs(key.split("@")[0]))
+        elif name == "assoc":
+            result = index.assoc_addr(key)
+        elif name == "reply":
+            result = ",".join(reply_addrs(message_id=key, subject=key))
+        else:
+            return f"PERM unknown map {name}"
+    except Exception as e:
+        logger.error(f"Caught exception while resolving {request}: {e}")
+        return "TEMP lookup failed"
+    if not result:
+        return "NOTFOUND "
+    return f"OK {result}"
+
+
+class SocketmapHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        while True:
+            try:
+                request = read_netstring(self.rfile)
+            except ValueError as e:
+                self.wfile.write(netstring(f"PERM {e}"))
+                return
+            if request is None:
+                return
+            self.wfile.write(netstring(resolve(self.server.index, request)))
+            self.wfile.flush()
+
+
+class ThreadingUnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class ThreadingTCPServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class Command(BaseCommand):
+    help = (
+        "Serves mail routing lookups via the postfix socketmap protocol, "
+        "e.g. socketmap:unix:/run/kompass/routing.sock:forward"
+    )
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument("--socket", default="", help="Path of the unix socket to listen on")
+        parser.add_argument("--host", default="127.0.0.1")
+        parser.add_argument("--port", type=int, default=7777)
+
+    def handle(self, *args, **options):
+        if options["socket"]:
+            if os.path.exists(options["socket"]):
+                os.remove(options["socket"])
+            server = ThreadingUnixServer(options["socket"], SocketmapHandler)
+        else:
+            server = ThreadingTCPServer((options["host"], options["port"]), SocketmapHandler)
+        server.index = RoutingIndex()
+        server.index.refresh()
+        self.stdout.write("Serving mail routing lookups")
+        with server:
+            server.serve_forever()
@@ -0,0 +1,59 @@
+# Generated by Django 5.1.15 on 2026-10-18 03:09
+
+import django.db.models.deletion
+from django.db import migrations
+from django.db import models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("mailer", "0008_alter_emailaddress_name"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Delivery",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True, primary_key=True, serialize=False, verbose_name="ID"
+                    ),
+                ),
+                ("email", models.EmailField(max_length=100, verbose_name="email")),
+                ("chunk", models.PositiveIntegerField(verbose_name="chunk")),
+                (
+                    "status",
+                    models.IntegerField(
+                        choices=[(0, "Queued"), (1, "Sent"), (2, "Failed")],
+                        default=0,
+                        verbose_name="Status",
+                    ),
+                ),
+                ("error", models.TextField(blank=True, default="", verbose_name="error")),
+                ("updated", models.DateTimeField(auto_now=True, verbose_name="updated")),
+                (
+                    "message",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="deliveries",
+                        to="mailer.message",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "delivery",
+                "verbose_name_plural": "deliveries",
+                "indexes": [
+                    models.Index(
+                        fields=["message", "chunk", "status"], name="mailer_deli_message_2060f8_idx"
+                    )
+                ],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("message", "email"), name="unique_message_delivery"
+                    )
+                ],
+            },
+        ),
+    ]
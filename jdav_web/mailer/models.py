@@ -5,11 +5,15 @@ from contrib.models import CommonModel
 from contrib.rules import has_global_perm
 from django import forms
 from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
 from django.core.exceptions import ValidationError
 from django.core.validators import RegexValidator
 from django.db import models
 from django.utils.translation import gettext
 from django.utils.translation import gettext_lazy as _
+from members.models import Freizeit
+from members.models import Member
+from members.models import MemberNoteList
 from utils import RestrictedFileField
 
 from .mailutils import addr_with_name
@@ -148,40 +152,59 @@ class Message(CommonModel):
             recipients.append(self.to_freizeit.name)
         if self.to_notelist is not None:
             recipients.append(self.to_notelist.title)
-        if 3 > self.to_members.count() > 0:
-            recipients.extend([m.name for m in self.to_members.all()])
-        elif self.to_members.count() > 2:
+        # fetch at most three members, this suffices to decide how to summarize them
+        members = list(self.to_members.all()[:3])
+        if len(members) > 2:
             recipients.append(gettext("Some other members"))
+        else:
+            recipients.extend([m.name for m in members])
         return ", ".join(recipients)
 
     get_recipients.short_description = _("recipients")
 
-    def submit(self, sender=None):
-        """Sends the mail to the specified group of members"""
-        # recipients
-        members = set()
-        # get all the members of the selected groups
-        groups = [gr.member_set.all() for gr in self.to_groups.all()]
-        members.update([m for gr in groups for m in gr])
-        # get all the individually picked members
-        members.update(self.to_members.all())
-        # get all the members of the selected freizeit
-        if self.to_freizeit is not None:
-            members.update([mol.member for mol in self.to_freizeit.membersonlist.all()])
-            members.update(self.to_freizeit.jugendleiter.all())
-        # get all the members of the selected notes list
-        if self.to_notelist is not None:
-            members.update([mol.member for mol in self.to_notelist.membersonlist.all()])
-        filtered = [m for m in members if m.gets_newsletter]
-        logger.info(f"sending mail to {filtered}")
-
-        attach = [a.f.path for a in Attachment.objects.filter(msg__id=self.pk) if a.f.name]
-
-        emails = [member.email for member in filtered]
-        emails.extend([member.alternative_email for member in filtered if member.alternative_email])
-        # remove any underscores from subject to prevent Arne from using
-        # terrible looking underscores in subjects
-        self.subject = self.subject.replace("_", " ")
+    def recipient_addresses(self):
+        """
+        Returns a queryset of the distinct `(email, alternative_email)` pairs of all members
+        receiving this message: the members of the selected groups, the individually picked
+        members, the participants and youth leaders of the selected excursion and the members
+        of the selected notes list. Members who unsubscribed from the newsletter are excluded.
+
+        The recipients are resolved in one `UNION` query, use `.iterator()` to stream
+        the result.
+        """
+        parts = [
+            Member.objects.filter(group__message=self.pk),
+            Member.objects.filter(message=self.pk),
+        ]
+        if self.to_freizeit_id is not None:
+            parts.append(
+                Member.all_objects.filter(
+                    newmemberonlist__content_type=ContentType.objects.get_for_model(Freizeit),
+                    newmemberonlist__object_id=self.to_freizeit_id,
+                )
+            )
+            parts.append(Member.objects.filter(freizeit=self.to_freizeit_id))
+        if self.to_notelist_id is not None:
+            parts.append(
+                Member.all_objects.filter(
+                    newmemberonlist__content_type=ContentType.objects.get_for_model(MemberNoteList),
+                    newmemberonlist__object_id=self.to_notelist_id,
+                )
+            )
+        parts = [
+            qs.filter(gets_newsletter=True).order_by().values_list("email", "alternative_email")
+            for qs in parts
+        ]
+        return parts[0].union(*parts[1:])
+
+    def attachment_paths(self):
+        return [a.f.path for a in Attachment.objects.filter(msg__id=self.pk) if a.f.name]
+
+    def get_envelope(self, sender=None):
+        """
+        Returns the from address, the reply to addresses and the message id used
+        when sending this message on behalf of `sender`.
+        """
         # generate message id
         message_id = "<{pk}@{domain}>".format(pk=self.pk, domain=settings.DOMAIN)
         # reply to addresses
@@ -206,6 +229,22 @@ class Message(CommonModel):
             and reply_to == []
         ):
             reply_to.append(addr_with_name(sender.email, sender.name))
+        return from_addr, reply_to, message_id
+
+    def submit(self, sender=None):
+        """Sends the mail to the specified group of members"""
+        emails = []
+        for email, alternative_email in self.recipient_addresses().iterator():
+            emails.append(email)
+            if alternative_email:
+                emails.append(alternative_email)
+        logger.info(f"sending mail to {len(emails)} addresses")
+
+        attach = self.attachment_paths()
+        # remove any underscores from subject to prevent Arne from using
+        # terrible looking underscores in subjects
+        self.subject = self.subject.replace("_", " ")
+        from_addr, reply_to, message_id = self.get_envelope(sender)
         try:
             success = send(
                 self.subject,
@@ -235,6 +274,78 @@ class Message(CommonModel):
             self.to_members.add(member)
         self.save()
 
+    def queue_deliveries(self):
+        """
+        Create a queued `Delivery` for every recipient address of this message that
+        does not have one yet and split them into chunks of `settings.DELIVERY_CHUNK_SIZE`.
+        Returns the numbers of all chunks containing queued deliveries.
+
+        Since existing deliveries are kept, calling this again after an interruption
+        only adds new recipients.
+        """
+        self.subject = self.subject.replace("_", " ")
+        self.sent = True
+        self.save()
+        known = set(self.deliveries.values_list("email", flat=True))
+        emails = []
+        for email, alternative_email in self.recipient_addresses().iterator():
+            for addr in (email, alternative_email):
+                if addr and addr not in known:
+                    known.add(addr)
+                    emails.append(addr)
+        first_chunk = self.deliveries.aggregate(chunk=models.Max("chunk"))["chunk"]
+        first_chunk = 0 if first_chunk is None else first_chunk + 1
+        size = settings.DELIVERY_CHUNK_SIZE
+        Delivery.objects.bulk_create(
+            [
+                Delivery(message=self, email=email, chunk=first_chunk + i // size)
+                for i, email in enumerate(emails)
+            ]
+        )
+        return self.queued_chunks()
+
+    def queued_chunks(self):
+        """Returns the numbers of all chunks containing queued deliveries."""
+        return list(
+            self.deliveries.filter(status=Delivery.QUEUED)
+            .order_by("chunk")
+            .values_list("chunk", flat=True)
+            .distinct()
+        )
+
+    def requeue_failed_deliveries(self):
+        """
+        Mark all failed deliveries as queued again and return the numbers of the
+        affected chunks.
+        """
+        chunks = list(
+            self.deliveries.filter(status=Delivery.FAILED)
+            .order_by("chunk")
+            .values_list("chunk", flat=True)
+            .distinct()
+        )
+        self.deliveries.filter(status=Delivery.FAILED).update(status=Delivery.QUEUED, error="")
+        return chunks
+
+    def delivery_progress(self):
+        """Returns a short summary of the delivery states of this message."""
+        counts = dict(
+            self.deliveries.order_by()
+            .values_list("status")
+            .annotate(cnt=models.Count("pk"))
+            .values_list("status", "cnt")
+        )
+        total = sum(counts.values())
+        if total == 0:
+            return "---"
+        return gettext("%(sent)d of %(total)d sent, %(failed)d failed") % {
+            "sent": counts.get(Delivery.SENT, 0),
+            "total": total,
+            "failed": counts.get(Delivery.FAILED, 0),
+        }
+
+    delivery_progress.short_description = _("Delivery progress")
+
     @classmethod
     def filter_queryset_by_change_permissions_member(cls, member, queryset):
         return member.filter_messages_by_permissions(queryset)
@@ -255,6 +366,35 @@ class Message(CommonModel):
         }
 
 
+class Delivery(models.Model):
+    """Represents the delivery state of a message to a single recipient address"""
+
+    QUEUED, SENT, FAILED = 0, 1, 2
+    STATUS_CHOICES = [
+        (QUEUED, _("Queued")),
+        (SENT, _("Sent")),
+        (FAILED, _("Failed")),
+    ]
+
+    message = models.ForeignKey(Message, on_delete=models.CASCADE, related_name="deliveries")
+    email = models.EmailField(_("email"), max_length=100)
+    chunk = models.PositiveIntegerField(_("chunk"))
+    status = models.IntegerField(_("Status"), choices=STATUS_CHOICES, default=QUEUED)
+    error = models.TextField(_("error"), default="", blank=True)
+    updated = models.DateTimeField(_("updated"), auto_now=True)
+
+    def __str__(self):
+        return self.email
+
+    class Meta:
+        verbose_name = _("delivery")
+        verbose_name_plural = _("deliveries")
+        constraints = [
+            models.UniqueConstraint(fields=["message", "email"], name="unique_message_delivery"),
+        ]
+        indexes = [models.Index(fields=["message", "chunk", "status"])]
+
+
 class MessageForm(forms.ModelForm):
     class Meta:
         model = Message
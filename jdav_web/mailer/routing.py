@@ -0,0 +1,176 @@
+import re
+import threading
+import time
+import uuid
+from bisect import bisect_left
+
+from django.core.cache import cache
+from members.models import Member
+
+from .models import EmailAddress
+from .models import Message
+
+ROUTING_VERSION_KEY = "mailer:routing:version"
+LEADER_INDEX_KEY = "mailer:routing:leaders:{version}"
+# maximal age of the routing index in seconds, this bounds the staleness if the cache is down
+MAX_INDEX_AGE = 300
+
+
+def _routing_version():
+    version = cache.get(ROUTING_VERSION_KEY)
+    if version is None:
+        cache.add(ROUTING_VERSION_KEY, uuid.uuid4().hex, None)
+        version = cache.get(ROUTING_VERSION_KEY, uuid.uuid4().hex)
+    return version
+
+
+def invalidate_routing_index():
+    """Notify all running routing indices that they need to be rebuilt."""
+    cache.set(ROUTING_VERSION_KEY, uuid.uuid4().hex, None)
+
+
+def simplify(name):
+    return name.lower().replace("ä", "ae").replace("ö", "oe").replace("ü", "ue")
+
+
+def split_name(name):
+    """Split the local part of an address like `max.mustermann` into prename and lastname."""
+    return re.match("([A-Za-z0-9]*)[ ._-]*(.*)", name).groups()
+
+
+def reply_addrs(message_id=None, subject=""):
+    """
+    Returns the reply to addresses of the message with the given id, or if there is no
+    such message, of the message with the given subject. Replies to unknown messages
+    are sent to all youth leaders.
+    """
+    replies = []
+    try:
+        message = Message.objects.get(pk=int(message_id))
+        replies = list(message.reply_to.all())
+        replies.extend(message.reply_to_email_address.all())
+    except (Message.DoesNotExist, ValueError, TypeError):
+        extracted = re.match(
+            "^([Ww][Gg]: *|[Ff][Ww]: *|[Rr][Ee]: *|[Aa][Ww]: *)* *(.*)$", subject
+        ).group(2)
+        message = Message.objects.filter(subject=extracted).first()
+        if message is not None:
+            replies = list(message.reply_to.all())
+            replies.extend(message.reply_to_email_address.all())
+
+    if not replies:
+        # send mail to all jugendleiters
+        replies = Member.objects.filter(group__name="Jugendleiter", gets_newsletter=True)
+    return [lst.email for lst in replies]
+
+
+class LeaderIndex:
+    """
+    Index of the normalized pre- and lastnames of all youth leaders. The names are kept
+    in sorted lists, such that prefix lookups are answered by bisection.
+    """
+
+    def __init__(self, members):
+        self.leaders = [(simplify(m.prename), simplify(m.lastname), m.email) for m in members]
+        self.prenames = sorted((pre, i) for i, (pre, _, _) in enumerate(self.leaders))
+        self.lastnames = sorted((last, i) for i, (_, last, _) in enumerate(self.leaders))
+
+    @classmethod
+    def cached(cls):
+        """Returns the index from the cache or builds it, if it is outdated."""
+        key = LEADER_INDEX_KEY.format(version=_routing_version())
+        index = cache.get(key)
+        if index is None:
+            members = Member.objects.filter(group__name="Jugendleiter")
+            index = cls(members.only("prename", "lastname", "email"))
+            cache.set(key, index, MAX_INDEX_AGE)
+        return index
+
+    @staticmethod
+    def _starting_with(names, prefix):
+        lo = bisect_left(names, (prefix,))
+        hi = bisect_left(names, (prefix + "\uffff",), lo)
+        return [i for _, i in names[lo:hi]]
+
+    def lookup(self, prename, lastname):
+        """
+        Returns the emails of all youth leaders matching the given (simplified) prename and
+        lastname prefixes. If only `prename` is given, it must have at least three characters
+        and may match either name. Otherwise the names may also be given in reverse order.
+        """
+        if prename and not lastname:
+            if len(prename) <= 2:
+                return []
+            found = set(self._starting_with(self.prenames, prename))
+            found.update(self._starting_with(self.lastnames, prename))
+        elif prename and lastname:
+            found = {
+                i
+                for i in self._starting_with(self.prenames, prename)
+                if self.leaders[i][1].startswith(lastname)
+            }
+            found.update(
+                i
+                for i in self._starting_with(self.prenames, lastname)
+                if self.leaders[i][1].startswith(prename)
+            )
+        else:
+            return []
+        return [self.leaders[i][2] for i in sorted(found)]
+
+
+class RoutingIndex:
+    """
+    In-memory index of email address forwards and youth leader names, used by long running
+    mail routing processes. The index is rebuilt lazily when `invalidate_routing_index`
+    was called, e.g. by the signal handlers in `mailer.signals`, or when it is older than
+    `MAX_INDEX_AGE` seconds.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.version = None
+        self.built = None
+        self.forwards = {}
+        self.leaders = LeaderIndex([])
+        self.association_emails = {}
+
+    def build(self):
+        forwards = {}
+        for address in EmailAddress.objects.prefetch_related("to_members", "to_groups__member_set"):
+            # local parts are matched case-insensitively, like in the database
+            forwards[address.name.lower()] = sorted(address.forwards)
+        leaders = Member.objects.filter(group__name="Jugendleiter").select_related("user")
+        self.forwards = forwards
+        self.leaders = LeaderIndex(leaders)
+        self.association_emails = {jl.email: jl.association_email for jl in leaders}
+
+    def refresh(self):
+        """Rebuild the index if it is outdated."""
+        version = _routing_version()
+        with self.lock:
+            if (
+                self.built is not None
+                and version == self.version
+                and time.monotonic() - self.built < MAX_INDEX_AGE
+            ):
+                return
+            self.build()
+            self.version, self.built = version, time.monotonic()
+
+    def forward_addrs(self, name):
+        """
+        Returns the forward addresses for the local part `name`. These are the forwards of
+        the email address with the given name or the emails of all youth leaders matching
+        the name.
+        """
+        self.refresh()
+        prename, lastname = split_name(name)
+        if prename.lower() in self.forwards:
+            return self.forwards[prename.lower()]
+        return self.leaders.lookup(simplify(prename), simplify(lastname))
+
+    def assoc_addr(self, sender):
+        """Returns the association email of the youth leader with email `sender`."""
+        self.refresh()
+        return self.association_emails.get(sender)
@@ -0,0 +1,28 @@
+from django.contrib.auth.models import User
+from django.db.models.signals import m2m_changed
+from django.db.models.signals import post_delete
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from members.models import Group
+from members.models import Member
+from members.models import MemberUnconfirmedProxy
+
+from .models import EmailAddress
+from .routing import invalidate_routing_index
+
+
+@receiver(post_save, sender=EmailAddress)
+@receiver(post_delete, sender=EmailAddress)
+@receiver(post_save, sender=Member)
+@receiver(post_delete, sender=Member)
+@receiver(post_save, sender=MemberUnconfirmedProxy)
+@receiver(post_delete, sender=MemberUnconfirmedProxy)
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+@receiver(post_save, sender=User)
+@receiver(m2m_changed, sender=EmailAddress.to_members.through)
+@receiver(m2m_changed, sender=EmailAddress.to_groups.through)
+@receiver(m2m_changed, sender=Member.group.through)
+def on_routing_data_changed(sender, **kwargs):
+    if kwargs.get("action", "post_").startswith("post_"):
+        invalidate_routing_index()
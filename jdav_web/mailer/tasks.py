@@ -0,0 +1,74 @@
+from celery import shared_task
+from django.conf import settings
+from django.core.mail import EmailMessage
+from members.models import Member
+
+from .mailutils import get_content
+from .mailutils import get_headers
+from .mailutils import prepare_attachment
+from .mailutils import send_each
+from .models import Delivery
+from .models import Message
+
+
+@shared_task(acks_late=True, rate_limit=settings.DELIVERY_RATE_LIMIT)
+def deliver_message_chunk(message_pk, chunk, sender_pk=None):
+    """
+    Send all queued deliveries in chunk `chunk` of the message with primary key `message_pk`
+    and store the result for every recipient. Deliveries that are not queued anymore are
+    skipped, so the task may be safely executed again after a worker restart.
+    """
+    message = Message.objects.get(pk=message_pk)
+    sender = Member.objects.filter(pk=sender_pk).first() if sender_pk is not None else None
+    deliveries = list(message.deliveries.filter(chunk=chunk, status=Delivery.QUEUED))
+    if not deliveries:
+        return 0
+    content = get_content(message.content, registration_complete=True)
+    from_addr, reply_to, message_id = message.get_envelope(sender)
+    headers = get_headers(message_id)
+    attachments = [prepare_attachment(attach) for attach in message.attachment_paths()]
+
+    def build_emails(delivery):
+        email = EmailMessage(
+            message.subject,
+            content,
+            from_addr,
+            [delivery.email],
+            headers=headers,
+            reply_to=reply_to,
+        )
+        for attach in attachments:
+            email.attach(attach)
+        return [email]
+
+    def store_result(delivery, error):
+        delivery.status = Delivery.SENT if error is None else Delivery.FAILED
+        delivery.error = "" if error is None else str(error)
+        # store the state immediately, so an interrupted chunk is not sent twice
+        delivery.save(update_fields=["status", "error", "updated"])
+
+    return send_each(deliveries, build_emails, store_result)
+
+
+def dispatch_chunks(message, chunks, sender=None):
+    sender_pk = sender.pk if sender is not None else None
+    for chunk in chunks:
+        deliver_message_chunk.delay(message.pk, chunk, sender_pk)
+    return len(chunks)
+
+
+def deliver_message(message, sender=None):
+    """
+    Queue `message` for all of its recipients and send it in chunks by background tasks.
+    Returns the number of dispatched chunks. In contrast to `Message.submit`, attachments
+    are kept, because they are needed when retrying failed deliveries.
+    """
+    return dispatch_chunks(message, message.queue_deliveries(), sender)
+
+
+def retry_failed_deliveries(message, sender=None):
+    """
+    Send the chunks of `message` containing failed deliveries again. Returns the number
+    of dispatched chunks.
+    """
+    return dispatch_chunks(message, message.requeue_failed_deliveries(), sender)
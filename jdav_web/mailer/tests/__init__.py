@@ -3,5 +3,7 @@
 from .admin import *
 from .mailutils import *
 from .models import *
+from .routing import *
 from .rules import *
+from .tasks import *
 from .views import *
@@ -179,6 +179,36 @@ class MessageAdminTestCase(AdminTestCase):
         self.assertEqual(len(messages_list), 1)
         self.assertIn(str(_("Failed to send some messages")), str(messages_list[0]))
 
+    @patch("mailer.admin.deliver_message")
+    def test_send_message_in_background(self, mock_deliver):
+        request = self.factory.post("/admin/mailer/message/")
+        request.user = self.user_with_internal_member
+        self._add_middleware(request)
+        self.admin.send_message_in_background(request, Message.objects.filter(pk=self.message.pk))
+        mock_deliver.assert_called_once_with(self.message, self.internal_member)
+
+    @patch("mailer.admin.retry_failed_deliveries")
+    def test_retry_failed_deliveries(self, mock_retry):
+        request = self.factory.post("/admin/mailer/message/")
+        request.user = self.user_with_internal_member
+        self._add_middleware(request)
+        queryset = Message.objects.filter(pk=self.message.pk)
+        mock_retry.return_value = 0
+        self.admin.retry_failed_deliveries(request, queryset)
+        mock_retry.return_value = 1
+        self.admin.retry_failed_deliveries(request, queryset)
+        messages_list = list(get_messages(request))
+        self.assertIn(str(_("There are no failed deliveries.")), str(messages_list[0]))
+        self.assertIn(str(_("Retrying failed deliveries.")), str(messages_list[1]))
+
+    def test_retry_failed_deliveries_no_member(self):
+        request = self.factory.post("/admin/mailer/message/")
+        request.user = self.user_without_member
+        self._add_middleware(request)
+        self.admin.retry_failed_deliveries(request, Message.objects.all())
+        self.admin.send_message_in_background(request, Message.objects.all())
+        self.assertEqual(len(list(get_messages(request))), 2)
+
     def test_submit_message_user_has_no_member(self):
         """Test submit_message when user has no associated member."""
         request = self.factory.post("/admin/mailer/message/")
@@ -1,9 +1,15 @@
+import os
+import tempfile
 from unittest.mock import Mock
 from unittest.mock import patch
 
+from django.core import mail
+from django.core.mail import EmailMessage
 from django.test import TestCase
 from mailer.mailutils import NOT_SENT
+from mailer.mailutils import prepare_attachment
 from mailer.mailutils import send
+from mailer.mailutils import send_each
 from mailer.mailutils import SENT
 
 
@@ -48,3 +54,80 @@ class MailUtilsTest(TestCase):
             with patch("builtins.print"):
                 result = send(self.subject, self.content, self.sender, self.recipient)
             self.assertEqual(result, NOT_SENT)
+
+    def test_send_with_attachments(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "report.pdf")
+            with open(path, "wb") as f:
+                f.write(b"%PDF-1.4 test")
+            recipients = ["a@example.com", "b@example.com", "c@example.com"]
+            with (
+                patch("mailer.mailutils.prepare_attachment", wraps=prepare_attachment) as prep,
+                patch("mailer.mailutils.mail.get_connection") as mock_connection,
+            ):
+                result = send(
+                    self.subject, self.content, self.sender, recipients, attachments=[path]
+                )
+                mails = mock_connection.return_value.send_messages.call_args.args[0]
+            self.assertEqual(result, SENT)
+            # the attachment is encoded once and shared by all mails
+            prep.assert_called_once_with(path)
+            self.assertEqual(len(mails), 3)
+            self.assertTrue(all(email.attachments[0] is mails[0].attachments[0] for email in mails))
+
+            result = send(self.subject, self.content, self.sender, recipients, attachments=[path])
+            self.assertEqual(len(mail.outbox), 3)
+            for email in mail.outbox:
+                attachment = email.message().get_payload()[1]
+                self.assertEqual(attachment.get_filename(), "report.pdf")
+                self.assertEqual(attachment.get_content_type(), "application/pdf")
+                self.assertEqual(attachment.get_payload(decode=True), b"%PDF-1.4 test")
+
+    def test_prepare_attachment_non_ascii_filename(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "Übersicht")
+            with open(path, "wb") as f:
+                f.write(b"content")
+            part = prepare_attachment(path)
+        self.assertEqual(part.get_filename(), "Übersicht")
+        self.assertEqual(part.get_content_type(), "application/octet-stream")
+        self.assertEqual(part.get_payload(decode=True), b"content")
+
+
+class SendEachTest(TestCase):
+    def build_emails(self, addr):
+        if addr is None:
+            raise KeyError("addr")
+        return [EmailMessage("Subject", "Content", "sender@example.com", [addr])]
+
+    def send(self, items):
+        results = []
+        sent = send_each(items, self.build_emails, lambda item, e: results.append((item, e)))
+        return sent, results
+
+    def test_send_each(self):
+        sent, results = self.send(["a@example.com", "b@example.com"])
+        self.assertEqual(sent, 2)
+        self.assertEqual(results, [("a@example.com", None), ("b@example.com", None)])
+        self.assertEqual(
+            [email.to for email in mail.outbox], [["a@example.com"], ["b@example.com"]]
+        )
+
+    def test_send_each_failures(self):
+        with patch("mailer.mailutils.get_delivery_connection") as mock_connection:
+            mock_connection.return_value.send_messages.side_effect = [Exception("Boom"), None]
+            sent, results = self.send(["a@example.com", None, "b@example.com"])
+        # all mails are sent over one connection, which is closed afterwards
+        mock_connection.return_value.open.assert_called_once()
+        mock_connection.return_value.close.assert_called_once()
+        self.assertEqual(sent, 1)
+        self.assertEqual([str(e) for _, e in results[:2]], ["Boom", "'addr'"])
+        self.assertEqual(results[2], ("b@example.com", None))
+
+    def test_send_each_connection_failure(self):
+        with patch("mailer.mailutils.get_delivery_connection") as mock_connection:
+            mock_connection.return_value.open.side_effect = Exception("No connection")
+            sent, results = self.send(["a@example.com", "b@example.com"])
+        self.assertEqual(sent, 0)
+        self.assertEqual([str(e) for _, e in results], ["No connection", "No connection"])
+        mock_connection.return_value.send_messages.assert_not_called()
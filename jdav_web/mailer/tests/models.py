@@ -108,6 +108,59 @@ class MessageTestCase(BasicMailerTestCase):
         recipients = self.message.get_recipients()
         self.assertIn(_("Some other members"), recipients)
 
+    def test_recipient_addresses(self):
+        participant = Member.objects.create(
+            prename="Participant",
+            lastname="Test",
+            birth_date=timezone.now().date(),
+            email="participant@test.com",
+            alternative_email="parents@test.com",
+            gender=DIVERSE,
+        )
+        leader = Member.objects.create(
+            prename="Leader",
+            lastname="Test",
+            birth_date=timezone.now().date(),
+            email="leader@test.com",
+            gender=DIVERSE,
+        )
+        unsubscribed = Member.objects.create(
+            prename="Unsubscribed",
+            lastname="Test",
+            birth_date=timezone.now().date(),
+            email="unsubscribed@test.com",
+            gender=DIVERSE,
+            gets_newsletter=False,
+        )
+        self.freizeit.add_members([participant, unsubscribed])
+        self.freizeit.jugendleiter.add(leader)
+        self.notelist.add_members([self.paul, self.fritz])
+
+        # warm up the content type cache
+        self.message.recipient_addresses()
+        with self.assertNumQueries(1):
+            addresses = list(self.message.recipient_addresses().iterator())
+        self.assertCountEqual(
+            addresses,
+            [
+                ("fritz@foo.com", None),
+                ("paul@foo.com", None),
+                ("participant@test.com", "parents@test.com"),
+                ("leader@test.com", None),
+            ],
+        )
+
+    @mock.patch("mailer.models.send")
+    def test_submit_recipients(self, mock_send):
+        mock_send.return_value = SENT
+        self.paul.alternative_email = "paul@bar.com"
+        self.paul.save()
+        self.notelist.add_members([self.paul])
+        self.message.submit(sender=self.sender)
+        self.assertCountEqual(
+            mock_send.call_args.args[3], ["fritz@foo.com", "paul@foo.com", "paul@bar.com"]
+        )
+
     @mock.patch("mailer.models.send")
     def test_submit_successful(self, mock_send):
         # Mock successful email sending
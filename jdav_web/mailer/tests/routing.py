@@ -0,0 +1,116 @@
+from io import BytesIO
+from io import StringIO
+
+from django.core.management import call_command
+from django.utils import timezone
+from mailer.management.commands.serve_mail_routing import netstring
+from mailer.management.commands.serve_mail_routing import read_netstring
+from mailer.management.commands.serve_mail_routing import resolve
+from mailer.models import EmailAddress
+from mailer.models import Message
+from mailer.routing import LeaderIndex
+from mailer.routing import RoutingIndex
+from members.models import DIVERSE
+from members.models import Group
+from members.models import Member
+
+from .utils import BasicMailerTestCase
+
+
+class RoutingTestCase(BasicMailerTestCase):
+    def setUp(self):
+        super().setUp()
+        self.jl = Group.objects.create(name="Jugendleiter")
+        self.leader = Member.objects.create(
+            prename="Jörg",
+            lastname="Müller",
+            birth_date=timezone.now().date(),
+            email="joerg@foo.com",
+            gender=DIVERSE,
+        )
+        self.leader.group.add(self.jl)
+        self.index = RoutingIndex()
+
+    def test_forward_addrs(self):
+        self.assertEqual(self.index.forward_addrs("foobar"), ["fritz@foo.com", "paul@foo.com"])
+        self.assertEqual(self.index.forward_addrs("joerg.mueller"), ["joerg@foo.com"])
+        self.assertEqual(self.index.forward_addrs("mueller_joerg"), ["joerg@foo.com"])
+        self.assertEqual(self.index.forward_addrs("joe"), ["joerg@foo.com"])
+        self.assertEqual(self.index.forward_addrs("jo"), [])
+        self.assertEqual(self.index.forward_addrs("paul.wulter"), [])
+
+    def test_forward_addrs_mixed_case(self):
+        address = EmailAddress.objects.create(name="Vorstand")
+        address.to_members.add(self.fritz)
+        self.assertEqual(self.index.forward_addrs("vorstand"), ["fritz@foo.com"])
+        self.assertEqual(self.index.forward_addrs("Vorstand"), ["fritz@foo.com"])
+        self.assertEqual(self.index.forward_addrs("FOOBAR"), ["fritz@foo.com", "paul@foo.com"])
+
+    def test_leader_index(self):
+        index = LeaderIndex.cached()
+        self.assertEqual(index.lookup("joe", ""), ["joerg@foo.com"])
+        self.assertEqual(index.lookup("muel", ""), ["joerg@foo.com"])
+        self.assertEqual(index.lookup("mue", "j"), ["joerg@foo.com"])
+        self.assertEqual(index.lookup("j", "mue"), ["joerg@foo.com"])
+        self.assertEqual(index.lookup("j", "x"), [])
+        self.assertEqual(index.lookup("", "mueller"), [])
+
+    def test_leader_index_cached(self):
+        LeaderIndex.cached()
+        with self.assertNumQueries(0):
+            self.assertEqual(LeaderIndex.cached().lookup("fritz", ""), [])
+        # saving a member invalidates the index
+        self.fritz.group.add(self.jl)
+        self.assertEqual(LeaderIndex.cached().lookup("fritz", ""), ["fritz@foo.com"])
+        self.fritz.prename = "Fred"
+        self.fritz.save()
+        self.assertEqual(LeaderIndex.cached().lookup("fritz", ""), [])
+
+    def test_assoc_addr(self):
+        self.assertEqual(self.index.assoc_addr("joerg@foo.com"), self.leader.association_email)
+        self.assertIsNone(self.index.assoc_addr("fritz@foo.com"))
+
+    def test_refresh(self):
+        self.index.refresh()
+        with self.assertNumQueries(0):
+            self.index.forward_addrs("foobar")
+        # changes to the data invalidate the index
+        self.fritz.group.add(self.jl)
+        self.assertEqual(self.index.forward_addrs("fritz"), ["fritz@foo.com"])
+        self.em.to_members.remove(self.paul)
+        self.assertEqual(self.index.forward_addrs("foobar"), ["fritz@foo.com"])
+
+    def test_resolve(self):
+        self.assertEqual(
+            resolve(self.index, "forward foobar@example.org"), "OK fritz@foo.com,paul@foo.com"
+        )
+        self.assertEqual(resolve(self.index, "forward nobody"), "NOTFOUND ")
+        self.assertEqual(
+            resolve(self.index, "assoc joerg@foo.com"), f"OK {self.leader.association_email}"
+        )
+        self.assertEqual(resolve(self.index, "reply 1234"), "OK joerg@foo.com")
+        self.assertTrue(resolve(self.index, "unknown foo").startswith("PERM"))
+
+    def test_netstring(self):
+        stream = BytesIO(netstring("forward foobar") + netstring("assoc ä"))
+        self.assertEqual(read_netstring(stream), "forward foobar")
+        self.assertEqual(read_netstring(stream), "assoc ä")
+        self.assertIsNone(read_netstring(stream))
+        with self.assertRaises(ValueError):
+            read_netstring(BytesIO(b"3:abcd"))
+        with self.assertRaises(ValueError):
+            read_netstring(BytesIO(b"x:abc,"))
+
+    def test_commands(self):
+        out = StringIO()
+        call_command("get_forward_addrs", name="joerg.mueller", stdout=out)
+        self.assertEqual(out.getvalue().strip(), "joerg@foo.com")
+
+        message = Message.objects.create(subject="Hello", content="Test")
+        message.reply_to.add(self.fritz)
+        out = StringIO()
+        call_command("reply_addrs", subject="Re: Hello", stdout=out)
+        self.assertEqual(out.getvalue().strip(), "fritz@foo.com")
+        out = StringIO()
+        call_command("reply_addrs", message_id=str(message.pk), stdout=out)
+        self.assertEqual(out.getvalue().strip(), "fritz@foo.com")
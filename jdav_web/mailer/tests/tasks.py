@@ -0,0 +1,90 @@
+from unittest import mock
+
+from django.core import mail
+from django.test import override_settings
+from django.utils import timezone
+from mailer.models import Delivery
+from mailer.models import Message
+from mailer.tasks import deliver_message
+from mailer.tasks import deliver_message_chunk
+from mailer.tasks import retry_failed_deliveries
+from members.models import DIVERSE
+from members.models import Member
+
+from .utils import BasicMailerTestCase
+
+
+@override_settings(DELIVERY_CHUNK_SIZE=2)
+class DeliveryTestCase(BasicMailerTestCase):
+    def setUp(self):
+        super().setUp()
+        self.message = Message.objects.create(subject="Test_Message", content="Test content")
+        self.message.to_groups.add(self.mygroup)
+        self.message.to_members.add(self.paul)
+        for i in range(3):
+            member = Member.objects.create(
+                prename=f"Member{i}",
+                lastname="Test",
+                birth_date=timezone.now().date(),
+                email=f"member{i}@test.com",
+                gender=DIVERSE,
+            )
+            self.message.to_members.add(member)
+
+    def test_queue_deliveries(self):
+        chunks = self.message.queue_deliveries()
+        self.assertEqual(chunks, [0, 1, 2])
+        self.assertEqual(self.message.deliveries.count(), 5)
+        self.assertEqual(self.message.subject, "Test Message")
+        self.assertTrue(self.message.sent)
+
+        # queueing again does not duplicate deliveries, but keeps the queued chunks
+        self.assertEqual(self.message.queue_deliveries(), [0, 1, 2])
+        self.assertEqual(self.message.deliveries.count(), 5)
+
+        # new recipients are added in new chunks
+        self.message.to_members.add(
+            Member.objects.create(
+                prename="Late",
+                lastname="Test",
+                birth_date=timezone.now().date(),
+                email="late@test.com",
+                gender=DIVERSE,
+            )
+        )
+        self.message.deliveries.update(status=Delivery.SENT)
+        self.assertEqual(self.message.queue_deliveries(), [3])
+
+    @mock.patch("mailer.tasks.deliver_message_chunk.delay")
+    def test_deliver_message(self, mock_delay):
+        self.assertEqual(deliver_message(self.message, self.paul), 3)
+        mock_delay.assert_any_call(self.message.pk, 0, self.paul.pk)
+        mock_delay.assert_any_call(self.message.pk, 2, self.paul.pk)
+
+    def test_deliver_message_chunk(self):
+        self.message.queue_deliveries()
+        self.assertEqual(deliver_message_chunk(self.message.pk, 0), 2)
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertEqual(self.message.deliveries.filter(status=Delivery.SENT).count(), 2)
+        # executing the task again does not send anything
+        self.assertEqual(deliver_message_chunk(self.message.pk, 0), 0)
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertIn("2 of 5 sent", self.message.delivery_progress())
+
+    @mock.patch("mailer.tasks.deliver_message_chunk.delay")
+    def test_retry_failed_deliveries(self, mock_delay):
+        self.message.queue_deliveries()
+        with mock.patch("mailer.mailutils.get_delivery_connection") as mock_connection:
+            mock_connection.return_value.send_messages.side_effect = [None, Exception("Boom")]
+            self.assertEqual(deliver_message_chunk(self.message.pk, 1), 1)
+        failed = self.message.deliveries.get(status=Delivery.FAILED)
+        self.assertEqual(failed.error, "Boom")
+        self.assertIn("1 failed", self.message.delivery_progress())
+
+        self.assertEqual(retry_failed_deliveries(self.message), 1)
+        mock_delay.assert_called_once_with(self.message.pk, 1, None)
+        failed.refresh_from_db()
+        self.assertEqual(failed.status, Delivery.QUEUED)
+
+    def test_delivery_progress_empty(self):
+        self.assertEqual(self.message.delivery_progress(), "---")
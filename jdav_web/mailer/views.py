@@ -3,6 +3,7 @@ from django.http import HttpResponseRedirect
 from django.shortcuts import render
 from django.urls import reverse
 from django.utils.translation import gettext_lazy as _
+from members.models import get_by_key
 from members.models import Member
 
 from .mailutils import get_unsubscribe_link
@@ -28,7 +29,7 @@ def unsubscribe(request):
     if request.method == "GET" and "key" in request.GET:
         try:
             key = request.GET["key"]
-            member = Member.objects.get(unsubscribe_key=key)
+            member = get_by_key(Member.objects, "unsubscribe_key", key)
             if not member.unsubscribe(key):
                 raise KeyError
         except (KeyError, Member.DoesNotExist):
@@ -28,6 +28,7 @@ from django.db.models import When
 from django.forms import Textarea
 from django.forms import TypedChoiceField
 from django.http import HttpResponseRedirect
+from django.http import StreamingHttpResponse
 from django.shortcuts import render
 from django.urls import path
 from django.urls import reverse
@@ -37,20 +38,29 @@ from django.utils.translation import gettext_lazy as _
 from finance.models import BillOnExcursionProxy
 from finance.models import StatementOnExcursionProxy
 from mailer.models import Message
-from members.pdf import render_tex_with_attachments
 from schwifty import IBAN
 from utils import get_member
 from utils import mondays_until_nth
+from utils import normalize_filename
 from utils import RestrictedFileField
 
+from .csv import stream_generalized_csv
+from .documents import DOCUMENTS
+from .documents import generate_crisis_intervention_list_pdf
+from .documents import serve_document
 from .excel import generate_group_overview
+from .excel import generate_klettertreff_overview
 from .excel import generate_ljp_vbk
 from .models import ActivityCategory
-from .models import annotate_activity_score
+from .models import attendance_matrix
+from .models import DocumentJob
+from .models import EchoCampaign
+from .models import EchoRequest
 from .models import EmergencyContact
 from .models import Freizeit
 from .models import Group
 from .models import Intervention
+from .models import InvitationBatch
 from .models import InvitationToGroup
 from .models import Klettertreff
 from .models import KlettertreffAttendee
@@ -66,10 +76,13 @@ from .models import PermissionGroup
 from .models import PermissionMember
 from .models import RegistrationPassword
 from .models import TrainingCategory
+from .models import WaitingConfirmationRun
 from .models import WEEKDAYS
-from .pdf import fill_pdf_form
-from .pdf import render_docx
 from .pdf import render_tex
+from .tasks import dispatch_echo_chunks
+from .tasks import send_invitation_batch
+from .tasks import start_echo_campaign
+from .tasks import start_invitation_batch
 
 # from easy_select2 import apply_select2
 
@@ -228,83 +241,6 @@ class CrisisInterventionListForm(forms.Form):
     )
 
 
-def generate_crisis_intervention_list_pdf(
-    *,
-    name,
-    description,
-    code,
-    place,
-    destination,
-    groups,
-    staff,
-    start_date,
-    end_date,
-    tour_type,
-    tour_approach,
-    members,
-):
-    """Generate a crisis intervention list PDF.
-
-    Args:
-        name: Activity name
-        description: Activity description
-        code: Activity code (e.g., K-260101)
-        place: Location of the activity
-        destination: Destination (optional, e.g., a peak)
-        groups: List or queryset of Group objects
-        staff: List or queryset of Member objects (youth leaders)
-        start_date: Start date of the activity
-        end_date: End date of the activity
-        tour_type: Tour type identifier (empty string for ad-hoc lists)
-        tour_approach: Tour approach identifier (empty string for ad-hoc lists)
-        members: List of Member objects participating in the activity
-
-    Returns:
-        HttpResponse with the generated PDF
-    """
-    # Format groups string
-    groups_str = ", ".join([g.name for g in groups]) if groups else ""
-
-    # Format staff string
-    staff_str = ", ".join([s.name for s in staff]) if staff else ""
-
-    # Format time period string
-    # Handle both date and datetime objects
-    start_date_only = start_date.date() if hasattr(start_date, "date") else start_date
-    end_date_only = end_date.date() if hasattr(end_date, "date") else end_date
-
-    if start_date_only == end_date_only:
-        time_period_str = start_date_only.strftime("%d.%m.%Y")
-    else:
-        time_period_str = (
-            f"{start_date_only.strftime('%d.%m.%Y')} - {end_date_only.strftime('%d.%m.%Y')}"
-        )
-
-    context = {
-        "name": name,
-        "description": description,
-        "code": code,
-        "place": place,
-        "destination": destination,
-        "groups_str": groups_str,
-        "staff_str": staff_str,
-        "time_period_str": time_period_str,
-        "tour_type": tour_type,
-        "tour_approach": tour_approach,
-        "members": members,
-        "settings": settings,
-    }
-
-    # Use description for filename if name is long, otherwise use name
-    filename_base = description if len(name) > 30 else name
-    return render_tex(
-        f"{filename_base}_Krisenliste",
-        "members/crisis_intervention_list.tex",
-        context,
-        date=start_date,
-    )
-
-
 class MemberAdminForm(forms.ModelForm):
     class Meta:
         model = Member
@@ -416,7 +352,14 @@ class MemberAdmin(ExtraButtonsMixin, CommonAdminMixin, admin.ModelAdmin):
     }
     change_form_template = "members/change_member.html"
     ordering = ("lastname",)
-    actions = ["create_object_from", "request_echo", "invite_as_user_action", "unconfirm"]
+    actions = [
+        "create_object_from",
+        "request_echo",
+        "request_echo_campaign",
+        "invite_as_user_action",
+        "unconfirm",
+        "export_csv",
+    ]
     list_per_page = 25
 
     form = MemberAdminForm
@@ -461,7 +404,7 @@ class MemberAdmin(ExtraButtonsMixin, CommonAdminMixin, admin.ModelAdmin):
 
     def get_queryset(self, request):
         queryset = super().get_queryset(request)
-        return annotate_activity_score(queryset.prefetch_related("group"))
+        return queryset.prefetch_related("group")
 
     def _get_group_from_request(self, request):
         """Return the Group matching a group__id__exact filter in the request, if any."""
@@ -664,6 +607,35 @@ class MemberAdmin(ExtraButtonsMixin, CommonAdminMixin, admin.ModelAdmin):
 
     request_echo.short_description = _("Request echo from selected members")
 
+    def request_echo_campaign(self, request, queryset):
+        """
+        Request echo from the selected members in the background. Keys are generated in bulk
+        and the mails are sent in chunks by background tasks, the progress is shown on the
+        page of the resulting `EchoCampaign`.
+        """
+        queryset = queryset.filter(gets_newsletter=True)
+        for member in queryset.filter(birth_date__isnull=True):
+            messages.error(
+                request,
+                _(
+                    "Member {name} doesn't have a birthdate set, which is mandatory for echo requests"
+                ).format(name=member.name),
+            )
+        members = list(queryset.filter(birth_date__isnull=False))
+        if not members:
+            return
+        campaign = start_echo_campaign(members, created_by=get_member(request))
+        messages.success(
+            request,
+            _("Echo is being requested from %(count)d members in the background.")
+            % {"count": len(members)},
+        )
+        return HttpResponseRedirect(
+            reverse("admin:members_echocampaign_change", args=(campaign.pk,))
+        )
+
+    request_echo_campaign.short_description = _("Request echo from selected members in background")
+
     @extra_button(_("Request echo"), url_name="requestecho")
     def request_echo_view(self, request, member):
         """Request echo from a single member from Button in single member view."""
@@ -753,6 +725,20 @@ class MemberAdmin(ExtraButtonsMixin, CommonAdminMixin, admin.ModelAdmin):
     invite_as_user_action.short_description = _("Invite selected members to join Kompass as users.")
     invite_as_user_action.allowed_permissions = ("may_invite_as_user",)
 
+    def has_view_global_permission(self, request):
+        return request.user.has_perm("members.view_global_member")
+
+    def export_csv(self, request, queryset):
+        filename = normalize_filename("mitglieder", date=timezone.now()) + ".csv"
+        response = StreamingHttpResponse(
+            stream_generalized_csv(queryset.order_by("pk")), content_type="text/csv"
+        )
+        response["Content-Disposition"] = f'attachment; filename="{filename}"'
+        return response
+
+    export_csv.short_description = _("Export selected members as CSV")
+    export_csv.allowed_permissions = ("view_global",)
+
     @extra_button(
         _("Invite as user"),
         url_name="inviteasuser",
@@ -808,7 +794,7 @@ class MemberAdmin(ExtraButtonsMixin, CommonAdminMixin, admin.ModelAdmin):
         return render(request, "admin/invite_as_user.html", context=context)
 
     def activity_score(self, obj):
-        score = obj._activity_score
+        score = obj.activity_score
         # show 1 to 5 climbers based on activity in last year
         if score < 5:
             level = 1
@@ -824,7 +810,7 @@ class MemberAdmin(ExtraButtonsMixin, CommonAdminMixin, admin.ModelAdmin):
             level * '<img height=20px src="{}"/>&nbsp;'.format("/static/admin/img/climber.png")
         )
 
-    activity_score.admin_order_field = "_activity_score"
+    activity_score.admin_order_field = "activity_score"
     activity_score.short_description = _("activity")
 
     def name_text_or_link(self, obj):
@@ -1159,14 +1145,27 @@ class WaiterInviteForm(forms.Form):
 class WaiterInviteTextForm(forms.Form):
     _selected_action = forms.CharField(widget=forms.MultipleHiddenInput)
     text_template = forms.CharField(
-        label=_("Invitation text"), widget=forms.Textarea(attrs={"rows": 30, "cols": 100})
+        label=_("Invitation text"),
+        widget=forms.Textarea(attrs={"rows": 30, "cols": 100}),
+        required=False,
+        strip=False,
     )
 
+    def clean_text_template(self):
+        text_template = self.cleaned_data["text_template"]
+        try:
+            text_template.format(**dict.fromkeys(InvitationToGroup.TEXT_PLACEHOLDERS, ""))
+        except (KeyError, IndexError, ValueError) as e:
+            raise forms.ValidationError(
+                _("The invitation text contains an invalid placeholder: %(error)s") % {"error": e}
+            )
+        return text_template
+
 
 class InvitationToGroupAdmin(CommonAdminInlineMixin, admin.TabularInline):
     model = InvitationToGroup
-    fields = ["group", "date", "status"]
-    readonly_fields = ["group", "date", "status"]
+    fields = ["group", "date", "status", "mail_status"]
+    readonly_fields = ["group", "date", "status", "mail_status"]
     extra = 0
     can_delete = False
 
@@ -1330,6 +1329,20 @@ class MemberWaitingListAdmin(ExtraButtonsMixin, CommonAdminMixin, admin.ModelAdm
     ask_for_registration_action.short_description = _("Offer waiter a place in a group.")
     ask_for_registration_action.allowed_permissions = ("action",)
 
+    def render_invite_text(self, request, group, queryset, waiter, form):
+        context = dict(
+            self.admin_site.each_context(request),
+            title=_("Select group for invitation"),
+            view_header=_("Invite to group"),
+            opts=self.opts,
+            group=group,
+            queryset=queryset,
+            form=form,
+        )
+        if waiter:
+            context = dict(context, object=waiter, waiter=waiter)
+        return render(request, "admin/invite_for_group_text.html", context=context)
+
     @extra_button(
         _("Invite to group"),
         permission="members.change_global_memberwaitinglist",
@@ -1363,23 +1376,13 @@ class MemberWaitingListAdmin(ExtraButtonsMixin, CommonAdminMixin, admin.ModelAdm
                     ),
                 )
                 return HttpResponseRedirect(request.get_full_path())
-            context = dict(
-                self.admin_site.each_context(request),
-                title=_("Select group for invitation"),
-                view_header=_("Invite to group"),
-                opts=self.opts,
-                group=group,
-                queryset=queryset,
-                form=WaiterInviteTextForm(
-                    initial={
-                        "_selected_action": id_list,
-                        "text_template": group.get_invitation_text_template(),
-                    }
-                ),
+            form = WaiterInviteTextForm(
+                initial={
+                    "_selected_action": id_list,
+                    "text_template": group.get_invitation_text_template(),
+                }
             )
-            if waiter:
-                context = dict(context, object=waiter, waiter=waiter)
-            return render(request, "admin/invite_for_group_text.html", context=context)
+            return self.render_invite_text(request, group, queryset, waiter, form)
 
         if "send" in request.POST:
             try:
@@ -1391,6 +1394,22 @@ class MemberWaitingListAdmin(ExtraButtonsMixin, CommonAdminMixin, admin.ModelAdm
                     _("An error occurred while trying to invite said members. Please try again."),
                 )
                 return HttpResponseRedirect(request.get_full_path())
+            form = WaiterInviteTextForm(request.POST)
+            if not form.is_valid() and "text_template" in form.errors:
+                return self.render_invite_text(request, group, queryset, waiter, form)
+            if not waiter:
+                # invite all selected waiters at once and send the mails in the background
+                batch = start_invitation_batch(
+                    queryset, group, text_template, created_by=get_member(request)
+                )
+                messages.success(
+                    request,
+                    _("Invitations to %(group)s are being sent to %(count)d waiters.")
+                    % {"group": group.name, "count": batch.invitations.count()},
+                )
+                return HttpResponseRedirect(
+                    reverse("admin:members_invitationbatch_change", args=(batch.pk,))
+                )
             for w in queryset:
                 w.invite_to_group(
                     group,
@@ -1502,7 +1521,7 @@ class GroupAdmin(admin.ModelAdmin):
 
         ensure_media_dir()
         filename = generate_group_overview(all_groups=self.model.objects.all())
-        response = serve_media(filename=filename, content_type="application/xlsx")
+        response = serve_media(filename=filename, content_type="application/xlsx", delete=True)
 
         return response
 
@@ -1961,24 +1980,7 @@ class FreizeitAdmin(ExtraButtonsMixin, CommonAdminMixin, nested_admin.NestedMode
         permission=may_view_excursion.__func__,
     )
     def crisis_intervention_list(self, request, memberlist):
-        # Get all members on the list
-        members = [mol.member for mol in memberlist.membersonlist.all()]
-
-        # Generate PDF using shared function
-        return generate_crisis_intervention_list_pdf(
-            name=memberlist.name,
-            description=memberlist.description,
-            code=memberlist.code,
-            place=memberlist.place,
-            destination=memberlist.destination,
-            groups=memberlist.groups.all(),
-            staff=memberlist.jugendleiter.all(),
-            start_date=memberlist.date,
-            end_date=memberlist.end,
-            tour_type=memberlist.get_tour_type_display(),
-            tour_approach=memberlist.get_tour_approach_display(),
-            members=members,
-        )
+        return serve_document(request, "crisis_intervention_list", memberlist)
 
     crisis_intervention_list.short_description = _("Generate crisis intervention list")
 
@@ -1990,14 +1992,7 @@ class FreizeitAdmin(ExtraButtonsMixin, CommonAdminMixin, nested_admin.NestedMode
         permission=may_view_excursion.__func__,
     )
     def notes_list(self, request, memberlist):
-        people, skills = memberlist.skill_summary
-        context = dict(memberlist=memberlist, people=people, skills=skills, settings=settings)
-        return render_tex(
-            f"{memberlist.code}_{memberlist.name}_Notizen",
-            "members/notes_list.tex",
-            context,
-            date=memberlist.date,
-        )
+        return serve_document(request, "notes_list", memberlist)
 
     notes_list.short_description = _("Generate overview")
 
@@ -2008,25 +2003,11 @@ class FreizeitAdmin(ExtraButtonsMixin, CommonAdminMixin, nested_admin.NestedMode
 
     @decorate_download
     def download_seminar_report_docx(self, request, memberlist):
-        title = memberlist.ljpproposal.title
-        context = dict(memberlist=memberlist, settings=settings)
-        return render_docx(
-            f"{memberlist.code}_{title}_Seminarbericht",
-            "members/seminar_report_docx.tex",
-            context,
-            date=memberlist.date,
-        )
+        return serve_document(request, "seminar_report_docx", memberlist)
 
     @decorate_download
     def download_seminar_report_costs_and_participants(self, request, memberlist):
-        title = memberlist.ljpproposal.title
-        context = dict(memberlist=memberlist, settings=settings)
-        return render_tex(
-            f"{memberlist.code}_{title}_TN_Kosten",
-            "members/seminar_report.tex",
-            context,
-            date=memberlist.date,
-        )
+        return serve_document(request, "seminar_report_costs", memberlist)
 
     @decorate_download
     def download_ljp_proofs(self, request, memberlist):
@@ -2039,26 +2020,7 @@ class FreizeitAdmin(ExtraButtonsMixin, CommonAdminMixin, nested_admin.NestedMode
                 )
             )
 
-        statement = memberlist.statement
-        all_bills = list(statement.bill_set.all())
-
-        context = dict(
-            statement=statement,
-            excursion=memberlist,
-            all_bills=all_bills,
-            total_bills=statement.total_bills_theoretic,
-            total_allowance=statement.total_allowance,
-            total_theoretic=statement.total_theoretic,
-            allowance_to=statement.allowance_to.all(),
-            allowance_per_yl=statement.allowance_per_yl,
-            settings=settings,
-        )
-
-        pdf_filename = f"{memberlist.code}_{memberlist.name}_LJP_Nachweis"
-        attachments = [bill.proof.path for bill in all_bills if bill.proof]
-        return render_tex_with_attachments(
-            pdf_filename, "finance/ljp_statement.tex", context, attachments
-        )
+        return serve_document(request, "ljp_proofs", memberlist)
 
     @extra_button(
         _("Generate seminar report"),
@@ -2127,20 +2089,8 @@ class FreizeitAdmin(ExtraButtonsMixin, CommonAdminMixin, nested_admin.NestedMode
                 messages.error(request, _("Please select an invoice."))
                 return self.render_sjr_options(request, memberlist, form)
 
-            selected_attachments = [form.cleaned_data["invoice"]]
-            context = memberlist.sjr_application_fields()
-            title = (
-                memberlist.ljpproposal.title
-                if hasattr(memberlist, "ljpproposal")
-                else memberlist.name
-            )
-
-            return fill_pdf_form(
-                f"{memberlist.code}_{title}_SJR_Antrag",
-                "members/sjr_template.pdf",
-                context,
-                selected_attachments,
-                date=memberlist.date,
+            return serve_document(
+                request, "sjr_application", memberlist, invoice=form.cleaned_data["invoice"]
             )
 
         return self.render_sjr_options(
@@ -2206,17 +2156,18 @@ class FreizeitAdmin(ExtraButtonsMixin, CommonAdminMixin, nested_admin.NestedMode
                     args=(memberlist.pk,),
                 )
             )
-        context = dict(
-            self.admin_site.each_context(request),
-            title=_("Finance overview"),
-            opts=self.opts,
-            memberlist=memberlist,
-            object=memberlist,
-            ljp_contributions=memberlist.payable_ljp_contributions,
-            total_relative_costs=memberlist.total_relative_costs,
-            **memberlist.statement.template_context(),
-        )
-        return render(request, "admin/freizeit_finance_overview.html", context=context)
+        with memberlist.statement.calculating():
+            context = dict(
+                self.admin_site.each_context(request),
+                title=_("Finance overview"),
+                opts=self.opts,
+                memberlist=memberlist,
+                object=memberlist,
+                ljp_contributions=memberlist.payable_ljp_contributions,
+                total_relative_costs=memberlist.total_relative_costs,
+                **memberlist.statement.template_context(),
+            )
+            return render(request, "admin/freizeit_finance_overview.html", context=context)
 
     # TODO: can this be integrated into the extra_button's framework?
     def get_urls(self):
@@ -2297,23 +2248,36 @@ class KlettertreffAdmin(admin.ModelAdmin):
     list_display = ["__str__", "date", "get_jugendleiter"]
     search_fields = ("date", "location", "topic")
     list_filter = [("date", DateFieldListFilter), "group"]
-    actions = ["overview"]
+    actions = ["overview", "overview_excel"]
 
-    def overview(self, request, queryset):
+    def attendance(self, request, queryset):
         group = request.GET.get("group__id__exact")
         if group is not None:
             members = Member.objects.filter(group=group)
         else:
             members = Member.objects.all()
+        klettertreffs = list(queryset)
+        jugendleiter_rows, member_rows = attendance_matrix(
+            klettertreffs, Member.objects.filter(group__name="Jugendleiter"), members
+        )
+        return klettertreffs, jugendleiter_rows, member_rows
+
+    def overview(self, request, queryset):
+        klettertreffs, jugendleiter_rows, member_rows = self.attendance(request, queryset)
         context = {
-            "klettertreffs": queryset,
-            "members": members,
-            "attendees": KlettertreffAttendee.objects.all(),
-            "jugendleiters": Member.objects.filter(group__name="Jugendleiter"),
+            "klettertreffs": klettertreffs,
+            "jugendleiter_rows": jugendleiter_rows,
+            "member_rows": member_rows,
         }
 
         return render(request, "admin/klettertreff_overview.html", context)
 
+    def overview_excel(self, request, queryset):
+        filename = generate_klettertreff_overview(*self.attendance(request, queryset))
+        return serve_media(filename, "application/xlsx", delete=True)
+
+    overview_excel.short_description = _("Export attendance overview as excel sheet")
+
     # formfield_overrides = {
     #    ManyToManyField: {'widget': forms.CheckboxSelectMultiple},
     #    ForeignKey: {'widget': apply_select2(forms.Select)}
@@ -2344,6 +2308,140 @@ class MemberTrainingAdmin(CommonAdminMixin, nested_admin.NestedModelAdmin):
     ordering = ("-date",)
 
 
+class DocumentJobAdmin(ExtraButtonsMixin, CommonAdminMixin, admin.ModelAdmin):
+    list_display = ("__str__", "status", "created", "finished", "created_by")
+    list_filter = ("status", "document")
+    fields = ("document_label", "target", "status", "created", "finished", "filename", "error")
+    readonly_fields = fields
+    change_form_template = "members/change_progress.html"
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+    def document_label(self, job):
+        return job.document_label
+
+    document_label.short_description = _("Document")
+
+    def target(self, job):
+        return str(job.obj)
+
+    target.short_description = _("Object")
+
+    @staticmethod
+    def may_view_job(request, job):
+        return request.user.has_perm("members.view_obj_documentjob", job)
+
+    @extra_button(
+        _("Download"),
+        condition=lambda job: job.status == DocumentJob.DONE,
+        permission=may_view_job.__func__,
+        target="_blank",
+    )
+    def download(self, request, job):
+        if job.status != DocumentJob.DONE:
+            messages.error(request, _("The document is not available."))
+            return HttpResponseRedirect(reverse("admin:members_documentjob_change", args=(job.pk,)))
+        return serve_media(job.filename, DOCUMENTS[job.document].content_type)
+
+    download.short_description = _("Download")
+
+
+class EchoRequestInline(admin.TabularInline):
+    model = EchoRequest
+    fields = ("member", "status", "echoed", "error", "updated")
+    readonly_fields = fields
+    extra = 0
+    can_delete = False
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related("member")
+
+    def echoed(self, echo_request):
+        return echo_request.member.echoed
+
+    echoed.boolean = True
+    echoed.short_description = _("Echoed")
+
+
+class WaitingConfirmationRunAdmin(admin.ModelAdmin):
+    list_display = ("__str__", "waiters", "chunks", "sent", "failed", "dispatched")
+    fields = ("started", "dispatched", "waiters", "chunks", "sent", "failed")
+    readonly_fields = fields
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+class InvitationOnBatchInline(admin.TabularInline):
+    model = InvitationToGroup
+    fields = ("waiter", "mail_status", "mail_error", "status")
+    readonly_fields = fields
+    extra = 0
+    can_delete = False
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related("waiter")
+
+
+class InvitationBatchAdmin(CommonAdminMixin, admin.ModelAdmin):
+    list_display = ("__str__", "progress", "created", "created_by")
+    fields = ("group", "created", "created_by", "progress", "text_template")
+    readonly_fields = fields
+    inlines = [InvitationOnBatchInline]
+    actions = ["retry_failed_invitations"]
+    change_form_template = "members/change_progress.html"
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+    def retry_failed_invitations(self, request, queryset):
+        retried = 0
+        for batch in queryset:
+            if batch.requeue_failed_invitations():
+                send_invitation_batch.delay(batch.pk)
+                retried += 1
+        if retried:
+            messages.success(request, _("Retrying failed invitations."))
+        else:
+            messages.info(request, _("There are no failed invitations."))
+
+    retry_failed_invitations.short_description = _("Retry failed invitations")
+
+
+class EchoCampaignAdmin(CommonAdminMixin, admin.ModelAdmin):
+    list_display = ("__str__", "progress", "created", "created_by")
+    fields = ("created", "created_by", "progress")
+    readonly_fields = fields
+    inlines = [EchoRequestInline]
+    actions = ["retry_failed_requests"]
+    change_form_template = "members/change_progress.html"
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+    def retry_failed_requests(self, request, queryset):
+        chunks = sum(
+            dispatch_echo_chunks(campaign, campaign.requeue_failed_requests())
+            for campaign in queryset
+        )
+        if chunks:
+            messages.success(request, _("Retrying failed echo requests."))
+        else:
+            messages.info(request, _("There are no failed echo requests."))
+
+    retry_failed_requests.short_description = _("Retry failed echo requests")
+
+
 admin.site.register(Member, MemberAdmin)
 admin.site.register(MemberUnconfirmedProxy, MemberUnconfirmedAdmin)
 admin.site.register(MemberWaitingList, MemberWaitingListAdmin)
@@ -2354,3 +2452,7 @@ admin.site.register(Klettertreff, KlettertreffAdmin)
 admin.site.register(ActivityCategory, ActivityCategoryAdmin)
 admin.site.register(TrainingCategory, TrainingCategoryAdmin)
 admin.site.register(MemberTraining, MemberTrainingAdmin)
+admin.site.register(DocumentJob, DocumentJobAdmin)
+admin.site.register(EchoCampaign, EchoCampaignAdmin)
+admin.site.register(InvitationBatch, InvitationBatchAdmin)
+admin.site.register(WaitingConfirmationRun, WaitingConfirmationRunAdmin)
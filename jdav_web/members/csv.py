@@ -1,6 +1,11 @@
 import csv
 import datetime
 import json
+import uuid
+from collections import Counter
+
+from django.db import transaction
+from mailer.routing import invalidate_routing_index
 
 from .models import DIVERSE
 from .models import EmergencyContact
@@ -8,6 +13,8 @@ from .models import FEMALE
 from .models import Group
 from .models import MALE
 from .models import Member
+from .models.excursion import invalidate_roster
+from .models.member import invalidate_permission_closure
 
 
 def get_gender_char(gender):
@@ -27,204 +34,400 @@ def get_gender_from_char(char):
     return DIVERSE
 
 
-def export_generalized_csv(queryset, file_handle):
-    fieldnames = [
-        "id",
-        "prename",
-        "lastname",
-        "birth_date",
-        "gender",
-        "email",
-        "alternative_email",
-        "phone_number",
-        "street",
-        "plz",
-        "town",
-        "address_extra",
-        "country",
-        "dav_badge_no",
-        "ticket_no",
-        "swimming_badge",
-        "climbing_badge",
-        "alpine_experience",
-        "allergies",
-        "medication",
-        "tetanus_vaccination",
-        "photos_may_be_taken",
-        "legal_guardians",
-        "may_cancel_appointment_independently",
-        "iban",
-        "gets_newsletter",
-        "has_key",
-        "has_free_ticket_gym",
-        "join_date",
-        "leave_date",
-        "good_conduct_certificate_presented_date",
-        "active",
-        "groups",
-        "emergency_contacts",
-    ]
-    writer = csv.DictWriter(file_handle, fieldnames=fieldnames)
+CSV_FIELDNAMES = [
+    "id",
+    "prename",
+    "lastname",
+    "birth_date",
+    "gender",
+    "email",
+    "alternative_email",
+    "phone_number",
+    "street",
+    "plz",
+    "town",
+    "address_extra",
+    "country",
+    "dav_badge_no",
+    "ticket_no",
+    "swimming_badge",
+    "climbing_badge",
+    "alpine_experience",
+    "allergies",
+    "medication",
+    "tetanus_vaccination",
+    "photos_may_be_taken",
+    "legal_guardians",
+    "may_cancel_appointment_independently",
+    "iban",
+    "gets_newsletter",
+    "has_key",
+    "has_free_ticket_gym",
+    "join_date",
+    "leave_date",
+    "good_conduct_certificate_presented_date",
+    "active",
+    "groups",
+    "emergency_contacts",
+]
+
+# member fields, that are read from the columns of the same name on import
+IMPORT_FIELDS = [f for f in CSV_FIELDNAMES if f not in ["id", "groups", "emergency_contacts"]] + [
+    "confirmed"
+]
+
+# columns identifying a member, by which imported rows can be matched to existing members
+MATCH_FIELDS = ["id", "dav_badge_no", "ticket_no"]
+
+# number of members fetched from the database at once
+CHUNK_SIZE = 500
+# number of rows written to the database at once
+BATCH_SIZE = 500
+
+
+def member_csv_row(member):
+    groups = ",".join([g.name for g in member.group.all()])
+    ecs = []
+    for ec in member.emergencycontact_set.all():
+        ecs.append(
+            {
+                "prename": ec.prename,
+                "lastname": ec.lastname,
+                "phone_number": ec.phone_number,
+                "email": ec.email,
+            }
+        )
+
+    return {
+        "id": member.pk,
+        "prename": member.prename,
+        "lastname": member.lastname,
+        "birth_date": member.birth_date.isoformat() if member.birth_date else "",
+        "gender": get_gender_char(member.gender),
+        "email": member.email,
+        "alternative_email": member.alternative_email or "",
+        "phone_number": member.phone_number,
+        "street": member.street,
+        "plz": member.plz,
+        "town": member.town,
+        "address_extra": member.address_extra,
+        "country": member.country,
+        "dav_badge_no": member.dav_badge_no,
+        "ticket_no": member.ticket_no,
+        "swimming_badge": member.swimming_badge,
+        "climbing_badge": member.climbing_badge,
+        "alpine_experience": member.alpine_experience,
+        "allergies": member.allergies,
+        "medication": member.medication,
+        "tetanus_vaccination": member.tetanus_vaccination,
+        "photos_may_be_taken": member.photos_may_be_taken,
+        "legal_guardians": member.legal_guardians,
+        "may_cancel_appointment_independently": member.may_cancel_appointment_independently
+        if member.may_cancel_appointment_independently is not None
+        else "",
+        "iban": member.iban,
+        "gets_newsletter": member.gets_newsletter,
+        "has_key": member.has_key,
+        "has_free_ticket_gym": member.has_free_ticket_gym,
+        "join_date": member.join_date.isoformat() if member.join_date else "",
+        "leave_date": member.leave_date.isoformat() if member.leave_date else "",
+        "good_conduct_certificate_presented_date": member.good_conduct_certificate_presented_date.isoformat()
+        if member.good_conduct_certificate_presented_date
+        else "",
+        "active": member.active,
+        "groups": groups,
+        "emergency_contacts": json.dumps(ecs),
+    }
+
+
+def iter_members(queryset, chunk_size=CHUNK_SIZE):
+    """
+    Iterate over the members in chunks of `chunk_size`, fetching the groups and emergency
+    contacts of each chunk with one query each.
+    """
+    return queryset.prefetch_related("group", "emergencycontact_set").iterator(
+        chunk_size=chunk_size
+    )
+
+
+def export_generalized_csv(queryset, file_handle, chunk_size=CHUNK_SIZE):
+    writer = csv.DictWriter(file_handle, fieldnames=CSV_FIELDNAMES)
     writer.writeheader()
+    for member in iter_members(queryset, chunk_size):
+        writer.writerow(member_csv_row(member))
+
+
+class Echo:
+    """File-like object, which returns the written value instead of storing it."""
+
+    def write(self, value):
+        return value
+
+
+def stream_generalized_csv(queryset, chunk_size=CHUNK_SIZE):
+    """Generate the lines of the CSV export, e.g. for a `StreamingHttpResponse`."""
+    writer = csv.DictWriter(Echo(), fieldnames=CSV_FIELDNAMES)
+    yield writer.writeheader()
+    for member in iter_members(queryset, chunk_size):
+        yield writer.writerow(member_csv_row(member))
+
+
+def override_email_domain(email, email_domain_override):
+    """Replace email domain if override is specified."""
+    if not email or not email_domain_override:
+        return email
+    if "@" in email:
+        local_part = email.split("@")[0]
+        return f"{local_part}@{email_domain_override}"
+    return email  # pragma: no cover
+
+
+def parse_member_row(row, email_domain_override=None):
+    """
+    Parse one row of a CSV file. Returns an unsaved member, the names of its groups and
+    the data of its emergency contacts.
+    """
+    birth_date = None
+    if row.get("birth_date"):
+        birth_date = datetime.datetime.strptime(row["birth_date"], "%Y-%m-%d").date()
+
+    join_date = None
+    if row.get("join_date"):
+        join_date = datetime.datetime.strptime(row["join_date"], "%Y-%m-%d").date()
+
+    leave_date = None
+    if row.get("leave_date"):
+        leave_date = datetime.datetime.strptime(row["leave_date"], "%Y-%m-%d").date()
+
+    gcc_date = None
+    if row.get("good_conduct_certificate_presented_date"):
+        gcc_date = datetime.datetime.strptime(
+            row["good_conduct_certificate_presented_date"], "%Y-%m-%d"
+        ).date()
+
+    may_cancel = None
+    if row.get("may_cancel_appointment_independently"):
+        val = row["may_cancel_appointment_independently"].strip()
+        if val.lower() in ["true", "false"]:
+            may_cancel = val.lower() == "true"
+
+    member = Member(
+        prename=row.get("prename", "fehlt"),
+        lastname=row.get("lastname", "fehlt"),
+        birth_date=birth_date,
+        email=override_email_domain(row.get("email", ""), email_domain_override),
+        gender=get_gender_from_char(row.get("gender", "d")),
+        alternative_email=override_email_domain(row.get("alternative_email"), email_domain_override)
+        if row.get("alternative_email")
+        else None,
+        phone_number=row.get("phone_number", ""),
+        street=row.get("street", ""),
+        plz=row.get("plz", ""),
+        town=row.get("town", ""),
+        address_extra=row.get("address_extra", ""),
+        country=row.get("country", ""),
+        dav_badge_no=row.get("dav_badge_no", ""),
+        ticket_no=row.get("ticket_no", ""),
+        swimming_badge=row.get("swimming_badge", "").lower() == "true",
+        climbing_badge=row.get("climbing_badge", ""),
+        alpine_experience=row.get("alpine_experience", ""),
+        allergies=row.get("allergies", ""),
+        medication=row.get("medication", ""),
+        tetanus_vaccination=row.get("tetanus_vaccination", ""),
+        photos_may_be_taken=row.get("photos_may_be_taken", "").lower() == "true",
+        legal_guardians=row.get("legal_guardians", ""),
+        may_cancel_appointment_independently=may_cancel,
+        iban=row.get("iban", ""),
+        gets_newsletter=row.get("gets_newsletter", "true").lower() == "true",
+        has_key=row.get("has_key", "").lower() == "true",
+        has_free_ticket_gym=row.get("has_free_ticket_gym", "").lower() == "true",
+        join_date=join_date,
+        leave_date=leave_date,
+        good_conduct_certificate_presented_date=gcc_date,
+        confirmed=row.get("confirmed", "true").lower() == "true",
+        active=row.get("active", "true").lower() == "true",
+    )
+
+    groups = [name.strip() for name in row.get("groups", "").split(",") if name.strip()]
+
+    contacts = []
+    if row.get("emergency_contacts"):
+        try:
+            for ec_data in json.loads(row["emergency_contacts"]):
+                contacts.append(
+                    dict(
+                        prename=ec_data.get("prename", ""),
+                        lastname=ec_data.get("lastname", ""),
+                        phone_number=ec_data.get("phone_number", ""),
+                        email=override_email_domain(
+                            ec_data.get("email", ""), email_domain_override
+                        ),
+                    )
+                )
+        except json.JSONDecodeError:  # pragma: no cover
+            pass
+    return member, groups, contacts
+
+
+class MemberImport:
+    """
+    Plan of a CSV import, computed by `plan_import` and written by `apply`. Rows are matched
+    to existing members by the field `match_by`, if given. Rows without a match create new
+    members, rows with a unique match update the member and all other rows are conflicts.
+    """
+
+    def __init__(self):
+        # lists of (member, group names, contact data)
+        self.created = []
+        self.updated = []
+        # dictionary mapping updated members to the names of their changed fields
+        self.changes = {}
+        # list of (line number, reason)
+        self.conflicts = []
+
+    def apply(self):
+        """Write the planned changes in one transaction and with one query per kind of change."""
+        with transaction.atomic():
+            self._create_members()
+            changed_fields = sorted({f for fields in self.changes.values() for f in fields})
+            if changed_fields:
+                Member.all_objects.bulk_update(
+                    [m for m, _, _ in self.updated], changed_fields, batch_size=BATCH_SIZE
+                )
+            self._add_groups()
+            self._add_emergency_contacts()
+        # the bulk operations do not send signals, so invalidate all dependent caches here
+        invalidate_permission_closure()
+        invalidate_roster()
+        invalidate_routing_index()
+
+    def _create_members(self):
+        # bulk inserts do not return primary keys on all databases, so the new members are
+        # identified by a temporary unsubscribe key
+        members = [m for m, _, _ in self.created]
+        for member in members:
+            member.unsubscribe_key = uuid.uuid4().hex
+        Member.all_objects.bulk_create(members, batch_size=BATCH_SIZE)
+        keys = {m.unsubscribe_key: m for m in members}
+        for i in range(0, len(members), BATCH_SIZE):
+            batch = list(keys)[i : i + BATCH_SIZE]
+            for key, pk in Member.all_objects.filter(unsubscribe_key__in=batch).values_list(
+                "unsubscribe_key", "pk"
+            ):
+                keys[key].pk = pk
+            Member.all_objects.filter(unsubscribe_key__in=batch).update(unsubscribe_key="")
+        for member in members:
+            member.unsubscribe_key = ""
+
+    def _add_groups(self):
+        rows = self.created + self.updated
+        # keep the order of first appearance
+        names = list(dict.fromkeys(name for _, groups, _ in rows for name in groups))
+        groups = {g.name: g for g in Group.objects.filter(name__in=names)}
+        missing = [name for name in names if name not in groups]
+        if missing:
+            Group.objects.bulk_create([Group(name=name) for name in missing])
+            groups = {g.name: g for g in Group.objects.filter(name__in=names)}
+        Membership = Member.group.through
+        Membership.objects.bulk_create(
+            [
+                Membership(member_id=member.pk, group_id=groups[name].pk)
+                for member, names, _ in rows
+                for name in names
+            ],
+            batch_size=BATCH_SIZE,
+            ignore_conflicts=True,
+        )
+
+    def _add_emergency_contacts(self):
+        # emergency contacts of updated members are only added, if there is none of that name
+        existing = set(
+            EmergencyContact.objects.filter(
+                member__in=[m.pk for m, _, _ in self.updated]
+            ).values_list("member", "prename", "lastname")
+        )
+        EmergencyContact.objects.bulk_create(
+            [
+                EmergencyContact(member_id=member.pk, **data)
+                for member, _, contacts in self.created + self.updated
+                for data in contacts
+                if (member.pk, data["prename"], data["lastname"]) not in existing
+            ],
+            batch_size=BATCH_SIZE,
+        )
 
-    for member in queryset:
-        groups = ",".join([g.name for g in member.group.all()])
-        ecs = []
-        for ec in member.emergencycontact_set.all():
-            ecs.append(
-                {
-                    "prename": ec.prename,
-                    "lastname": ec.lastname,
-                    "phone_number": ec.phone_number,
-                    "email": ec.email,
-                }
-            )
-
-        row = {
-            "id": member.pk,
-            "prename": member.prename,
-            "lastname": member.lastname,
-            "birth_date": member.birth_date.isoformat() if member.birth_date else "",
-            "gender": get_gender_char(member.gender),
-            "email": member.email,
-            "alternative_email": member.alternative_email or "",
-            "phone_number": member.phone_number,
-            "street": member.street,
-            "plz": member.plz,
-            "town": member.town,
-            "address_extra": member.address_extra,
-            "country": member.country,
-            "dav_badge_no": member.dav_badge_no,
-            "ticket_no": member.ticket_no,
-            "swimming_badge": member.swimming_badge,
-            "climbing_badge": member.climbing_badge,
-            "alpine_experience": member.alpine_experience,
-            "allergies": member.allergies,
-            "medication": member.medication,
-            "tetanus_vaccination": member.tetanus_vaccination,
-            "photos_may_be_taken": member.photos_may_be_taken,
-            "legal_guardians": member.legal_guardians,
-            "may_cancel_appointment_independently": member.may_cancel_appointment_independently
-            if member.may_cancel_appointment_independently is not None
-            else "",
-            "iban": member.iban,
-            "gets_newsletter": member.gets_newsletter,
-            "has_key": member.has_key,
-            "has_free_ticket_gym": member.has_free_ticket_gym,
-            "join_date": member.join_date.isoformat() if member.join_date else "",
-            "leave_date": member.leave_date.isoformat() if member.leave_date else "",
-            "good_conduct_certificate_presented_date": member.good_conduct_certificate_presented_date.isoformat()
-            if member.good_conduct_certificate_presented_date
-            else "",
-            "active": member.active,
-            "groups": groups,
-            "emergency_contacts": json.dumps(ecs),
+    def summary(self):
+        return {
+            "created": len(self.created),
+            "updated": len(self.updated),
+            "conflicts": len(self.conflicts),
         }
-        writer.writerow(row)
 
 
-def import_generalized_csv(file_handle, email_domain_override=None):
+def plan_import(file_handle, email_domain_override=None, match_by=None):
+    """
+    Parse a CSV file and compare it to the existing members without writing anything. If
+    `match_by` is given, it must be one of `MATCH_FIELDS` and rows are matched to existing
+    members by this column. Returns a `MemberImport`.
+    """
+    if match_by and match_by not in MATCH_FIELDS:
+        raise ValueError(
+            f"Members can not be matched by {match_by}, use one of {', '.join(MATCH_FIELDS)}"
+        )
+    plan = MemberImport()
+    reader = csv.DictReader(file_handle)
+    rows = []
+    # the first line contains the header
+    for line, row in enumerate(reader, start=2):
+        member, groups, contacts = parse_member_row(row, email_domain_override)
+        key = row.get(match_by, "").strip() if match_by else ""
+        rows.append((line, key, member, groups, contacts))
+    # only fields given in the file are updated
+    fields = [f for f in IMPORT_FIELDS if f in (reader.fieldnames or [])]
+
+    keys = Counter(key for _, key, _, _, _ in rows if key)
+    existing = {}
+    lookup = [key for key in keys if key.isdigit()] if match_by == "id" else list(keys)
+    if lookup:
+        field = "pk" if match_by == "id" else match_by
+        for m in Member.all_objects.filter(**{f"{field}__in": lookup}):
+            existing.setdefault(str(getattr(m, field)), []).append(m)
+
+    for line, key, member, groups, contacts in rows:
+        if not key:
+            plan.created.append((member, groups, contacts))
+        elif keys[key] > 1:
+            plan.conflicts.append((line, f"{match_by} {key} appears in several rows"))
+        elif len(existing.get(key, [])) > 1:
+            plan.conflicts.append((line, f"{match_by} {key} belongs to several members"))
+        elif key in existing:
+            current = existing[key][0]
+            changed = [f for f in fields if getattr(current, f) != getattr(member, f)]
+            for f in changed:
+                setattr(current, f, getattr(member, f))
+            plan.changes[current] = changed
+            plan.updated.append((current, groups, contacts))
+        elif match_by == "id":
+            plan.conflicts.append((line, f"there is no member with id {key}"))
+        else:
+            plan.created.append((member, groups, contacts))
+    return plan
+
+
+def import_generalized_csv(file_handle, email_domain_override=None, match_by=None, dry_run=False):
     """
     Import members from a CSV file.
 
     Args:
         file_handle: File handle for the CSV file
         email_domain_override: Optional domain to replace all email domains with
-    """
-    reader = csv.DictReader(file_handle)
-    created_members = []
-
-    def override_email_domain(email):
-        """Replace email domain if override is specified."""
-        if not email or not email_domain_override:
-            return email
-        if "@" in email:
-            local_part = email.split("@")[0]
-            return f"{local_part}@{email_domain_override}"
-        return email  # pragma: no cover
-
-    for row in reader:
-        birth_date = None
-        if row.get("birth_date"):
-            birth_date = datetime.datetime.strptime(row["birth_date"], "%Y-%m-%d").date()
-
-        join_date = None
-        if row.get("join_date"):
-            join_date = datetime.datetime.strptime(row["join_date"], "%Y-%m-%d").date()
-
-        leave_date = None
-        if row.get("leave_date"):
-            leave_date = datetime.datetime.strptime(row["leave_date"], "%Y-%m-%d").date()
-
-        gcc_date = None
-        if row.get("good_conduct_certificate_presented_date"):
-            gcc_date = datetime.datetime.strptime(
-                row["good_conduct_certificate_presented_date"], "%Y-%m-%d"
-            ).date()
-
-        may_cancel = None
-        if row.get("may_cancel_appointment_independently"):
-            val = row["may_cancel_appointment_independently"].strip()
-            if val.lower() in ["true", "false"]:
-                may_cancel = val.lower() == "true"
-
-        member = Member(
-            prename=row.get("prename", "fehlt"),
-            lastname=row.get("lastname", "fehlt"),
-            birth_date=birth_date,
-            email=override_email_domain(row.get("email", "")),
-            gender=get_gender_from_char(row.get("gender", "d")),
-            alternative_email=override_email_domain(row.get("alternative_email"))
-            if row.get("alternative_email")
-            else None,
-            phone_number=row.get("phone_number", ""),
-            street=row.get("street", ""),
-            plz=row.get("plz", ""),
-            town=row.get("town", ""),
-            address_extra=row.get("address_extra", ""),
-            country=row.get("country", ""),
-            dav_badge_no=row.get("dav_badge_no", ""),
-            ticket_no=row.get("ticket_no", ""),
-            swimming_badge=row.get("swimming_badge", "").lower() == "true",
-            climbing_badge=row.get("climbing_badge", ""),
-            alpine_experience=row.get("alpine_experience", ""),
-            allergies=row.get("allergies", ""),
-            medication=row.get("medication", ""),
-            tetanus_vaccination=row.get("tetanus_vaccination", ""),
-            photos_may_be_taken=row.get("photos_may_be_taken", "").lower() == "true",
-            legal_guardians=row.get("legal_guardians", ""),
-            may_cancel_appointment_independently=may_cancel,
-            iban=row.get("iban", ""),
-            gets_newsletter=row.get("gets_newsletter", "true").lower() == "true",
-            has_key=row.get("has_key", "").lower() == "true",
-            has_free_ticket_gym=row.get("has_free_ticket_gym", "").lower() == "true",
-            join_date=join_date,
-            leave_date=leave_date,
-            good_conduct_certificate_presented_date=gcc_date,
-            confirmed=row.get("confirmed", "true").lower() == "true",
-            active=row.get("active", "true").lower() == "true",
-        )
-        member.save()
-
-        if row.get("groups"):
-            for name in row["groups"].split(","):
-                name = name.strip()
-                if name:
-                    group, _ = Group.objects.get_or_create(name=name)
-                    member.group.add(group)
-
-        if row.get("emergency_contacts"):
-            try:
-                for ec_data in json.loads(row["emergency_contacts"]):
-                    EmergencyContact.objects.create(
-                        member=member,
-                        prename=ec_data.get("prename", ""),
-                        lastname=ec_data.get("lastname", ""),
-                        phone_number=ec_data.get("phone_number", ""),
-                        email=override_email_domain(ec_data.get("email", "")),
-                    )
-            except json.JSONDecodeError:  # pragma: no cover
-                pass
+        match_by: Optional column used to find and update existing members
+        dry_run: If set, only the `MemberImport` plan is returned and nothing is written
 
-        created_members.append(member)
-    return created_members
+    Returns the created members or the plan in a dry run.
+    """
+    plan = plan_import(file_handle, email_domain_override, match_by)
+    if dry_run:
+        return plan
+    plan.apply()
+    return [member for member, _, _ in plan.created]
@@ -0,0 +1,258 @@
+from dataclasses import dataclass
+from typing import Callable
+
+from contrib.media import serve_media
+from django.conf import settings
+from django.contrib import messages
+from django.http import HttpResponseRedirect
+from django.urls import reverse
+from django.utils.translation import gettext_lazy as _
+from utils import get_member
+
+from .pdf import fill_pdf_form
+from .pdf import render_docx
+from .pdf import render_tex
+from .pdf import render_tex_with_attachments
+
+
+@dataclass(frozen=True)
+class Document:
+    """
+    Represents a document that can be generated for an object. `build` is called with the
+    object and the options of the request and returns the name of the generated file in
+    the media directory. The name must be unique, such that concurrent builds of the same
+    document do not replace each other's files.
+    """
+
+    name: str
+    label: str
+    build: Callable
+    content_type: str = "application/pdf"
+
+
+# all documents that can be generated in the background by a `DocumentJob`
+DOCUMENTS = {}
+
+
+def register_document(name, label, content_type="application/pdf"):
+    """Decorator to register a function generating a document under `name`."""
+
+    def decorator(build):
+        DOCUMENTS[name] = Document(name, label, build, content_type)
+        return build
+
+    return decorator
+
+
+def serve_document(request, document, obj, **options):
+    """
+    Serve the registered document `document` for `obj`. If `settings.ASYNC_DOCUMENTS` is
+    set, the document is generated by a background task instead and the user is redirected
+    to the corresponding `DocumentJob`.
+    """
+    # the tasks generate the registered documents
+    from .tasks import start_document_job
+
+    if not settings.ASYNC_DOCUMENTS:
+        doc = DOCUMENTS[document]
+        return serve_media(doc.build(obj, **options), doc.content_type, delete=True)
+    job = start_document_job(document, obj, created_by=get_member(request), **options)
+    messages.success(
+        request,
+        _("%(document)s is being generated in the background.") % {"document": job.document_label},
+    )
+    return HttpResponseRedirect(reverse("admin:members_documentjob_change", args=(job.pk,)))
+
+
+def generate_crisis_intervention_list_pdf(
+    *,
+    name,
+    description,
+    code,
+    place,
+    destination,
+    groups,
+    staff,
+    start_date,
+    end_date,
+    tour_type,
+    tour_approach,
+    members,
+    save_only=False,
+    unique=False,
+):
+    """Generate a crisis intervention list PDF.
+
+    Args:
+        name: Activity name
+        description: Activity description
+        code: Activity code (e.g., K-260101)
+        place: Location of the activity
+        destination: Destination (optional, e.g., a peak)
+        groups: List or queryset of Group objects
+        staff: List or queryset of Member objects (youth leaders)
+        start_date: Start date of the activity
+        end_date: End date of the activity
+        tour_type: Tour type identifier (empty string for ad-hoc lists)
+        tour_approach: Tour approach identifier (empty string for ad-hoc lists)
+        members: List of Member objects participating in the activity
+        save_only: If True, only the name of the generated file is returned
+        unique: If True, the generated file gets a name not used by any other render
+
+    Returns:
+        HttpResponse with the generated PDF
+    """
+    # Format groups string
+    groups_str = ", ".join([g.name for g in groups]) if groups else ""
+
+    # Format staff string
+    staff_str = ", ".join([s.name for s in staff]) if staff else ""
+
+    # Format time period string
+    # Handle both date and datetime objects
+    start_date_only = start_date.date() if hasattr(start_date, "date") else start_date
+    end_date_only = end_date.date() if hasattr(end_date, "date") else end_date
+
+    if start_date_only == end_date_only:
+        time_period_str = start_date_only.strftime("%d.%m.%Y")
+    else:
+        time_period_str = (
+            f"{start_date_only.strftime('%d.%m.%Y')} - {end_date_only.strftime('%d.%m.%Y')}"
+        )
+
+    context = {
+        "name": name,
+        "description": description,
+        "code": code,
+        "place": place,
+        "destination": destination,
+        "groups_str": groups_str,
+        "staff_str": staff_str,
+        "time_period_str": time_period_str,
+        "tour_type": tour_type,
+        "tour_approach": tour_approach,
+        "members": members,
+        "settings": settings,
+    }
+
+    # Use description for filename if name is long, otherwise use name
+    filename_base = description if len(name) > 30 else name
+    return render_tex(
+        f"{filename_base}_Krisenliste",
+        "members/crisis_intervention_list.tex",
+        context,
+        date=start_date,
+        save_only=save_only,
+        unique=unique,
+    )
+
+
+@register_document("crisis_intervention_list", _("Crisis intervention list"))
+def crisis_intervention_list(memberlist):
+    return generate_crisis_intervention_list_pdf(
+        name=memberlist.name,
+        description=memberlist.description,
+        code=memberlist.code,
+        place=memberlist.place,
+        destination=memberlist.destination,
+        groups=memberlist.groups.all(),
+        staff=memberlist.jugendleiter.all(),
+        start_date=memberlist.date,
+        end_date=memberlist.end,
+        tour_type=memberlist.get_tour_type_display(),
+        tour_approach=memberlist.get_tour_approach_display(),
+        members=[mol.member for mol in memberlist.membersonlist.all()],
+        save_only=True,
+        unique=True,
+    )
+
+
+@register_document("notes_list", _("Overview"))
+def notes_list(memberlist):
+    people, skills = memberlist.skill_summary
+    context = dict(memberlist=memberlist, people=people, skills=skills, settings=settings)
+    return render_tex(
+        f"{memberlist.code}_{memberlist.name}_Notizen",
+        "members/notes_list.tex",
+        context,
+        date=memberlist.date,
+        save_only=True,
+        unique=True,
+    )
+
+
+@register_document("seminar_report_docx", _("Seminar report"), "application/docx")
+def seminar_report_docx(memberlist):
+    title = memberlist.ljpproposal.title
+    context = dict(memberlist=memberlist, settings=settings)
+    return render_docx(
+        f"{memberlist.code}_{title}_Seminarbericht",
+        "members/seminar_report_docx.tex",
+        context,
+        date=memberlist.date,
+        save_only=True,
+        unique=True,
+    )
+
+
+@register_document("seminar_report_costs", _("Costs and participants"))
+def seminar_report_costs(memberlist):
+    title = memberlist.ljpproposal.title
+    context = dict(memberlist=memberlist, settings=settings)
+    return render_tex(
+        f"{memberlist.code}_{title}_TN_Kosten",
+        "members/seminar_report.tex",
+        context,
+        date=memberlist.date,
+        save_only=True,
+        unique=True,
+    )
+
+
+@register_document("ljp_proofs", _("LJP proofs"))
+def ljp_proofs(memberlist):
+    statement = memberlist.statement
+    all_bills = list(statement.bill_set.all())
+
+    context = dict(
+        statement=statement,
+        excursion=memberlist,
+        all_bills=all_bills,
+        total_bills=statement.total_bills_theoretic,
+        total_allowance=statement.total_allowance,
+        total_theoretic=statement.total_theoretic,
+        allowance_to=statement.allowance_to.all(),
+        allowance_per_yl=statement.allowance_per_yl,
+        settings=settings,
+    )
+
+    pdf_filename = f"{memberlist.code}_{memberlist.name}_LJP_Nachweis"
+    attachments = [bill.proof.path for bill in all_bills if bill.proof]
+    return render_tex_with_attachments(
+        pdf_filename,
+        "finance/ljp_statement.tex",
+        context,
+        attachments,
+        save_only=True,
+        unique=True,
+    )
+
+
+@register_document("sjr_application", _("SJR application"))
+def sjr_application(memberlist, invoice):
+    context = memberlist.sjr_application_fields()
+    title = memberlist.ljpproposal.title if hasattr(memberlist, "ljpproposal") else memberlist.name
+    return fill_pdf_form(
+        f"{memberlist.code}_{title}_SJR_Antrag",
+        "members/sjr_template.pdf",
+        context,
+        [invoice],
+        date=memberlist.date,
+        save_only=True,
+        unique=True,
+    )
+
+
+@register_document("statement_summary", _("Statement summary"))
+def statement_summary(statement):
+    return statement.render_summary(save_only=True, unique=True)
@@ -1,13 +1,18 @@
 from datetime import datetime
 
 import openpyxl
-import xlsxwriter
+from contrib.excel import ReportWriter
 from contrib.media import find_template
 from contrib.media import media_path
 from django.conf import settings
+from django.db.models import Count
+from django.db.models import IntegerField
+from django.db.models import OuterRef
+from django.db.models import Subquery
 from utils import normalize_filename
 
 from .models import LJPProposal
+from .models import Member
 from .models import WEEKDAYS
 
 
@@ -22,63 +27,95 @@ def generate_group_overview(all_groups, limit_to_public=True):
 
     """
     today = f"{datetime.today():%d.%m.%Y}"
-    filename = f"gruppenuebersicht_jdav_{settings.SEKTION}_{today}.xlsx"
-    workbook = xlsxwriter.Workbook(media_path(filename))
-    default = workbook.add_format({"text_wrap": True, "border": 1})
-    bold = workbook.add_format({"bold": True, "border": 1})
-    title = workbook.add_format({"bold": True, "font_size": 16, "align": "center"})
-    right = workbook.add_format({"bold": True, "align": "right"})
-    worksheet = workbook.add_worksheet()
-
-    worksheet.merge_range(0, 0, 0, 6, f"Gruppenübersicht JDAV {settings.SEKTION}", title)
-    row = 1
-    worksheet.write(row, 0, "Gruppe", bold)
-    worksheet.write(row, 1, "Wochentag", bold)
-    worksheet.write(row, 2, "Uhrzeit", bold)
-    worksheet.write(row, 3, "Altersgruppe", bold)
-    worksheet.write(row, 4, "TN", bold)
-    worksheet.write(row, 5, "JL", bold)
-    worksheet.write(row, 6, "Jugendleiter*innen", bold)
-
-    for group in all_groups:
-        # choose if only official youth groups on the website are shown
-        if limit_to_public and not group.show_website:
-            continue
-
-        row = row + 1
-        wd = f"{WEEKDAYS[group.weekday][1]}" if group.weekday else "kein Wochentag"
-        times = (
-            f"{group.start_time:%H:%M} - {group.end_time:%H:%M}"
-            if group.start_time and group.end_time
-            else "keine Zeiten"
+    groups = all_groups.filter(show_website=True) if limit_to_public else all_groups
+    groups = annotate_member_counts(groups).prefetch_related("leiters")
+
+    with ReportWriter(f"gruppenuebersicht_jdav_{settings.SEKTION}_{today}") as report:
+        default = report.format(text_wrap=True, border=1)
+        bold = report.format(bold=True, border=1)
+        title = report.format(bold=True, font_size=16, align="center")
+        right = report.format(bold=True, align="right")
+        worksheet = report.add_worksheet(widths=[100, 80, 90, 120, 20, 20, 140])
+
+        worksheet.merge_range(0, 0, 0, 6, f"Gruppenübersicht JDAV {settings.SEKTION}", title)
+        row = 1
+        report.write_row(
+            worksheet,
+            row,
+            ["Gruppe", "Wochentag", "Uhrzeit", "Altersgruppe", "TN", "JL", "Jugendleiter*innen"],
+            bold,
         )
-        yl_count = len(
-            [member for member in group.member_set.all() if member in group.leiters.all()]
+
+        for group in groups:
+            row = row + 1
+            wd = f"{WEEKDAYS[group.weekday][1]}" if group.weekday else "kein Wochentag"
+            times = (
+                f"{group.start_time:%H:%M} - {group.end_time:%H:%M}"
+                if group.start_time and group.end_time
+                else "keine Zeiten"
+            )
+            yl_count = group.leader_count or 0
+            tn_count = (group.member_count or 0) - yl_count
+            members = f"JG {group.year_from} - {group.year_to}"
+            leaders = f"{', '.join([yl.name for yl in group.leiters.all()])}"
+            report.write_row(
+                worksheet,
+                row,
+                [group.name, wd, times, members, tn_count, yl_count, leaders],
+                default,
+            )
+
+        worksheet.write(row + 2, 6, f"Stand: {today}", right)
+
+    return report.filename
+
+
+def generate_klettertreff_overview(klettertreffs, jugendleiter_rows, member_rows):
+    """
+    Creates an Excel Sheet with the attendance matrix of the given klettertreffs, as
+    returned by `attendance_matrix`.
+    """
+    with ReportWriter("klettertreff_uebersicht") as report:
+        bold = report.format(bold=True)
+        present = report.format(bg_color="green", border=1)
+        absent = report.format(bg_color="red", border=1)
+        worksheet = report.add_worksheet(widths=[160] + [80] * len(klettertreffs))
+
+        report.write_row(
+            worksheet, 0, ["Datum"] + [f"{kt.date:%d.%m.%Y}" for kt in klettertreffs], bold
         )
-        tn_count = group.member_set.count() - yl_count
-        members = f"JG {group.year_from} - {group.year_to}"
-        leaders = f"{', '.join([yl.name for yl in group.leiters.all()])}"
-
-        worksheet.write(row, 0, group.name, default)
-        worksheet.write(row, 1, wd, default)
-        worksheet.write(row, 2, times, default)
-        worksheet.write(row, 3, members, default)
-        worksheet.write(row, 4, tn_count, default)
-        worksheet.write(row, 5, yl_count, default)
-        worksheet.write(row, 6, leaders, default)
-
-    worksheet.write(row + 2, 6, f"Stand: {today}", right)
-    # set column width
-    worksheet.set_column_pixels(0, 0, 100)
-    worksheet.set_column_pixels(1, 1, 80)
-    worksheet.set_column_pixels(2, 2, 90)
-    worksheet.set_column_pixels(3, 3, 120)
-    worksheet.set_column_pixels(4, 4, 20)
-    worksheet.set_column_pixels(5, 5, 20)
-    worksheet.set_column_pixels(6, 6, 140)
-    workbook.close()
+        report.write_row(worksheet, 1, ["Ort"] + [kt.location for kt in klettertreffs], bold)
+        row = 2
+        for title, rows in [("Jugendleiter", jugendleiter_rows), ("Teilnehmer", member_rows)]:
+            worksheet.write(row, 0, title, bold)
+            row += 1
+            for attendance in rows:
+                worksheet.write(row, 0, attendance.member.name)
+                for col, cell in enumerate(attendance.cells, start=1):
+                    worksheet.write_blank(row, col, None, present if cell else absent)
+                row += 1
 
-    return filename
+    return report.filename
+
+
+def annotate_member_counts(groups):
+    """
+    Annotate the groups with the number of their members and the number of their members,
+    which are also youth leaders of the group.
+    """
+    members = Member.objects.filter(group=OuterRef("pk")).order_by().values("group")
+    return groups.annotate(
+        member_count=Subquery(
+            members.annotate(cnt=Count("pk", distinct=True)).values("cnt"),
+            output_field=IntegerField(),
+        ),
+        leader_count=Subquery(
+            members.filter(leited_groups=OuterRef("pk"))
+            .annotate(cnt=Count("pk", distinct=True))
+            .values("cnt"),
+            output_field=IntegerField(),
+        ),
+    )
 
 
 VBK_TEMPLATES = {
@@ -1,4 +1,5 @@
 from django.core.management.base import BaseCommand
+from members.csv import CHUNK_SIZE
 from members.csv import export_generalized_csv
 from members.models import Member
 
@@ -9,6 +10,12 @@ class Command(BaseCommand):
     def add_arguments(self, parser):
         parser.add_argument("csv_file", type=str, help="Path to the CSV file to export to")
         parser.add_argument("--filter", type=str, help="Filter members by group name", default=None)
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=CHUNK_SIZE,
+            help="Number of members fetched from the database at once",
+        )
 
     def handle(self, *args, **options):
         csv_file_path = options["csv_file"]
@@ -22,7 +29,7 @@ class Command(BaseCommand):
 
             # Export to CSV
             with open(csv_file_path, "w", encoding="utf-8", newline="") as file:
-                export_generalized_csv(queryset, file)
+                export_generalized_csv(queryset, file, chunk_size=options["chunk_size"])
 
             self.stdout.write(
                 self.style.SUCCESS(
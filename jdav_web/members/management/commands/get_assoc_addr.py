@@ -4,7 +4,7 @@ from members.models import Member
 
 class Command(BaseCommand):
     help = "Parses an email address and finds the associated jugendleiter"
-    requires_system_checks = False
+    requires_system_checks = []
 
     def add_arguments(self, parser):
         parser.add_argument("--sender", default="")
@@ -1,22 +1,19 @@
-import re
-
 from django.core.management.base import BaseCommand
 from mailer.models import EmailAddress
-from members.models import Member
+from mailer.routing import LeaderIndex
+from mailer.routing import simplify
+from mailer.routing import split_name
 
 
 class Command(BaseCommand):
     help = "Parses an email address and finds the associated jugendleiter"
-    requires_system_checks = False
+    requires_system_checks = []
 
     def add_arguments(self, parser):
         parser.add_argument("--name", default="")
 
     def handle(self, *args, **options):
-        match = re.match("([A-Za-z0-9]*)[ ._-]*(.*)", options["name"])
-        if not match:
-            return
-        prename, lastname = match.groups()
+        prename, lastname = split_name(options["name"])
         addresses = EmailAddress.objects.filter(name=prename)
         if addresses:
             forwards = []
@@ -24,34 +21,7 @@ class Command(BaseCommand):
                 forwards.extend(addr.forwards)
             self.stdout.write(" ".join(forwards))
             return
-        try:
-            jugendleiter = Member.objects.filter(group__name="Jugendleiter")
-            matching = [
-                jl.email
-                for jl in jugendleiter
-                if matches(
-                    simplify(jl.prename),
-                    simplify(jl.lastname),
-                    simplify(prename),
-                    simplify(lastname),
-                )
-            ]
-            if not matching:
-                return
-            self.stdout.write(" ".join(matching))
-        except Member.DoesNotExist:
-            pass
-
-
-def simplify(name):
-    return name.lower().replace("ä", "ae").replace("ö", "oe").replace("ü", "ue")
-
-
-def matches(prename, lastname, matched_pre, matched_last):
-    if not matched_last and matched_pre and len(matched_pre) > 2:
-        return prename.startswith(matched_pre) or lastname.startswith(matched_pre)
-    if matched_pre and matched_last:
-        return (prename.startswith(matched_pre) and lastname.startswith(matched_last)) or (
-            prename.startswith(matched_last) and lastname.startswith(matched_pre)
-        )
-    return False
+        matching = LeaderIndex.cached().lookup(simplify(prename), simplify(lastname))
+        if not matching:
+            return
+        self.stdout.write(" ".join(matching))
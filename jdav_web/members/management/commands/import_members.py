@@ -1,5 +1,6 @@
 from django.core.management.base import BaseCommand
 from members.csv import import_generalized_csv
+from members.csv import MATCH_FIELDS
 
 
 class Command(BaseCommand):
@@ -7,13 +8,29 @@ class Command(BaseCommand):
 
     def add_arguments(self, parser):
         parser.add_argument("csv_file", type=str, help="Path to the CSV file to import")
+        parser.add_argument(
+            "--match",
+            type=str,
+            default=None,
+            choices=MATCH_FIELDS,
+            help="Update existing members matching this column",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only report the members that would be created or updated",
+        )
 
     def handle(self, *args, **options):
         csv_file_path = options["csv_file"]
 
         try:
             with open(csv_file_path, encoding="utf-8") as file:
-                created_members = import_generalized_csv(file)
+                if options["dry_run"]:
+                    plan = import_generalized_csv(file, match_by=options["match"], dry_run=True)
+                    self.report(plan)
+                    return
+                created_members = import_generalized_csv(file, match_by=options["match"])
                 self.stdout.write(
                     self.style.SUCCESS(f"Successfully imported {len(created_members)} members")
                 )
@@ -21,3 +38,16 @@ class Command(BaseCommand):
             self.stdout.write(self.style.ERROR(f"File not found: {csv_file_path}"))
         except Exception as e:
             self.stdout.write(self.style.ERROR(f"Error importing members: {str(e)}"))
+
+    def report(self, plan):
+        for member, _, _ in plan.created:
+            self.stdout.write(f"create: {member.name}")
+        for member, _, _ in plan.updated:
+            self.stdout.write(f"update: {member.name} ({', '.join(plan.changes[member])})")
+        for line, reason in plan.conflicts:
+            self.stdout.write(self.style.WARNING(f"conflict in line {line}: {reason}"))
+        self.stdout.write(
+            "{created} to create, {updated} to update, {conflicts} conflicts".format(
+                **plan.summary()
+            )
+        )
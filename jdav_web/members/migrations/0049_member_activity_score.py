@@ -0,0 +1,27 @@
+from django.db import migrations
+from django.db import models
+
+
+def backfill_activity_scores(apps, _schema_editor):
+    # the score is an aggregate over several models, so reuse the current implementation,
+    # which only reads and writes the columns existing at this point
+    from members.models import refresh_activity_scores
+
+    refresh_activity_scores()
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("members", "0048_group_website_display_flags"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="member",
+            name="activity_score",
+            field=models.IntegerField(
+                db_index=True, default=0, editable=False, verbose_name="activity"
+            ),
+        ),
+        migrations.RunPython(backfill_activity_scores, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,76 @@
+import django.db.models.deletion
+import rules.contrib.models
+from django.db import migrations
+from django.db import models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("contenttypes", "0002_remove_content_type_name"),
+        ("members", "0049_member_activity_score"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DocumentJob",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True, primary_key=True, serialize=False, verbose_name="ID"
+                    ),
+                ),
+                ("document", models.CharField(max_length=50, verbose_name="Document")),
+                ("object_id", models.PositiveIntegerField()),
+                ("options", models.JSONField(blank=True, default=dict)),
+                (
+                    "status",
+                    models.IntegerField(
+                        choices=[(0, "Pending"), (1, "Running"), (2, "Done"), (3, "Failed")],
+                        default=0,
+                        verbose_name="Status",
+                    ),
+                ),
+                (
+                    "filename",
+                    models.CharField(blank=True, default="", max_length=255, verbose_name="File"),
+                ),
+                ("error", models.TextField(blank=True, default="", verbose_name="error")),
+                ("created", models.DateTimeField(auto_now_add=True, verbose_name="Created")),
+                ("finished", models.DateTimeField(blank=True, null=True, verbose_name="Finished")),
+                (
+                    "content_type",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="contenttypes.contenttype",
+                    ),
+                ),
+                (
+                    "created_by",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="document_jobs",
+                        to="members.member",
+                        verbose_name="Created by",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Document job",
+                "verbose_name_plural": "Document jobs",
+                "ordering": ("-created",),
+                "abstract": False,
+                "default_permissions": (
+                    "add_global",
+                    "change_global",
+                    "view_global",
+                    "delete_global",
+                    "list_global",
+                    "view",
+                ),
+            },
+            bases=(models.Model, rules.contrib.models.RulesModelMixin),
+        ),
+    ]
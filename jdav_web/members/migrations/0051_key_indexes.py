@@ -0,0 +1,74 @@
+import members.models.base
+from django.db import migrations
+from django.db import models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("members", "0050_document_job"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="emergencycontact",
+            name="confirm_mail_key",
+            field=models.CharField(db_index=True, default="", max_length=32),
+        ),
+        migrations.AlterField(
+            model_name="invitationtogroup",
+            name="key",
+            field=models.CharField(
+                db_index=True, default=members.models.base.gen_key, max_length=32
+            ),
+        ),
+        migrations.AlterField(
+            model_name="member",
+            name="confirm_alternative_mail_key",
+            field=models.CharField(db_index=True, default="", max_length=32),
+        ),
+        migrations.AlterField(
+            model_name="member",
+            name="confirm_mail_key",
+            field=models.CharField(db_index=True, default="", max_length=32),
+        ),
+        migrations.AlterField(
+            model_name="member",
+            name="echo_key",
+            field=models.CharField(db_index=True, default="", max_length=32),
+        ),
+        migrations.AlterField(
+            model_name="member",
+            name="invite_as_user_key",
+            field=models.CharField(db_index=True, default="", max_length=32),
+        ),
+        migrations.AlterField(
+            model_name="member",
+            name="unsubscribe_key",
+            field=models.CharField(db_index=True, default="", max_length=32),
+        ),
+        migrations.AlterField(
+            model_name="member",
+            name="upload_registration_form_key",
+            field=models.CharField(db_index=True, default="", max_length=32),
+        ),
+        migrations.AlterField(
+            model_name="memberwaitinglist",
+            name="confirm_mail_key",
+            field=models.CharField(db_index=True, default="", max_length=32),
+        ),
+        migrations.AlterField(
+            model_name="memberwaitinglist",
+            name="leave_key",
+            field=models.CharField(db_index=True, default="", max_length=32),
+        ),
+        migrations.AlterField(
+            model_name="memberwaitinglist",
+            name="registration_key",
+            field=models.CharField(db_index=True, default="", max_length=32),
+        ),
+        migrations.AlterField(
+            model_name="memberwaitinglist",
+            name="wait_confirmation_key",
+            field=models.CharField(db_index=True, default="", max_length=32),
+        ),
+    ]
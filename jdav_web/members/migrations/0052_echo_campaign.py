@@ -0,0 +1,105 @@
+import django.db.models.deletion
+import rules.contrib.models
+from django.db import migrations
+from django.db import models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("members", "0051_key_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="EchoCampaign",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True, primary_key=True, serialize=False, verbose_name="ID"
+                    ),
+                ),
+                ("created", models.DateTimeField(auto_now_add=True, verbose_name="Created")),
+                (
+                    "created_by",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="echo_campaigns",
+                        to="members.member",
+                        verbose_name="Created by",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Echo campaign",
+                "verbose_name_plural": "Echo campaigns",
+                "ordering": ("-created",),
+                "abstract": False,
+                "default_permissions": (
+                    "add_global",
+                    "change_global",
+                    "view_global",
+                    "delete_global",
+                    "list_global",
+                    "view",
+                ),
+            },
+            bases=(models.Model, rules.contrib.models.RulesModelMixin),
+        ),
+        migrations.CreateModel(
+            name="EchoRequest",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True, primary_key=True, serialize=False, verbose_name="ID"
+                    ),
+                ),
+                ("chunk", models.PositiveIntegerField(verbose_name="chunk")),
+                (
+                    "status",
+                    models.IntegerField(
+                        choices=[(0, "Queued"), (1, "Sent"), (2, "Failed")],
+                        default=0,
+                        verbose_name="Status",
+                    ),
+                ),
+                ("error", models.TextField(blank=True, default="", verbose_name="error")),
+                ("updated", models.DateTimeField(auto_now=True, verbose_name="updated")),
+                (
+                    "campaign",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="requests",
+                        to="members.echocampaign",
+                    ),
+                ),
+                (
+                    "member",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="echo_requests",
+                        to="members.member",
+                        verbose_name="Member",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Echo request",
+                "verbose_name_plural": "Echo requests",
+                "indexes": [
+                    models.Index(
+                        fields=["campaign", "chunk", "status"],
+                        name="members_ech_campaig_48e2d1_idx",
+                    )
+                ],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("campaign", "member"), name="unique_campaign_member"
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,86 @@
+import django.db.models.deletion
+import rules.contrib.models
+from django.db import migrations
+from django.db import models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("members", "0052_echo_campaign"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="invitationtogroup",
+            name="mail_error",
+            field=models.TextField(blank=True, default="", verbose_name="error"),
+        ),
+        migrations.AddField(
+            model_name="invitationtogroup",
+            name="mail_status",
+            field=models.IntegerField(
+                choices=[(0, "Queued"), (1, "Sent"), (2, "Failed")],
+                default=1,
+                verbose_name="Mail status",
+            ),
+        ),
+        migrations.CreateModel(
+            name="InvitationBatch",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True, primary_key=True, serialize=False, verbose_name="ID"
+                    ),
+                ),
+                ("text_template", models.TextField(verbose_name="Invitation text")),
+                ("created", models.DateTimeField(auto_now_add=True, verbose_name="Created")),
+                (
+                    "created_by",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="invitation_batches",
+                        to="members.member",
+                        verbose_name="Created by",
+                    ),
+                ),
+                (
+                    "group",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="members.group",
+                        verbose_name="Group",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Invitation batch",
+                "verbose_name_plural": "Invitation batches",
+                "ordering": ("-created",),
+                "abstract": False,
+                "default_permissions": (
+                    "add_global",
+                    "change_global",
+                    "view_global",
+                    "delete_global",
+                    "list_global",
+                    "view",
+                ),
+            },
+            bases=(models.Model, rules.contrib.models.RulesModelMixin),
+        ),
+        migrations.AddField(
+            model_name="invitationtogroup",
+            name="batch",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="invitations",
+                to="members.invitationbatch",
+                verbose_name="Invitation batch",
+            ),
+        ),
+    ]
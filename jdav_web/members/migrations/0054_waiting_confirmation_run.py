@@ -0,0 +1,36 @@
+from django.db import migrations
+from django.db import models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("members", "0053_invitation_batch"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="WaitingConfirmationRun",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True, primary_key=True, serialize=False, verbose_name="ID"
+                    ),
+                ),
+                ("started", models.DateTimeField(auto_now_add=True, verbose_name="Started")),
+                (
+                    "dispatched",
+                    models.DateTimeField(blank=True, null=True, verbose_name="Dispatched"),
+                ),
+                ("waiters", models.PositiveIntegerField(default=0, verbose_name="Waiters")),
+                ("chunks", models.PositiveIntegerField(default=0, verbose_name="chunks")),
+                ("sent", models.PositiveIntegerField(default=0, verbose_name="Sent")),
+                ("failed", models.PositiveIntegerField(default=0, verbose_name="Failed")),
+            ],
+            options={
+                "verbose_name": "Wait confirmation run",
+                "verbose_name_plural": "Wait confirmation runs",
+                "ordering": ("-started",),
+            },
+        ),
+    ]
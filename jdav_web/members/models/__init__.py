@@ -13,6 +13,7 @@ from .activity import ActivityCategory
 from .base import Contact
 from .base import ContactWithPhoneNumber
 from .base import gen_key
+from .base import get_by_key
 from .base import Person
 from .constants import AUSBILDUNGS_TOUR
 from .constants import DIVERSE
@@ -24,10 +25,16 @@ from .constants import MALE
 from .constants import MUSKELKRAFT_ANREISE
 from .constants import OEFFENTLICHE_ANREISE
 from .constants import WEEKDAYS
+from .document_job import DocumentJob
+from .echo_campaign import EchoCampaign
+from .echo_campaign import EchoRequest
 from .emergency_contact import EmergencyContact
 from .excursion import Freizeit
+from .excursion import skill_matrix
 from .group import Group
+from .invitation import InvitationBatch
 from .invitation import InvitationToGroup
+from .klettertreff import attendance_matrix
 from .klettertreff import Klettertreff
 from .klettertreff import KlettertreffAttendee
 from .ljp import Intervention
@@ -45,6 +52,7 @@ from .registration import RegistrationPassword
 from .training import MemberTraining
 from .training import TrainingCategory
 from .waiting_list import MemberWaitingList
+from .waiting_list import WaitingConfirmationRun
 
 __all__ = [
     "ActivityCategory",
@@ -59,12 +67,15 @@ __all__ = [
     "MemberUnconfirmedProxy",
     "MemberUnconfirmedManager",
     "InvitationToGroup",
+    "InvitationBatch",
     "MemberWaitingList",
+    "WaitingConfirmationRun",
     "NewMemberOnList",
     "Freizeit",
     "MemberNoteList",
     "Klettertreff",
     "KlettertreffAttendee",
+    "attendance_matrix",
     "RegistrationPassword",
     "LJPProposal",
     "Intervention",
@@ -72,7 +83,12 @@ __all__ = [
     "PermissionGroup",
     "TrainingCategory",
     "MemberTraining",
+    "DocumentJob",
+    "EchoCampaign",
+    "EchoRequest",
     "gen_key",
+    "get_by_key",
+    "skill_matrix",
     "GEMEINSCHAFTS_TOUR",
     "MUSKELKRAFT_ANREISE",
     "MALE",
@@ -172,15 +188,65 @@ def annotate_activity_score(queryset):
     return queryset
 
 
+def refresh_activity_scores(member_pks=None):
+    """
+    Recompute the materialized `activity_score` of the members with the given pks or of all
+    members, if `member_pks` is `None`. Returns the number of changed members.
+    """
+    queryset = Member.all_objects.all()
+    if member_pks is not None:
+        queryset = queryset.filter(pk__in=member_pks)
+    scores = annotate_activity_score(queryset).values_list(
+        "pk", "activity_score", "_activity_score"
+    )
+    changed = [
+        Member(pk=pk, activity_score=score)
+        for pk, old_score, score in scores.iterator()
+        if old_score != score
+    ]
+    Member.all_objects.bulk_update(changed, ["activity_score"], batch_size=500)
+    return len(changed)
+
+
+# all (model, field) pairs holding keys for confirming email addresses
+CONFIRM_MAIL_KEY_FIELDS = [
+    (MemberUnconfirmedProxy, "confirm_mail_key"),
+    (MemberUnconfirmedProxy, "confirm_alternative_mail_key"),
+    (MemberWaitingList, "confirm_mail_key"),
+    (EmergencyContact, "confirm_mail_key"),
+]
+
+
 def confirm_mail_by_key(key):
-    matching_unconfirmed = MemberUnconfirmedProxy.objects.filter(
-        confirm_mail_key=key
-    ) | MemberUnconfirmedProxy.objects.filter(confirm_alternative_mail_key=key)
-    matching_waiter = MemberWaitingList.objects.filter(confirm_mail_key=key)
-    matching_emergency_contact = EmergencyContact.objects.filter(confirm_mail_key=key)
-    matches = list(matching_unconfirmed) + list(matching_waiter) + list(matching_emergency_contact)
-    # if not exactly one match, return None. The case > 1 match should not occur!
-    if len(matches) != 1:
+    if not key:
+        return None
+    matches = []
+    for model, field in CONFIRM_MAIL_KEY_FIELDS:
+        matches += model.objects.filter(**{field: key})[:2]
+        # if not exactly one match, return None. The case > 1 match should not occur!
+        if len(matches) > 1:
+            return None
+    if not matches:
         return None
     person = matches[0]
     return person, person.confirm_mail(key)
+
+
+def purge_expired_keys(before=None):
+    """
+    Remove all echo and unsubscribe keys that expired before `before`, defaults to 30 days
+    ago. Returns the number of removed keys.
+    """
+    if before is None:
+        before = timezone.now() - timedelta(days=30)
+    no = 0
+    for key_field, expire_field in [
+        ("echo_key", "echo_expire"),
+        ("unsubscribe_key", "unsubscribe_expire"),
+    ]:
+        no += (
+            Member.all_objects.filter(**{f"{expire_field}__lt": before})
+            .exclude(**{key_field: ""})
+            .update(**{key_field: ""})
+        )
+    return no
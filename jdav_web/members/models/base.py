@@ -20,6 +20,20 @@ def gen_key():
     return uuid.uuid4().hex
 
 
+def get_by_key(queryset, field, key):
+    """
+    Returns the object in `queryset` whose key `field` equals `key`. Raises `DoesNotExist`,
+    if there is no such object. Empty keys never match, since they mark objects without a
+    pending request.
+    """
+    if not key:
+        raise queryset.model.DoesNotExist
+    try:
+        return queryset.get(**{field: key})
+    except queryset.model.MultipleObjectsReturned:
+        raise queryset.model.DoesNotExist
+
+
 class Contact(CommonModel):
     """
     Represents an abstract person with only absolutely necessary contact information.
@@ -30,7 +44,7 @@ class Contact(CommonModel):
 
     email = models.EmailField(max_length=100, default="")
     confirmed_mail = models.BooleanField(default=False, verbose_name=_("Email confirmed"))
-    confirm_mail_key = models.CharField(max_length=32, default="")
+    confirm_mail_key = models.CharField(max_length=32, default="", db_index=True)
 
     class Meta(CommonModel.Meta):
         abstract = True
@@ -0,0 +1,89 @@
+import os
+
+import rules
+from contrib.media import media_path
+from contrib.models import CommonModel
+from contrib.rules import has_global_perm
+from django.conf import settings
+from django.contrib.contenttypes.fields import GenericForeignKey
+from django.contrib.contenttypes.models import ContentType
+from django.db import models
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+from members.documents import DOCUMENTS
+from members.rules import is_creator
+
+from .member import Member
+
+
+class DocumentJob(CommonModel):
+    """
+    Represents the generation of a document in the background. The document is identified
+    by its name in the document registry (see `members.documents`) and the object it is
+    generated for.
+    """
+
+    PENDING, RUNNING, DONE, FAILED = 0, 1, 2, 3
+    STATUS_CHOICES = [
+        (PENDING, _("Pending")),
+        (RUNNING, _("Running")),
+        (DONE, _("Done")),
+        (FAILED, _("Failed")),
+    ]
+
+    document = models.CharField(_("Document"), max_length=50)
+    content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE)
+    object_id = models.PositiveIntegerField()
+    obj = GenericForeignKey("content_type", "object_id")
+    options = models.JSONField(default=dict, blank=True)
+    status = models.IntegerField(_("Status"), choices=STATUS_CHOICES, default=PENDING)
+    filename = models.CharField(_("File"), max_length=255, blank=True, default="")
+    error = models.TextField(_("error"), default="", blank=True)
+    created_by = models.ForeignKey(
+        Member,
+        verbose_name=_("Created by"),
+        blank=True,
+        null=True,
+        on_delete=models.SET_NULL,
+        related_name="document_jobs",
+    )
+    created = models.DateTimeField(_("Created"), auto_now_add=True)
+    finished = models.DateTimeField(_("Finished"), null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.document_label} ({self.obj})"
+
+    @property
+    def document_label(self):
+        document = DOCUMENTS.get(self.document)
+        return document.label if document else self.document
+
+    @property
+    def is_finished(self):
+        return self.status in (self.DONE, self.FAILED)
+
+    @staticmethod
+    def expired():
+        """Returns all jobs finished more than `settings.DOCUMENT_JOB_EXPIRY` days ago."""
+        before = timezone.now() - timezone.timedelta(days=settings.DOCUMENT_JOB_EXPIRY)
+        return DocumentJob.objects.filter(
+            status__in=[DocumentJob.DONE, DocumentJob.FAILED], finished__lt=before
+        )
+
+    def delete_file(self):
+        """Remove the generated document from the media directory."""
+        if self.filename:
+            try:
+                os.remove(media_path(self.filename))
+            except FileNotFoundError:
+                pass
+
+    class Meta(CommonModel.Meta):
+        verbose_name = _("Document job")
+        verbose_name_plural = _("Document jobs")
+        ordering = ("-created",)
+        rules_permissions = {
+            "view": rules.is_staff,
+            "view_obj": is_creator | has_global_perm("members.view_global_documentjob"),
+            "delete_obj": is_creator | has_global_perm("members.delete_global_documentjob"),
+        }
@@ -0,0 +1,153 @@
+import uuid
+
+import rules
+from contrib.models import CommonModel
+from contrib.rules import has_global_perm
+from django.conf import settings
+from django.db import models
+from django.utils import timezone
+from django.utils.translation import gettext
+from django.utils.translation import gettext_lazy as _
+from members.rules import is_creator
+
+from .member import Member
+
+
+class EchoCampaign(CommonModel):
+    """
+    Represents an echo request sent to many members at once. The mails are sent in chunks
+    by background tasks and the state of every single request is tracked by an `EchoRequest`.
+    """
+
+    created_by = models.ForeignKey(
+        Member,
+        verbose_name=_("Created by"),
+        blank=True,
+        null=True,
+        on_delete=models.SET_NULL,
+        related_name="echo_campaigns",
+    )
+    created = models.DateTimeField(_("Created"), auto_now_add=True)
+
+    def __str__(self):
+        return gettext("Echo campaign of %(date)s") % {
+            "date": timezone.localtime(self.created).strftime("%d.%m.%Y %H:%M")
+        }
+
+    def queue_requests(self, members):
+        """
+        Generate new echo keys for all `members` that are not part of this campaign yet and
+        create a queued `EchoRequest` for each of them, split into chunks of
+        `settings.DELIVERY_CHUNK_SIZE`. The keys are written with a single `bulk_update`.
+        Returns the numbers of all chunks containing queued requests.
+        """
+        known = set(self.requests.values_list("member_id", flat=True))
+        members = [m for m in members if m.pk not in known]
+        expire = timezone.now() + timezone.timedelta(days=settings.ECHO_GRACE_PERIOD)
+        for member in members:
+            member.echo_key = uuid.uuid4().hex
+            member.echo_expire = expire
+            member.echoed = False
+        Member.all_objects.bulk_update(
+            members, ["echo_key", "echo_expire", "echoed"], batch_size=500
+        )
+
+        first_chunk = self.requests.aggregate(chunk=models.Max("chunk"))["chunk"]
+        first_chunk = 0 if first_chunk is None else first_chunk + 1
+        size = settings.DELIVERY_CHUNK_SIZE
+        EchoRequest.objects.bulk_create(
+            [
+                EchoRequest(campaign=self, member=member, chunk=first_chunk + i // size)
+                for i, member in enumerate(members)
+            ],
+            batch_size=500,
+        )
+        return self.queued_chunks()
+
+    def queued_chunks(self):
+        """Returns the numbers of all chunks containing queued requests."""
+        return list(
+            self.requests.filter(status=EchoRequest.QUEUED)
+            .order_by("chunk")
+            .values_list("chunk", flat=True)
+            .distinct()
+        )
+
+    def requeue_failed_requests(self):
+        """
+        Mark all failed requests as queued again and return the numbers of the
+        affected chunks.
+        """
+        chunks = list(
+            self.requests.filter(status=EchoRequest.FAILED)
+            .order_by("chunk")
+            .values_list("chunk", flat=True)
+            .distinct()
+        )
+        self.requests.filter(status=EchoRequest.FAILED).update(status=EchoRequest.QUEUED, error="")
+        return chunks
+
+    @property
+    def is_finished(self):
+        return not self.requests.filter(status=EchoRequest.QUEUED).exists()
+
+    def progress(self):
+        """Returns a short summary of the states of the requests of this campaign."""
+        counts = dict(
+            self.requests.order_by()
+            .values_list("status")
+            .annotate(cnt=models.Count("pk"))
+            .values_list("status", "cnt")
+        )
+        total = sum(counts.values())
+        if total == 0:
+            return "---"
+        return gettext("%(sent)d of %(total)d sent, %(failed)d failed, %(echoed)d echoed") % {
+            "sent": counts.get(EchoRequest.SENT, 0),
+            "total": total,
+            "failed": counts.get(EchoRequest.FAILED, 0),
+            "echoed": self.requests.filter(member__echoed=True).count(),
+        }
+
+    progress.short_description = _("Progress")
+
+    class Meta(CommonModel.Meta):
+        verbose_name = _("Echo campaign")
+        verbose_name_plural = _("Echo campaigns")
+        ordering = ("-created",)
+        rules_permissions = {
+            "view": rules.is_staff,
+            "view_obj": is_creator | has_global_perm("members.view_global_echocampaign"),
+            "delete_obj": is_creator | has_global_perm("members.delete_global_echocampaign"),
+        }
+
+
+class EchoRequest(models.Model):
+    """Represents the state of the echo request of an `EchoCampaign` to a single member"""
+
+    QUEUED, SENT, FAILED = 0, 1, 2
+    STATUS_CHOICES = [
+        (QUEUED, _("Queued")),
+        (SENT, _("Sent")),
+        (FAILED, _("Failed")),
+    ]
+
+    campaign = models.ForeignKey(EchoCampaign, on_delete=models.CASCADE, related_name="requests")
+    member = models.ForeignKey(
+        Member, verbose_name=_("Member"), on_delete=models.CASCADE, related_name="echo_requests"
+    )
+    chunk = models.PositiveIntegerField(_("chunk"))
+    status = models.IntegerField(_("Status"), choices=STATUS_CHOICES, default=QUEUED)
+    error = models.TextField(_("error"), default="", blank=True)
+    updated = models.DateTimeField(_("updated"), auto_now=True)
+
+    def __str__(self):
+        return str(self.member)
+
+    class Meta:
+        verbose_name = _("Echo request")
+        verbose_name_plural = _("Echo requests")
+        constraints = [
+            models.UniqueConstraint(fields=["campaign", "member"], name="unique_campaign_member"),
+        ]
+        indexes = [models.Index(fields=["campaign", "chunk", "status"])]
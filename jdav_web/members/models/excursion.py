@@ -1,15 +1,21 @@
 import math
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import date
 from datetime import datetime
 
 from contrib.media import media_path
 from contrib.models import CommonModel
 from contrib.rules import has_global_perm
+from dateutil.relativedelta import relativedelta
 from django.conf import settings
 from django.contrib.contenttypes.fields import GenericRelation
 from django.contrib.contenttypes.models import ContentType
 from django.core.validators import MinValueValidator
 from django.db import models
 from django.db.models import Case
+from django.db.models import Exists
+from django.db.models import OuterRef
 from django.db.models import Q
 from django.db.models import Sum
 from django.db.models import Value
@@ -35,6 +41,69 @@ from .constants import OEFFENTLICHE_ANREISE
 from .group import Group
 from .member_on_list import NewMemberOnList
 
+# generations of the excursion rosters, bumped by `invalidate_roster` whenever members or
+# youth leaders change. The key `None` belongs to changes affecting all excursions.
+_roster_generations = defaultdict(int)
+
+
+def invalidate_roster(excursion_pks=None):
+    """
+    Mark the cached rosters of the given excursions as outdated, or of all excursions if
+    `excursion_pks` is `None`.
+    """
+    if excursion_pks is None:
+        _roster_generations[None] += 1
+        return
+    for pk in excursion_pks:
+        _roster_generations[pk] += 1
+
+
+def roster_generation(excursion_pk):
+    return (_roster_generations[None], _roster_generations.get(excursion_pk, 0))
+
+
+@dataclass(frozen=True)
+class RosterEntry:
+    """A member on the member list or a youth leader of an excursion."""
+
+    pk: int
+    birth_date: date
+    town: str
+    is_staff: bool
+    on_list: bool
+
+    def age_at(self, date):
+        return relativedelta(date.replace(tzinfo=None), self.birth_date).years
+
+    def age(self):
+        return relativedelta(datetime.today(), self.birth_date).years
+
+
+def skill_matrix(member_pks, activities=None):
+    """
+    Returns the skills of the given members as a dictionary mapping the member pks to a
+    dictionary of activity names and scores. The score of an activity is three times the sum
+    of the difficulties of all past excursions of this activity, the member took part in.
+    All scores are computed in one query. If `activities` is not given, all activity
+    categories are included.
+    """
+    if activities is None:
+        activities = list(ActivityCategory.objects.values_list("name", flat=True))
+    matrix = {pk: {activity: 0 for activity in activities} for pk in member_pks}
+    rows = (
+        Freizeit.objects.filter(
+            membersonlist__member__in=member_pks,
+            activity__name__in=activities,
+            date__lt=timezone.now(),
+        )
+        .values_list("membersonlist__member", "activity__name")
+        .annotate(difficulty_sum=Sum("difficulty"))
+        .order_by()
+    )
+    for member_pk, activity, difficulty_sum in rows:
+        matrix[member_pk][activity] = difficulty_sum * 3
+    return matrix
+
 
 class Freizeit(CommonModel):
     """Lets the user create a 'Freizeit' and generate a members overview in pdf format."""
@@ -247,33 +316,79 @@ class Freizeit(CommonModel):
         """calculate the duration in days for the LJP"""
         return min(self.duration, self.total_seminar_days)
 
+    @property
+    def roster(self):
+        """
+        All members on the member list and all youth leaders. The roster is fetched with one
+        query and cached on the instance, until it is invalidated by `invalidate_roster`.
+        """
+        generation = roster_generation(self.pk)
+        cached = self.__dict__.get("_roster")
+        if cached is None or cached[0] != generation:
+            self._roster = (generation, self._fetch_roster())
+        return self._roster[1]
+
+    def _fetch_roster(self):
+        jls = self.jugendleiter.through.objects.filter(freizeit=self.pk)
+        listed = self.membersonlist.all()
+        qs = (
+            self._all_members.filter(
+                Q(pk__in=jls.values("member"), confirmed=True) | Q(pk__in=listed.values("member"))
+            )
+            .annotate(
+                is_staff=Exists(jls.filter(member=OuterRef("pk"))),
+                on_list=Exists(listed.filter(member=OuterRef("pk"))),
+            )
+            .values_list("pk", "birth_date", "town", "confirmed", "is_staff", "on_list")
+        )
+        # like `jugendleiter.all()`, only confirmed youth leaders count as staff
+        return [
+            RosterEntry(pk, birth_date, town, confirmed and is_staff, on_list)
+            for pk, birth_date, town, confirmed, is_staff, on_list in qs
+        ]
+
+    @property
+    def _all_members(self):
+        # `Member` can not be imported here, since it depends on this module
+        return self._meta.get_field("jugendleiter").related_model.all_objects
+
+    def refresh_from_db(self, *args, **kwargs):
+        super().refresh_from_db(*args, **kwargs)
+        self.__dict__.pop("_roster", None)
+
+    @property
+    def staff_entries(self):
+        return [e for e in self.roster if e.is_staff]
+
+    @property
+    def participant_entries(self):
+        return [e for e in self.roster if e.on_list and not e.is_staff]
+
     @property
     def staff_count(self):
-        return self.jugendleiter.count()
+        return len(self.staff_entries)
 
     @property
     def staff_on_memberlist(self):
-        ps = set(map(lambda x: x.member, self.membersonlist.distinct()))
-        jls = set(self.jugendleiter.distinct())
-        return ps.intersection(jls)
+        pks = [e.pk for e in self.staff_entries if e.on_list]
+        return set(self._all_members.filter(pk__in=pks))
 
     @property
     def staff_on_memberlist_count(self):
-        return len(self.staff_on_memberlist)
+        return len([e for e in self.staff_entries if e.on_list])
 
     @property
     def participant_count(self):
-        return len(self.participants)
+        return len(self.participant_entries)
 
     @property
     def participants(self):
-        ps = set(map(lambda x: x.member, self.membersonlist.distinct()))
-        jls = set(self.jugendleiter.distinct())
-        return list(ps - jls)
+        pks = [e.pk for e in self.participant_entries]
+        return list(self._all_members.filter(pk__in=pks))
 
     @property
     def old_participant_count(self):
-        old_ps = [m for m in self.participants if m.age() >= 27]
+        old_ps = [e for e in self.participant_entries if e.age() >= 27]
         return len(old_ps)
 
     @property
@@ -303,12 +418,10 @@ class Freizeit(CommonModel):
 
         This is the theoretic value, ignoring the cutoff at 5 participants.
         """
-        # participants (possibly including youth leaders)
-        ps = {x.member for x in self.membersonlist.distinct()}
         # youth leaders
-        jls = set(self.jugendleiter.distinct())
+        jls = self.staff_entries
         # non-youth leader participants
-        ps_only = ps - jls
+        ps_only = self.participant_entries
         # participants of the correct age (age does not matter for excursions with goal qualification)
         if (
             hasattr(self, "ljpproposal")
@@ -316,9 +429,9 @@ class Freizeit(CommonModel):
         ):
             ps_correct_age = ps_only
         else:
-            ps_correct_age = {
-                m for m in ps_only if m.age_at(self.date) >= 6 and m.age_at(self.date) < 27
-            }
+            ps_correct_age = [
+                e for e in ps_only if e.age_at(self.date) >= 6 and e.age_at(self.date) < 27
+            ]
         # m = the official non-youth-leader participant count
         # and, assuming there exist enough participants, unrounded m satisfies the equation
         # len(ps_correct_age) + 1/5 * m = m
@@ -334,11 +447,8 @@ class Freizeit(CommonModel):
         number of participants (including youth leaders and too old / young ones) is less
         than 5, this is zero, otherwise it is `theoretic_ljp_participant_count`.
         """
-        # participants (possibly including youth leaders)
-        ps = {x.member for x in self.membersonlist.distinct()}
-        # youth leaders
-        jls = set(self.jugendleiter.distinct())
-        if len(ps.union(jls)) < 5:
+        # participants and youth leaders
+        if len(self.roster) < 5:
             return 0
         return self.theoretic_ljp_participant_count
 
@@ -402,12 +512,12 @@ class Freizeit(CommonModel):
         activities = [a.name for a in self.activity.all()]
         skills = {a: [] for a in activities}
         people = []
-        for memberonlist in self.membersonlist.all():
+        memberonlists = list(self.membersonlist.select_related("member"))
+        matrix = skill_matrix({mol.member_id for mol in memberonlists}, activities)
+        for memberonlist in memberonlists:
             m = memberonlist.member
             qualities = []
-            for activity, value in m.get_skills().items():
-                if activity not in activities:
-                    continue
+            for activity, value in matrix[m.pk].items():
                 skills[activity].append(value)
                 qualities.append("\\textit{{{}:}} {}".format(activity, value))
             people.append(
@@ -429,9 +539,8 @@ class Freizeit(CommonModel):
         return (people, sks)
 
     def sjr_application_numbers(self):
-        members = set(map(lambda x: x.member, self.membersonlist.distinct()))
-        jls = set(self.jugendleiter.distinct())
-        participants = members - jls
+        jls = self.staff_entries
+        participants = self.participant_entries
         b27_local = len(
             [m for m in participants if m.age_at(self.date) <= 27 and settings.SEKTION in m.town]
         )
@@ -1,26 +1,124 @@
+import rules
 from contrib.models import CommonModel
 from contrib.rules import has_global_perm
 from django.conf import settings
 from django.db import models
 from django.utils import timezone
+from django.utils.translation import gettext
 from django.utils.translation import gettext_lazy as _
+from mailer.mailutils import get_invitation_confirm_link
+from mailer.mailutils import get_invitation_reject_link
+from mailer.mailutils import get_registration_link
 from mailer.mailutils import send as send_mail
+from members.rules import is_creator
 from members.rules import is_leader_of_relevant_invitation
 
 from .base import gen_key
 from .group import Group
 
 
+class InvitationBatch(CommonModel):
+    """
+    Represents invitations of many waiters to a group at once. The invitation mails are sent
+    by a background task and the state of every mail is stored on the `InvitationToGroup`.
+    """
+
+    group = models.ForeignKey(Group, verbose_name=_("Group"), on_delete=models.CASCADE)
+    text_template = models.TextField(_("Invitation text"))
+    created_by = models.ForeignKey(
+        "Member",
+        verbose_name=_("Created by"),
+        blank=True,
+        null=True,
+        on_delete=models.SET_NULL,
+        related_name="invitation_batches",
+    )
+    created = models.DateTimeField(_("Created"), auto_now_add=True)
+
+    def __str__(self):
+        return gettext("Invitations to %(group)s") % {"group": self.group}
+
+    def queue_invitations(self, waiters):
+        """
+        Create a queued `InvitationToGroup` to the group of this batch for every waiter
+        in `waiters` with a single `bulk_create`. Returns the number of created invitations.
+        """
+        waiters = list(waiters)
+        InvitationToGroup.objects.bulk_create(
+            [
+                InvitationToGroup(
+                    group=self.group,
+                    waiter=waiter,
+                    created_by=self.created_by,
+                    batch=self,
+                    mail_status=InvitationToGroup.QUEUED,
+                )
+                for waiter in waiters
+            ],
+            batch_size=500,
+        )
+        return len(waiters)
+
+    def requeue_failed_invitations(self):
+        """Mark the mails of all failed invitations as queued again and return their number."""
+        return self.invitations.filter(mail_status=InvitationToGroup.FAILED).update(
+            mail_status=InvitationToGroup.QUEUED, mail_error=""
+        )
+
+    @property
+    def is_finished(self):
+        return not self.invitations.filter(mail_status=InvitationToGroup.QUEUED).exists()
+
+    def progress(self):
+        """Returns a short summary of the mail states of the invitations of this batch."""
+        counts = dict(
+            self.invitations.order_by()
+            .values_list("mail_status")
+            .annotate(cnt=models.Count("pk"))
+            .values_list("mail_status", "cnt")
+        )
+        total = sum(counts.values())
+        if total == 0:
+            return "---"
+        return gettext("%(sent)d of %(total)d sent, %(failed)d failed") % {
+            "sent": counts.get(InvitationToGroup.SENT, 0),
+            "total": total,
+            "failed": counts.get(InvitationToGroup.FAILED, 0),
+        }
+
+    progress.short_description = _("Progress")
+
+    class Meta(CommonModel.Meta):
+        verbose_name = _("Invitation batch")
+        verbose_name_plural = _("Invitation batches")
+        ordering = ("-created",)
+        rules_permissions = {
+            "view": rules.is_staff,
+            "view_obj": is_creator | has_global_perm("members.view_global_invitationbatch"),
+            "delete_obj": is_creator | has_global_perm("members.delete_global_invitationbatch"),
+        }
+
+
 class InvitationToGroup(CommonModel):
     """An invitation of a waiter to a group."""
 
+    # states of the invitation mail, invitations outside of a batch are sent immediately
+    QUEUED, SENT, FAILED = 0, 1, 2
+    MAIL_STATUS_CHOICES = [
+        (QUEUED, _("Queued")),
+        (SENT, _("Sent")),
+        (FAILED, _("Failed")),
+    ]
+    # placeholders of invitation texts, which are replaced by `render_text`
+    TEXT_PLACEHOLDERS = ["name", "link", "invitation_reject_link", "invitation_confirm_link"]
+
     waiter = models.ForeignKey(
         "MemberWaitingList", verbose_name=_("Waiter"), on_delete=models.CASCADE
     )
     group = models.ForeignKey(Group, verbose_name=_("Group"), on_delete=models.CASCADE)
     date = models.DateField(default=timezone.now, verbose_name=_("Invitation date"))
     rejected = models.BooleanField(verbose_name=_("Invitation rejected"), default=False)
-    key = models.CharField(max_length=32, default=gen_key)
+    key = models.CharField(max_length=32, default=gen_key, db_index=True)
     created_by = models.ForeignKey(
         "Member",
         verbose_name=_("Created by"),
@@ -29,6 +127,16 @@ class InvitationToGroup(CommonModel):
         on_delete=models.SET_NULL,
         related_name="created_group_invitations",
     )
+    batch = models.ForeignKey(
+        InvitationBatch,
+        verbose_name=_("Invitation batch"),
+        blank=True,
+        null=True,
+        on_delete=models.SET_NULL,
+        related_name="invitations",
+    )
+    mail_status = models.IntegerField(_("Mail status"), choices=MAIL_STATUS_CHOICES, default=SENT)
+    mail_error = models.TextField(_("error"), default="", blank=True)
 
     class Meta(CommonModel.Meta):
         verbose_name = _("Invitation to group")
@@ -53,6 +161,18 @@ class InvitationToGroup(CommonModel):
 
     status.short_description = _("Status")
 
+    def render_text(self, text_template):
+        """
+        Returns the personalized invitation text for the waiter based on `text_template`,
+        which may contain the placeholders of `TEXT_PLACEHOLDERS`.
+        """
+        return text_template.format(
+            name=self.waiter.prename,
+            link=get_registration_link(self.key),
+            invitation_reject_link=get_invitation_reject_link(self.key),
+            invitation_confirm_link=get_invitation_confirm_link(self.key),
+        )
+
     def send_left_waitinglist_notification_to(self, recipient):
         send_mail(
             _("%(waiter)s left the waiting list") % {"waiter": self.waiter},
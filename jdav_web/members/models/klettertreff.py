@@ -1,3 +1,4 @@
+from dataclasses import dataclass
 from datetime import datetime
 
 from django.db import models
@@ -28,12 +29,7 @@ class Klettertreff(models.Model):
         return jl_string
 
     def has_attendee(self, member):
-        queryset = KlettertreffAttendee.objects.filter(
-            member__id__contains=member.id, klettertreff__id__contains=self.id
-        )
-        if queryset:
-            return True
-        return False
+        return KlettertreffAttendee.objects.filter(member=member, klettertreff=self).exists()
 
     def has_jugendleiter(self, jugendleiter):
         if jugendleiter in self.jugendleiter.all():
@@ -59,3 +55,34 @@ class KlettertreffAttendee(models.Model):
     class Meta:
         verbose_name = _("Member")
         verbose_name_plural = _("Members")
+
+
+@dataclass
+class AttendanceRow:
+    """A row of the attendance matrix: whether `member` was present at each klettertreff."""
+
+    member: Member
+    cells: list
+
+
+def attendance_matrix(klettertreffs, jugendleiters, members):
+    """
+    Returns the rows of the attendance matrix of the given klettertreffs for the
+    youth leaders `jugendleiters` and the participants `members`. All attendances are
+    fetched at once, so the matrix is built in two queries independent of its size.
+    """
+    pks = [kt.pk for kt in klettertreffs]
+    leading = set(
+        Klettertreff.jugendleiter.through.objects.filter(klettertreff__in=pks).values_list(
+            "member_id", "klettertreff_id"
+        )
+    )
+    attending = set(
+        KlettertreffAttendee.objects.filter(klettertreff__in=pks).values_list(
+            "member_id", "klettertreff_id"
+        )
+    )
+    return (
+        [AttendanceRow(m, [(m.pk, pk) in leading for pk in pks]) for m in jugendleiters],
+        [AttendanceRow(m, [(m.pk, pk) in attending for pk in pks]) for m in members],
+    )
@@ -7,6 +7,7 @@ from contrib.models import CommonModel
 from contrib.rules import has_global_perm
 from django.conf import settings
 from django.contrib.auth.models import User
+from django.core.cache import cache
 from django.db import models
 from django.db.models import Case
 from django.db.models import Q
@@ -26,12 +27,65 @@ from schwifty import IBAN
 from utils import normalize_name
 from utils import RestrictedFileField
 
-from .activity import ActivityCategory
 from .base import Person
 from .excursion import Freizeit
+from .excursion import skill_matrix
 from .group import Group
 from .waiting_list import MemberWaitingList
 
+# Lookups from `Member` to the member whose permissions grant access. For every kind of
+# permission, these are: personal permissions on members, personal permissions on groups,
+# group permissions on members and group permissions on groups.
+PERMISSION_LOOKUPS = {
+    kind: (
+        f"{rel}_by__member",
+        f"group__{rel}_by__member",
+        f"group_members_{member_rel}__group__member",
+        f"group__group_members_{rel}_by__group__member",
+    )
+    for kind, rel, member_rel in [
+        ("list", "listable", "listable_by"),
+        ("view", "viewable", "viewable_by"),
+        ("change", "changeable", "changeable_by_group"),
+        ("delete", "deletable", "deletable_by"),
+    ]
+}
+
+PERMISSION_CLOSURE_VERSION_KEY = "members:permission_closure:version"
+
+
+def _permission_closure_version():
+    version = cache.get(PERMISSION_CLOSURE_VERSION_KEY)
+    if version is None:
+        cache.add(PERMISSION_CLOSURE_VERSION_KEY, uuid.uuid4().hex, None)
+        version = cache.get(PERMISSION_CLOSURE_VERSION_KEY, uuid.uuid4().hex)
+    return version
+
+
+def permission_closure_key(member_pk, kind, version=None):
+    """Cache key of the set of members on which the member `member_pk` has permission `kind`."""
+    if version is None:
+        version = _permission_closure_version()
+    return f"members:permission_closure:{version}:{member_pk}:{kind}"
+
+
+def invalidate_permission_closure(member_pks=None):
+    """
+    Drop the cached permission closures of the given members. If `member_pks` is `None`,
+    the closures of all members are invalidated.
+    """
+    if member_pks is None:
+        cache.set(PERMISSION_CLOSURE_VERSION_KEY, uuid.uuid4().hex, None)
+        return
+    version = _permission_closure_version()
+    cache.delete_many(
+        [
+            permission_closure_key(pk, kind, version)
+            for pk in set(member_pks)
+            for kind in PERMISSION_LOOKUPS
+        ]
+    )
+
 
 class MemberManager(models.Manager):
     def get_queryset(self):
@@ -48,7 +102,7 @@ class Member(Person):
     confirmed_alternative_mail = models.BooleanField(
         default=True, verbose_name=_("Alternative email confirmed")
     )
-    confirm_alternative_mail_key = models.CharField(max_length=32, default="")
+    confirm_alternative_mail_key = models.CharField(max_length=32, default="", db_index=True)
 
     phone_number = models.CharField(
         max_length=100, verbose_name=_("phone number"), default="", blank=True
@@ -108,7 +162,7 @@ class Member(Person):
     iban = models.CharField(max_length=30, blank=True, verbose_name="IBAN")
 
     gets_newsletter = models.BooleanField(_("receives newsletter"), default=True)
-    unsubscribe_key = models.CharField(max_length=32, default="")
+    unsubscribe_key = models.CharField(max_length=32, default="", db_index=True)
     unsubscribe_expire = models.DateTimeField(default=timezone.now)
     created = models.DateField(default=timezone.now, verbose_name=_("created"))
     active = models.BooleanField(default=True, verbose_name=_("Active"))
@@ -119,7 +173,7 @@ class Member(Person):
         max_upload_size=5,
         content_types=["application/pdf", "image/jpeg", "image/png", "image/gif"],
     )
-    upload_registration_form_key = models.CharField(max_length=32, default="")
+    upload_registration_form_key = models.CharField(max_length=32, default="", db_index=True)
     image = RestrictedFileField(
         verbose_name=_("image"),
         upload_to="people",
@@ -127,14 +181,14 @@ class Member(Person):
         max_upload_size=5,
         content_types=["image/jpeg", "image/png", "image/gif"],
     )
-    echo_key = models.CharField(max_length=32, default="")
+    echo_key = models.CharField(max_length=32, default="", db_index=True)
     echo_expire = models.DateTimeField(default=timezone.now)
     echoed = models.BooleanField(default=True, verbose_name=_("Echoed"))
     confirmed = models.BooleanField(default=True, verbose_name=_("Confirmed"))
     user = models.OneToOneField(
         User, blank=True, null=True, on_delete=models.SET_NULL, verbose_name=_("Login data")
     )
-    invite_as_user_key = models.CharField(max_length=32, default="")
+    invite_as_user_key = models.CharField(max_length=32, default="", db_index=True)
     waitinglist_application_date = models.DateTimeField(
         verbose_name=_("waitinglist application date"),
         null=True,
@@ -143,6 +197,10 @@ class Member(Person):
             "If the person registered from the waitinglist, this is their application date."
         ),
     )
+    # materialized by `refresh_activity_scores`, see `annotate_activity_score`
+    activity_score = models.IntegerField(
+        verbose_name=_("activity"), default=0, db_index=True, editable=False
+    )
 
     objects = MemberManager()
     all_objects = models.Manager()
@@ -295,13 +353,7 @@ class Member(Person):
 
     def get_skills(self):
         # get skills by summing up all the activities taken part in
-        skills = {}
-        for kind in ActivityCategory.objects.all():
-            lists = Freizeit.objects.filter(activity=kind, membersonlist__member=self)
-            skills[kind.name] = sum(
-                [lst.difficulty * 3 for lst in lists if lst.date < timezone.now()]
-            )
-        return skills
+        return skill_matrix([self.pk])[self.pk]
 
     def get_activities(self):
         # get activity overview
@@ -454,74 +506,47 @@ class Member(Person):
             return queryset
         elif name == "InvitationToGroup":
             return queryset
+        elif name == "DocumentJob":
+            return queryset.filter(created_by=self)
+        elif name == "EchoCampaign":
+            return queryset.filter(created_by=self)
+        elif name == "InvitationBatch":
+            return queryset.filter(created_by=self)
         else:
             raise ValueError(name)
 
-    def filter_members_by_permissions(self, queryset, annotate=False):
-        # mems = Member.objects.all().prefetch_related('group')
-
-        # list_pks = [ m.pk for m in mems if self.may_list(m) ]
-        # view_pks = [ m.pk for m in mems if self.may_view(m) ]
-
-        ## every member may list themself
-        pks = [self.pk]
-        view_pks = [self.pk]
-
-        if hasattr(self, "permissions"):
-            pks += [m.pk for m in self.permissions.list_members.all()]
-            view_pks += [m.pk for m in self.permissions.view_members.all()]
-
-            for group in self.permissions.list_groups.all():
-                pks += [m.pk for m in group.member_set.all()]
-
-            for group in self.permissions.view_groups.all():
-                view_pks += [m.pk for m in group.member_set.all()]
-
-        for group in self.group.all():
-            if hasattr(group, "permissions"):
-                pks += [m.pk for m in group.permissions.list_members.all()]
-                view_pks += [m.pk for m in group.permissions.view_members.all()]
-
-                for gr in group.permissions.list_groups.all():
-                    pks += [m.pk for m in gr.member_set.all()]
+    def reachable_members_q(self, kind):
+        """
+        Returns a `Q` object on `Member` matching all members on which `self` has
+        the permission `kind` (one of `list`, `view`, `change` or `delete`).
 
-                for gr in group.permissions.view_groups.all():
-                    view_pks += [m.pk for m in gr.member_set.all()]
+        Personal and group permissions are expressed as subqueries over `PermissionMember`
+        and `PermissionGroup`, so the filter is evaluated by the database in the query it
+        is used in, independent of the size of the involved groups. The result is memoized
+        on the instance, i.e. for the duration of a request when used via `request.user.member`.
+        """
+        cache = self.__dict__.setdefault("_reachable_members_q", {})
+        if kind not in cache:
+            q = Q(pk=self.pk)
+            for lookup in PERMISSION_LOOKUPS[kind]:
+                subquery = Member.all_objects.filter(**{lookup: self.pk}).values("pk")
+                q |= Q(pk__in=subquery)
+            cache[kind] = q
+        return cache[kind]
 
-        filtered = queryset.filter(pk__in=pks)
+    def filter_members_by_permissions(self, queryset, annotate=False):
+        filtered = queryset.filter(self.reachable_members_q("list"))
         if not annotate:
             return filtered
-
-        return filtered.annotate(
-            _viewable=Case(
-                When(pk__in=view_pks, then=Value(True)),
-                default=Value(False),
-                output_field=models.BooleanField(),
-            )
-        )
+        return self.annotate_view_permission(filtered, model=Member)
 
     def annotate_view_permission(self, queryset, model):
         name = model._meta.object_name
         if name != "Member":
             return queryset
-        view_pks = [self.pk]
-
-        if hasattr(self, "permissions"):
-            view_pks += [m.pk for m in self.permissions.view_members.all()]
-
-            for group in self.permissions.view_groups.all():
-                view_pks += [m.pk for m in group.member_set.all()]
-
-        for group in self.group.all():
-            if hasattr(group, "permissions"):
-                view_pks += [m.pk for m in group.permissions.view_members.all()]
-
-                for gr in group.permissions.view_groups.all():
-                    view_pks += [m.pk for m in gr.member_set.all()]
-
         return queryset.annotate(
             _viewable=Case(
-                When(pk__in=view_pks, then=Value(True)),
+                When(self.reachable_members_q("view"), then=Value(True)),
                 default=Value(False),
                 output_field=models.BooleanField(),
             )
@@ -548,89 +573,33 @@ class Member(Person):
         # led by the member
         return queryset.filter(invitationtogroup__group__leiters=self)
 
-    def may_list(self, other):
-        if self.pk == other.pk:
-            return True
-
-        if hasattr(self, "permissions"):
-            if other in self.permissions.list_members.all():
-                return True
-
-            if any([gr in other.group.all() for gr in self.permissions.list_groups.all()]):
-                return True
-
-        for group in self.group.all():
-            if hasattr(group, "permissions"):
-                if other in group.permissions.list_members.all():
-                    return True
-
-                if any([gr in other.group.all() for gr in group.permissions.list_groups.all()]):
-                    return True
+    def permitted_member_pks(self, kind):
+        """
+        Returns the set of pks of members on which `self` has the permission `kind`.
+        Apart from `self`, the set only contains confirmed members. It is cached and
+        invalidated by the signal handlers in `members.signals` whenever permissions, group
+        memberships or confirmations change.
+        """
+        key = permission_closure_key(self.pk, kind)
+        pks = cache.get(key)
+        if pks is None:
+            pks = frozenset(
+                Member.objects.filter(self.reachable_members_q(kind)).values_list("pk", flat=True)
+            ) | {self.pk}
+            cache.set(key, pks)
+        return pks
 
-        return False
+    def may_list(self, other):
+        return other.pk in self.permitted_member_pks("list")
 
     def may_view(self, other):
-        if self.pk == other.pk:
-            return True
-
-        if hasattr(self, "permissions"):
-            if other in self.permissions.view_members.all():
-                return True
-
-            if any([gr in other.group.all() for gr in self.permissions.view_groups.all()]):
-                return True
-
-        for group in self.group.all():
-            if hasattr(group, "permissions"):
-                if other in group.permissions.view_members.all():
-                    return True
-
-                if any([gr in other.group.all() for gr in group.permissions.view_groups.all()]):
-                    return True
-
-        return False
+        return other.pk in self.permitted_member_pks("view")
 
     def may_change(self, other):
-        if self.pk == other.pk:
-            return True
-
-        if hasattr(self, "permissions"):
-            if other in self.permissions.change_members.all():
-                return True
-
-            if any([gr in other.group.all() for gr in self.permissions.change_groups.all()]):
-                return True
-
-        for group in self.group.all():
-            if hasattr(group, "permissions"):
-                if other in group.permissions.change_members.all():
-                    return True
-
-                if any([gr in other.group.all() for gr in group.permissions.change_groups.all()]):
-                    return True
-
-        return False
+        return other.pk in self.permitted_member_pks("change")
 
     def may_delete(self, other):
-        if self.pk == other.pk:
-            return True
-
-        if hasattr(self, "permissions"):
-            if other in self.permissions.delete_members.all():
-                return True
-
-            if any([gr in other.group.all() for gr in self.permissions.delete_groups.all()]):
-                return True
-
-        for group in self.group.all():
-            if hasattr(group, "permissions"):
-                if other in group.permissions.delete_members.all():
-                    return True
-
-                if any([gr in other.group.all() for gr in group.permissions.delete_groups.all()]):
-                    return True
-
-        return False
+        return other.pk in self.permitted_member_pks("delete")
 
     def suggested_username(self):
         """Returns a suggested username given by {prename}.{lastname}."""
@@ -5,15 +5,14 @@ from contrib.rules import has_global_perm
 from django.conf import settings
 from django.db import models
 from django.utils import timezone
+from django.utils.translation import gettext
 from django.utils.translation import gettext_lazy as _
-from mailer.mailutils import get_invitation_confirm_link
-from mailer.mailutils import get_invitation_reject_link
 from mailer.mailutils import get_leave_waitinglist_link
-from mailer.mailutils import get_registration_link
 from mailer.mailutils import get_wait_confirmation_link
 from members.rules import is_leader_of_relevant_invitation
 
 from .base import gen_key
+from .base import get_by_key
 from .base import Person
 from .invitation import InvitationToGroup
 
@@ -21,6 +20,15 @@ from .invitation import InvitationToGroup
 class MemberWaitingList(Person):
     """A participant on the waiting list"""
 
+    # fields changed by `prepare_wait_confirmation`
+    WAIT_CONFIRMATION_FIELDS = [
+        "last_reminder",
+        "sent_reminders",
+        "leave_key",
+        "wait_confirmation_key",
+        "wait_confirmation_key_expire",
+    ]
+
     WAITING_CONFIRMATION_SUCCESS = 0
     WAITING_CONFIRMATION_INVALID = 1
     WAITING_CONFIRMATION_EXPIRED = 1
@@ -36,15 +44,15 @@ class MemberWaitingList(Person):
     last_wait_confirmation = models.DateField(
         default=timezone.now, verbose_name=_("Last wait confirmation")
     )
-    wait_confirmation_key = models.CharField(max_length=32, default="")
+    wait_confirmation_key = models.CharField(max_length=32, default="", db_index=True)
     wait_confirmation_key_expire = models.DateTimeField(default=timezone.now)
 
-    leave_key = models.CharField(max_length=32, default="")
+    leave_key = models.CharField(max_length=32, default="", db_index=True)
 
     last_reminder = models.DateTimeField(default=timezone.now, verbose_name=_("Last reminder"))
     sent_reminders = models.IntegerField(default=0, verbose_name=_("Missed reminders"))
 
-    registration_key = models.CharField(max_length=32, default="")
+    registration_key = models.CharField(max_length=32, default="", db_index=True)
     registration_expire = models.DateTimeField(default=timezone.now)
 
     class Meta(CommonModel.Meta):
@@ -95,23 +103,52 @@ class MemberWaitingList(Person):
     waiting_confirmed.boolean = True
     waiting_confirmed.short_description = _("Waiting status confirmed")
 
-    def ask_for_wait_confirmation(self):
-        """Sends an email to the person asking them to confirm their intention to wait."""
+    @staticmethod
+    def to_ask_for_wait_confirmation():
+        """
+        Returns all waiters whose last confirmed waiting status is at least
+        `settings.WAITING_CONFIRMATION_FREQUENCY` days ago, who have not received a reminder
+        in the last `settings.CONFIRMATION_REMINDER_FREQUENCY` days and who have received
+        strictly less reminders than `settings.MAX_REMINDER_COUNT`.
+        """
+        reminder_cutoff = timezone.now() - timezone.timedelta(
+            days=settings.CONFIRMATION_REMINDER_FREQUENCY
+        )
+        cutoff = timezone.now() - timezone.timedelta(days=settings.WAITING_CONFIRMATION_FREQUENCY)
+        return MemberWaitingList.objects.filter(
+            last_wait_confirmation__lte=cutoff,
+            last_reminder__lte=reminder_cutoff,
+            sent_reminders__lt=settings.MAX_REMINDER_COUNT,
+        )
+
+    def prepare_wait_confirmation(self):
+        """
+        Count a new reminder and generate the keys needed for the wait confirmation email.
+        The changed fields are listed in `WAIT_CONFIRMATION_FIELDS`, the waiter is not saved.
+        """
         self.last_reminder = timezone.now()
         self.sent_reminders += 1
         self.leave_key = gen_key()
-        self.save()
-        self.send_mail(
-            _("Waiting confirmation needed"),
-            settings.WAIT_CONFIRMATION_TEXT.format(
-                name=self.prename,
-                link=get_wait_confirmation_link(self),
-                leave_link=get_leave_waitinglist_link(self.leave_key),
-                reminder=self.sent_reminders,
-                max_reminder_count=settings.MAX_REMINDER_COUNT,
-            ),
+        self.wait_confirmation_key = uuid.uuid4().hex
+        self.wait_confirmation_key_expire = timezone.now() + timezone.timedelta(
+            days=settings.GRACE_PERIOD_WAITING_CONFIRMATION
+        )
+
+    def wait_confirmation_text(self):
+        return settings.WAIT_CONFIRMATION_TEXT.format(
+            name=self.prename,
+            link=get_wait_confirmation_link(self.wait_confirmation_key),
+            leave_link=get_leave_waitinglist_link(self.leave_key),
+            reminder=self.sent_reminders,
+            max_reminder_count=settings.MAX_REMINDER_COUNT,
         )
 
+    def ask_for_wait_confirmation(self):
+        """Sends an email to the person asking them to confirm their intention to wait."""
+        self.prepare_wait_confirmation()
+        self.save()
+        self.send_mail(_("Waiting confirmation needed"), self.wait_confirmation_text())
+
     def confirm_waiting(self, key):
         # if a wrong key is supplied, we return invalid
         if not self.wait_confirmation_key == key:
@@ -134,17 +171,9 @@ class MemberWaitingList(Person):
         # otherwise the link is too old and the person was not confirmed in time
         return self.WAITING_CONFIRMATION_EXPIRED
 
-    def generate_wait_confirmation_key(self):
-        self.wait_confirmation_key = uuid.uuid4().hex
-        self.wait_confirmation_key_expire = timezone.now() + timezone.timedelta(
-            days=settings.GRACE_PERIOD_WAITING_CONFIRMATION
-        )
-        self.save()
-        return self.wait_confirmation_key
-
     def may_register(self, key):
         try:
-            invitation = InvitationToGroup.objects.get(key=key)
+            invitation = get_by_key(InvitationToGroup.objects, "key", key)
             return (
                 self.pk == invitation.waiter.pk
                 and timezone.now().date() < invitation.date + timezone.timedelta(days=30)
@@ -165,12 +194,7 @@ class MemberWaitingList(Person):
         invitation.save()
         self.send_mail(
             _("Invitation to trial group meeting"),
-            text_template.format(
-                name=self.prename,
-                link=get_registration_link(invitation.key),
-                invitation_reject_link=get_invitation_reject_link(invitation.key),
-                invitation_confirm_link=get_invitation_confirm_link(invitation.key),
-            ),
+            invitation.render_text(text_template),
             cc=group.contact_email.email,
         )
 
@@ -190,3 +214,27 @@ class MemberWaitingList(Person):
                 settings.JOIN_WAITINGLIST_CONFIRMATION_TEXT.format(name=self.prename),
             )
         return ret
+
+
+class WaitingConfirmationRun(models.Model):
+    """
+    Records the metrics of a run of the periodic task asking waiters to confirm their
+    waiting status. The counters are updated while the run progresses.
+    """
+
+    started = models.DateTimeField(_("Started"), auto_now_add=True)
+    dispatched = models.DateTimeField(_("Dispatched"), null=True, blank=True)
+    waiters = models.PositiveIntegerField(_("Waiters"), default=0)
+    chunks = models.PositiveIntegerField(_("chunks"), default=0)
+    sent = models.PositiveIntegerField(_("Sent"), default=0)
+    failed = models.PositiveIntegerField(_("Failed"), default=0)
+
+    def __str__(self):
+        return gettext("Wait confirmation run of %(date)s") % {
+            "date": timezone.localtime(self.started).strftime("%d.%m.%Y %H:%M")
+        }
+
+    class Meta:
+        verbose_name = _("Wait confirmation run")
+        verbose_name_plural = _("Wait confirmation runs")
+        ordering = ("-started",)
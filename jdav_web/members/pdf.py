@@ -1,8 +1,10 @@
-import glob
+import hashlib
 import logging
 import os
+import shutil
 import subprocess
-import time
+import tempfile
+from contextlib import contextmanager
 from datetime import datetime
 from io import BytesIO
 
@@ -11,6 +13,8 @@ from contrib.media import find_template
 from contrib.media import media_dir
 from contrib.media import media_path
 from contrib.media import serve_media
+from contrib.media import unique_filename
+from django.conf import settings
 from django.template.loader import get_template
 from PIL import Image
 from pypdf import PageObject
@@ -20,87 +24,201 @@ from utils import normalize_filename
 
 logger = logging.getLogger(__name__)
 
+# subdirectory of the media directory containing compiled pdfs, named by the hash of their source
+PDF_CACHE_DIR = "pdfcache"
+
 
 def serve_pdf(filename_pdf):
     return serve_media(filename_pdf, "application/pdf")
 
 
-def generate_tex(name, template_path, context, date=None):
-    filename = normalize_filename(name, date=date)
-    filename_tex = filename + ".tex"
+@contextmanager
+def build_sandbox():
+    """
+    Temporary directory for a single build, which is removed afterwards including all
+    auxiliary files. It is placed inside the media directory, such that the results can be
+    moved atomically into place with `publish`.
+    """
+    ensure_media_dir()
+    with tempfile.TemporaryDirectory(prefix=".build-", dir=media_dir()) as path:
+        yield path
 
-    tmpl = get_template(template_path)
-    res = tmpl.render(dict(context, creation_date=datetime.today().strftime("%d.%m.%Y")))
 
-    ensure_media_dir()
+def publish(path, filename):
+    """Atomically move the file at `path` to `filename` in the media directory."""
+    os.replace(path, media_path(filename))
+
 
-    with open(media_path(filename_tex), "w", encoding="utf-8") as f:
-        f.write(res)
-    return filename
+def copy_atomic(src, dst):
+    """Copy `src` to `dst`, such that readers of `dst` never see a partially written file."""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(dst), suffix=".tmp")
+    os.close(fd)
+    try:
+        shutil.copyfile(src, tmp_path)
+        os.replace(tmp_path, dst)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
 
 
-def render_docx(name, template_path, context, date=None, save_only=False):
-    filename = generate_tex(name, template_path, context, date=date)
+def output_filename(filename, extension, unique=False):
+    """
+    Returns the name of the file with `extension` a render of `filename` is published as.
+    If `unique` is set, the name is not used by any other render.
+    """
+    return unique_filename(filename, extension) if unique else f"{filename}.{extension}"
+
+
+def generate_tex(name, template_path, context, date=None):
+    """
+    Render the latex template `template_path` with `context`. Returns the name of the output
+    files without extension and the rendered source. The source is not written to the media
+    directory, so concurrent renders of files with the same name can not interfere.
+    """
+    filename = normalize_filename(name, date=date)
+    tmpl = get_template(template_path)
+    source = tmpl.render(dict(context, creation_date=datetime.today().strftime("%d.%m.%Y")))
+    return filename, source
+
+
+def render_docx(name, template_path, context, date=None, save_only=False, unique=False):
+    filename, source = generate_tex(name, template_path, context, date=date)
     filename_tex = filename + ".tex"
-    filename_docx = filename + ".docx"
-    oldwd = os.getcwd()
-    os.chdir(media_dir())
-    result = subprocess.run(
-        ["pandoc", filename_tex, "-o", filename_docx],
-        capture_output=True,
-        text=True,
-    )
-    logger.debug(f"Pandoc stdout: {result.stdout}")
-    logger.debug(f"Pandoc stderr: {result.stderr}")
-    time.sleep(1)
-    os.chdir(oldwd)
+    filename_docx = output_filename(filename, "docx", unique=unique)
+    with build_sandbox() as build_dir:
+        with open(os.path.join(build_dir, filename_tex), "w", encoding="utf-8") as f:
+            f.write(source)
+        result = subprocess.run(
+            ["pandoc", filename_tex, "-o", filename_docx],
+            capture_output=True,
+            text=True,
+            cwd=build_dir,
+        )
+        logger.debug(f"Pandoc stdout: {result.stdout}")
+        logger.debug(f"Pandoc stderr: {result.stderr}")
+        if os.path.exists(os.path.join(build_dir, filename_docx)):
+            publish(os.path.join(build_dir, filename_docx), filename_docx)
     if save_only:
         return filename_docx
     return serve_media(filename_docx, "application/docx")
 
 
-def render_tex_with_attachments(name, template_path, context, attachments, save_only=False):
-    rendered_pdf = render_tex(name, template_path, context, save_only=True)
-
-    reader = PdfReader(media_path(rendered_pdf))
-    writer = PdfWriter()
-    writer.append(reader)
-
-    pdf_add_attachments(writer, attachments)
-
-    with open(media_path(rendered_pdf), "wb") as output_stream:
-        writer.write(output_stream)
+def render_tex_with_attachments(
+    name, template_path, context, attachments, save_only=False, unique=False
+):
+    """
+    Render the latex template and append the `attachments` to the pdf. If `unique` is set,
+    the pdf gets a name which is not used by any other render.
+    """
+    filename, source = generate_tex(name, template_path, context)
+    filename_pdf = output_filename(filename, "pdf", unique=unique)
+
+    with build_sandbox() as build_dir:
+        compiled = compile_tex(filename, source, build_dir)
+        if compiled is not None:
+            writer = PdfWriter()
+            writer.append(PdfReader(compiled))
+            pdf_add_attachments(writer, attachments)
+
+            path = os.path.join(build_dir, "attached_" + filename + ".pdf")
+            with open(path, "wb") as output_stream:
+                writer.write(output_stream)
+            publish(path, filename_pdf)
 
     if save_only:
-        return rendered_pdf
-    return serve_pdf(rendered_pdf)
+        return filename_pdf
+    return serve_pdf(filename_pdf)
 
 
-def render_tex(name, template_path, context, date=None, save_only=False):
-    filename = generate_tex(name, template_path, context, date=date)
+def pdf_cache_path(digest):
+    return media_path(os.path.join(PDF_CACHE_DIR, digest + ".pdf"))
+
+
+def load_from_pdf_cache(digest, dst):
+    """
+    Copy the cached pdf with the given source hash to the path `dst`. Returns `False` if there
+    is no such pdf.
+    """
+    path = pdf_cache_path(digest)
+    try:
+        # mark the entry as recently used
+        os.utime(path)
+        copy_atomic(path, dst)
+    except FileNotFoundError:
+        return False
+    return True
+
+
+def store_in_pdf_cache(digest, path):
+    """Add the compiled pdf at `path` to the cache and evict old entries if necessary."""
+    os.makedirs(media_path(PDF_CACHE_DIR), exist_ok=True)
+    copy_atomic(path, pdf_cache_path(digest))
+    evict_pdf_cache()
+
+
+def evict_pdf_cache(max_size=None):
+    """
+    Remove the least recently used pdfs from the cache, until the total size of the cache
+    is at most `max_size` bytes. Defaults to `settings.PDF_CACHE_SIZE`.
+    """
+    if max_size is None:
+        max_size = settings.PDF_CACHE_SIZE
+    entries = []
+    for entry in os.scandir(media_path(PDF_CACHE_DIR)):
+        if not entry.name.endswith(".pdf"):
+            continue
+        try:
+            stat = entry.stat()
+        except FileNotFoundError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, entry.path))
+    total = 0
+    for _, size, path in sorted(entries, reverse=True):
+        total += size
+        if total > max_size:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+def compile_tex(filename, source, build_dir):
+    """
+    Compile the latex `source` to `filename`.pdf inside `build_dir`. Identical sources yield
+    identical pdfs, so only unknown sources are compiled. Returns the path of the pdf or `None`,
+    if the compilation failed.
+    """
     filename_tex = filename + ".tex"
-    filename_pdf = filename + ".pdf"
-    # compile using pdflatex
-    oldwd = os.getcwd()
-    os.chdir(media_dir())
+    path = os.path.join(build_dir, filename + ".pdf")
+    source = source.encode("utf-8")
+    digest = hashlib.sha256(source).hexdigest()
+    if load_from_pdf_cache(digest, path):
+        return path
+
+    with open(os.path.join(build_dir, filename_tex), "wb") as f:
+        f.write(source)
     result = subprocess.run(
         ["pdflatex", "-halt-on-error", filename_tex],
         capture_output=True,
         text=True,
+        cwd=build_dir,
     )
     logger.debug(f"pdflatex stdout: {result.stdout}")
     logger.debug(f"pdflatex stderr: {result.stderr}")
-    time.sleep(1)
+    if result.returncode == 0:
+        store_in_pdf_cache(digest, path)
+    return path if os.path.exists(path) else None
 
-    # do some cleanup
-    for f in glob.glob("*.log"):
-        os.remove(f)
-    for f in glob.glob("*.aux"):
-        os.remove(f)
-    # os.remove(filename_tex)
-    # os.remove(filename_table)
 
-    os.chdir(oldwd)
+def render_tex(name, template_path, context, date=None, save_only=False, unique=False):
+    filename, source = generate_tex(name, template_path, context, date=date)
+    filename_pdf = output_filename(filename, "pdf", unique=unique)
+
+    # the auxiliary files are removed with the sandbox
+    with build_sandbox() as build_dir:
+        path = compile_tex(filename, source, build_dir)
+        if path is not None:
+            publish(path, filename_pdf)
 
     if save_only:
         return filename_pdf
@@ -153,9 +271,11 @@ def scale_pdf_to_a4(pdf):
     return scaled_pdf
 
 
-def fill_pdf_form(name, template_path, fields, attachments=[], date=None, save_only=False):
+def fill_pdf_form(
+    name, template_path, fields, attachments=[], date=None, save_only=False, unique=False
+):
     filename = normalize_filename(name, date=date)
-    filename_pdf = filename + ".pdf"
+    filename_pdf = output_filename(filename, "pdf", unique=unique)
 
     path = find_template(template_path)
 
@@ -80,3 +80,10 @@ def statement_not_submitted(self, excursion):
 def is_leader_of_relevant_invitation(member, waiter):
     assert waiter is not None
     return waiter.invitationtogroup_set.filter(group__leiters=member).exists()
+
+
+@predicate
+@memberize_user
+def is_creator(self, obj):
+    assert obj is not None
+    return obj.created_by == self
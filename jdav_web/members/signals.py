@@ -0,0 +1,191 @@
+from django.db.models.signals import m2m_changed
+from django.db.models.signals import post_delete
+from django.db.models.signals import post_save
+from django.db.models.signals import pre_delete
+from django.db.models.signals import pre_save
+from django.dispatch import receiver
+
+from .models import DocumentJob
+from .models import Freizeit
+from .models import Group
+from .models import Klettertreff
+from .models import KlettertreffAttendee
+from .models import Member
+from .models import MemberUnconfirmedProxy
+from .models import NewMemberOnList
+from .models import PermissionGroup
+from .models import PermissionMember
+from .models import refresh_activity_scores
+from .models.excursion import invalidate_roster
+from .models.member import invalidate_permission_closure
+from .models.member import PERMISSION_LOOKUPS
+
+PERMISSION_FIELDS = [f"{kind}_members" for kind in PERMISSION_LOOKUPS] + [
+    f"{kind}_groups" for kind in PERMISSION_LOOKUPS
+]
+
+
+def on_permission_member_changed(sender, instance, action, reverse, **kwargs):
+    if not action.startswith("post_"):
+        return
+    if reverse or action == "post_clear":
+        invalidate_permission_closure()
+    else:
+        invalidate_permission_closure([instance.member_id])
+
+
+def on_permission_group_changed(sender, instance, action, reverse, **kwargs):
+    if not action.startswith("post_"):
+        return
+    if reverse or action == "post_clear":
+        invalidate_permission_closure()
+    else:
+        invalidate_permission_closure(
+            Member.all_objects.filter(group=instance.group_id).values_list("pk", flat=True)
+        )
+
+
+for field in PERMISSION_FIELDS:
+    m2m_changed.connect(
+        on_permission_member_changed, sender=getattr(PermissionMember, field).through
+    )
+    m2m_changed.connect(on_permission_group_changed, sender=getattr(PermissionGroup, field).through)
+
+
+@receiver(post_save, sender=PermissionMember)
+@receiver(post_delete, sender=PermissionMember)
+def on_permission_member_saved(sender, instance, **kwargs):
+    invalidate_permission_closure([instance.member_id])
+
+
+@receiver(post_save, sender=PermissionGroup)
+@receiver(post_delete, sender=PermissionGroup)
+def on_permission_group_saved(sender, instance, **kwargs):
+    invalidate_permission_closure(
+        Member.all_objects.filter(group=instance.group_id).values_list("pk", flat=True)
+    )
+
+
+@receiver(m2m_changed, sender=Member.group.through)
+def on_member_group_changed(sender, instance, action, **kwargs):
+    # the closures of all members with permissions on the affected groups, personally or
+    # through one of their own groups, change as well, so drop all closures
+    if action.startswith("post_"):
+        invalidate_permission_closure()
+
+
+@receiver(pre_save, sender=Member)
+@receiver(pre_save, sender=MemberUnconfirmedProxy)
+def on_member_saving(sender, instance, **kwargs):
+    # remember if the confirmation changes, since closures only contain confirmed members
+    instance._confirmation_changed = (
+        instance.pk is not None
+        and not Member.all_objects.filter(pk=instance.pk, confirmed=instance.confirmed).exists()
+    )
+
+
+@receiver(post_save, sender=Member)
+@receiver(post_save, sender=MemberUnconfirmedProxy)
+def on_member_saved(sender, instance, created, **kwargs):
+    # new members might be reachable by others and primary keys of deleted members might
+    # be reused, so the closures of all members are affected
+    if created or getattr(instance, "_confirmation_changed", False):
+        invalidate_permission_closure()
+
+
+@receiver(post_delete, sender=Member)
+@receiver(post_delete, sender=MemberUnconfirmedProxy)
+def on_member_deleted(sender, instance, **kwargs):
+    invalidate_permission_closure()
+
+
+@receiver(post_delete, sender=Group)
+def on_group_deleted(sender, instance, **kwargs):
+    invalidate_permission_closure()
+
+
+@receiver(post_delete, sender=DocumentJob)
+def on_document_job_deleted(sender, instance, **kwargs):
+    # every job generates its own file, so nobody else uses it
+    instance.delete_file()
+
+
+def activity_member_pks(activity):
+    """Returns the pks of all members whose activity score depends on `activity`."""
+    pks = set(activity.jugendleiter.values_list("pk", flat=True))
+    if isinstance(activity, Freizeit):
+        pks.update(activity.membersonlist.values_list("member_id", flat=True))
+    else:
+        pks.update(activity.klettertreffattendee_set.values_list("member_id", flat=True))
+    return pks
+
+
+@receiver(post_save, sender=Freizeit)
+@receiver(post_save, sender=Klettertreff)
+def on_activity_saved(sender, instance, created, **kwargs):
+    # the date might have changed
+    if not created:
+        refresh_activity_scores(activity_member_pks(instance))
+
+
+@receiver(pre_delete, sender=Freizeit)
+@receiver(pre_delete, sender=Klettertreff)
+def on_activity_deleting(sender, instance, **kwargs):
+    # the relations are gone once the activity is deleted, so remember the affected members
+    instance._activity_member_pks = activity_member_pks(instance)
+
+
+@receiver(post_delete, sender=Freizeit)
+@receiver(post_delete, sender=Klettertreff)
+def on_activity_deleted(sender, instance, **kwargs):
+    refresh_activity_scores(getattr(instance, "_activity_member_pks", set()))
+
+
+@receiver(m2m_changed, sender=Freizeit.jugendleiter.through)
+@receiver(m2m_changed, sender=Klettertreff.jugendleiter.through)
+def on_activity_jugendleiter_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == "pre_clear":
+        # `pk_set` is not provided on clear, so remember the affected members
+        instance._cleared_member_pks = (
+            {instance.pk} if reverse else set(instance.jugendleiter.values_list("pk", flat=True))
+        )
+    elif action == "post_clear":
+        refresh_activity_scores(instance._cleared_member_pks)
+    elif action.startswith("post_"):
+        refresh_activity_scores({instance.pk} if reverse else pk_set)
+
+
+@receiver(post_save, sender=NewMemberOnList)
+@receiver(post_delete, sender=NewMemberOnList)
+@receiver(post_save, sender=KlettertreffAttendee)
+@receiver(post_delete, sender=KlettertreffAttendee)
+def on_attendee_changed(sender, instance, **kwargs):
+    refresh_activity_scores([instance.member_id])
+
+
+@receiver(m2m_changed, sender=Freizeit.jugendleiter.through)
+def on_excursion_jugendleiter_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if not action.startswith("post_"):
+        return
+    if not reverse:
+        invalidate_roster([instance.pk])
+    elif action == "post_clear":
+        invalidate_roster()
+    else:
+        invalidate_roster(pk_set)
+
+
+@receiver(post_save, sender=NewMemberOnList)
+@receiver(post_delete, sender=NewMemberOnList)
+def on_member_on_list_changed(sender, instance, **kwargs):
+    invalidate_roster([instance.object_id])
+
+
+@receiver(post_save, sender=Member)
+@receiver(post_save, sender=MemberUnconfirmedProxy)
+@receiver(post_delete, sender=Member)
+@receiver(post_delete, sender=MemberUnconfirmedProxy)
+def on_member_changed(sender, instance, **kwargs):
+    # birth dates, towns or the confirmation might have changed, deleted members also vanish
+    # from the youth leaders without an `m2m_changed` signal
+    invalidate_roster()
@@ -1,32 +1,101 @@
+import logging
+import os
+
 from celery import shared_task
+from contrib.media import media_path
 from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.core.mail import EmailMessage
+from django.db.models import F
 from django.utils import timezone
+from django.utils.translation import gettext as _
+from mailer.mailutils import addr_with_name
+from mailer.mailutils import get_echo_link_by_key
+from mailer.mailutils import get_headers
+from mailer.mailutils import send_each
 
+from .documents import DOCUMENTS
+from .models import DocumentJob
+from .models import EchoCampaign
+from .models import EchoRequest
 from .models import Freizeit
+from .models import InvitationBatch
+from .models import InvitationToGroup
 from .models import MemberWaitingList
+from .models import purge_expired_keys
+from .models import refresh_activity_scores
+from .models import WaitingConfirmationRun
+
+logger = logging.getLogger(__name__)
 
 
 @shared_task
 def ask_for_waiting_confirmation():
-    reminder_cutoff = timezone.now() - timezone.timedelta(
-        days=settings.CONFIRMATION_REMINDER_FREQUENCY
+    """
+    Ask all waiters returned by `MemberWaitingList.to_ask_for_wait_confirmation` to confirm
+    their waiting status. The waiters are dispatched in chunks of
+    `settings.DELIVERY_CHUNK_SIZE` to rate limited background tasks, which send the mails and
+    count the reminders. The metrics of the run are recorded in a `WaitingConfirmationRun`.
+    """
+    run = WaitingConfirmationRun.objects.create()
+    runs = WaitingConfirmationRun.objects.filter(pk=run.pk)
+    pks = list(
+        MemberWaitingList.to_ask_for_wait_confirmation()
+        .order_by("pk")
+        .values_list("pk", flat=True)
+        .iterator()
     )
-    cutoff = timezone.now() - timezone.timedelta(days=settings.WAITING_CONFIRMATION_FREQUENCY)
-    no = 0
-    # we ask all waiters for wait confirmation whose last confirmed waiting status is at least
-    # settings.WAITING_CONFIRMATION_FREQUENCY days ago, who have not received a reminder
-    # in the last settings.CONFIRMATION_REMINDER_FREQUENCY days and
-    # who have yet received strictly less reminders then settings.MAX_REMINDER_COUNT.
-    for waiter in MemberWaitingList.objects.filter(
-        last_wait_confirmation__lte=cutoff,
-        last_reminder__lte=reminder_cutoff,
-        sent_reminders__lt=settings.MAX_REMINDER_COUNT,
-    ):
-        waiter.ask_for_wait_confirmation()
-        no += 1
+    size = settings.DELIVERY_CHUNK_SIZE
+    for i in range(0, len(pks), size):
+        send_wait_confirmation_chunk.delay(run.pk, pks[i : i + size])
+    no = len(pks)
+    runs.update(waiters=no, chunks=(no + size - 1) // size, dispatched=timezone.now())
+    logger.info(f"Asked {no} waiters for wait confirmation.")
     return no
 
 
+@shared_task(acks_late=True, rate_limit=settings.DELIVERY_RATE_LIMIT)
+def send_wait_confirmation_chunk(run_pk, waiter_pks):
+    """
+    Send the wait confirmation mails to the waiters with primary keys `waiter_pks` over a
+    single connection. Waiters that do not need to be asked anymore are skipped, so the task
+    may be safely executed again. The new keys and reminder counters are only stored for
+    waiters whose mail was sent, all of them with a single `bulk_update`, such that a failed
+    mail neither uses up a reminder nor invalidates the links of an earlier one. The results
+    are counted in the `WaitingConfirmationRun` with primary key `run_pk`.
+    """
+    waiters = list(MemberWaitingList.to_ask_for_wait_confirmation().filter(pk__in=waiter_pks))
+    runs = WaitingConfirmationRun.objects.filter(pk=run_pk)
+    if not waiters:
+        return 0
+    for waiter in waiters:
+        waiter.prepare_wait_confirmation()
+    sender = addr_with_name(settings.DEFAULT_SENDING_MAIL, settings.DEFAULT_SENDING_NAME)
+    headers = get_headers()
+
+    def build_emails(waiter):
+        return [
+            EmailMessage(
+                _("Waiting confirmation needed"),
+                waiter.wait_confirmation_text(),
+                sender,
+                [waiter.email],
+                headers=headers,
+            )
+        ]
+
+    sent = []
+
+    def store_result(waiter, error):
+        if error is None:
+            sent.append(waiter)
+
+    send_each(waiters, build_emails, store_result)
+    MemberWaitingList.objects.bulk_update(sent, MemberWaitingList.WAIT_CONFIRMATION_FIELDS)
+    runs.update(sent=F("sent") + len(sent), failed=F("failed") + len(waiters) - len(sent))
+    return len(sent)
+
+
 @shared_task
 def send_crisis_intervention_list():
     """
@@ -51,3 +120,189 @@ def send_notification_crisis_intervention_list():
         excursion.notify_leaders_crisis_intervention_list()
         no += 1
     return no
+
+
+@shared_task
+def update_activity_scores():
+    """
+    Recompute the activity scores of all members. This is meant to run nightly, since
+    activities drop out of the scored period over time.
+    """
+    return refresh_activity_scores()
+
+
+@shared_task
+def purge_expired_member_keys():
+    """
+    Remove expired echo and unsubscribe keys of all members. This is meant to run nightly.
+    """
+    return purge_expired_keys()
+
+
+@shared_task
+def purge_expired_document_jobs():
+    """
+    Delete all document jobs finished more than `settings.DOCUMENT_JOB_EXPIRY` days ago
+    together with their files. This is meant to run nightly.
+    """
+    return DocumentJob.expired().delete()[0]
+
+
+@shared_task(acks_late=True)
+def render_document(job_pk):
+    """
+    Generate the document of the `DocumentJob` with primary key `job_pk` and store the
+    result. Finished jobs are skipped, so the task may be safely executed again after a
+    worker restart.
+    """
+    job = DocumentJob.objects.filter(pk=job_pk).first()
+    if job is None or job.is_finished:
+        return 0
+    job.status = DocumentJob.RUNNING
+    job.save(update_fields=["status"])
+    try:
+        if job.obj is None:
+            raise ValueError(f"{job.content_type} {job.object_id} does not exist.")
+        filename = DOCUMENTS[job.document].build(job.obj, **job.options)
+        # documents are built into new files and the renderers leave no file behind if
+        # compilation fails, so an existing file was produced by this run
+        if not os.path.exists(media_path(filename)):
+            raise FileNotFoundError(f"{filename} was not generated.")
+    except Exception as e:
+        logger.error(f"Generating document job {job_pk} failed: {e}")
+        job.status, job.error = DocumentJob.FAILED, str(e)
+    else:
+        job.status, job.filename, job.error = DocumentJob.DONE, filename, ""
+    job.finished = timezone.now()
+    job.save(update_fields=["status", "filename", "error", "finished"])
+    return int(job.status == DocumentJob.DONE)
+
+
+def start_document_job(document, obj, created_by=None, **options):
+    """
+    Create a `DocumentJob` generating the registered document `document` for `obj`
+    with the given `options` and dispatch it to a background task.
+    """
+    job = DocumentJob.objects.create(
+        document=document,
+        content_type=ContentType.objects.get_for_model(obj),
+        object_id=obj.pk,
+        options=options,
+        created_by=created_by,
+    )
+    render_document.delay(job.pk)
+    return job
+
+
+@shared_task(acks_late=True, rate_limit=settings.DELIVERY_RATE_LIMIT)
+def send_echo_chunk(campaign_pk, chunk):
+    """
+    Send the echo mails of all queued requests in chunk `chunk` of the `EchoCampaign` with
+    primary key `campaign_pk` over a single connection and store the result for every member.
+    Requests that are not queued anymore are skipped, so the task may be safely executed
+    again after a worker restart.
+    """
+    campaign = EchoCampaign.objects.get(pk=campaign_pk)
+    requests = list(
+        campaign.requests.filter(chunk=chunk, status=EchoRequest.QUEUED).select_related("member")
+    )
+    if not requests:
+        return 0
+    sender = addr_with_name(settings.DEFAULT_SENDING_MAIL, settings.DEFAULT_SENDING_NAME)
+    headers = get_headers()
+
+    def build_emails(request):
+        member = request.member
+        recipients = [getattr(member, email_fd) for email_fd, _c, _k in member.email_fields]
+        content = settings.ECHO_TEXT.format(
+            name=member.prename, link=get_echo_link_by_key(member.echo_key)
+        )
+        # one mail per address, such that the addresses are not disclosed to each other
+        return [
+            EmailMessage(_("Echo required"), content, sender, [addr], headers=headers)
+            for addr in dict.fromkeys(recipients)
+            if addr
+        ]
+
+    def store_result(request, error):
+        request.status = EchoRequest.SENT if error is None else EchoRequest.FAILED
+        request.error = "" if error is None else str(error)
+        # store the state immediately, so an interrupted chunk is not sent twice
+        request.save(update_fields=["status", "error", "updated"])
+
+    return send_each(requests, build_emails, store_result)
+
+
+def dispatch_echo_chunks(campaign, chunks):
+    for chunk in chunks:
+        send_echo_chunk.delay(campaign.pk, chunk)
+    return len(chunks)
+
+
+def start_echo_campaign(members, created_by=None):
+    """
+    Create an `EchoCampaign` for `members`, generate their echo keys and dispatch the
+    mails in chunks to background tasks.
+    """
+    campaign = EchoCampaign.objects.create(created_by=created_by)
+    dispatch_echo_chunks(campaign, campaign.queue_requests(members))
+    return campaign
+
+
+@shared_task(acks_late=True, rate_limit=settings.DELIVERY_RATE_LIMIT)
+def send_invitation_batch(batch_pk):
+    """
+    Render the invitation mails of up to `settings.DELIVERY_CHUNK_SIZE` queued invitations of
+    the `InvitationBatch` with primary key `batch_pk` and send them over a single connection.
+    Remaining invitations are sent by another execution of this rate limited task. The result
+    is stored for every invitation, so the task may be safely executed again after a worker
+    restart.
+    """
+    batch = InvitationBatch.objects.select_related("group__contact_email").get(pk=batch_pk)
+    queued = batch.invitations.filter(mail_status=InvitationToGroup.QUEUED)
+    invitations = list(queued.select_related("waiter")[: settings.DELIVERY_CHUNK_SIZE])
+    if not invitations:
+        return 0
+    sender = addr_with_name(settings.DEFAULT_SENDING_MAIL, settings.DEFAULT_SENDING_NAME)
+    headers = get_headers()
+    cc = [batch.group.contact_email.email] if batch.group.contact_email else []
+
+    def build_emails(invitation):
+        return [
+            EmailMessage(
+                _("Invitation to trial group meeting"),
+                invitation.render_text(batch.text_template),
+                sender,
+                [invitation.waiter.email],
+                cc=cc,
+                headers=headers,
+            )
+        ]
+
+    def store_result(invitation, error):
+        invitation.mail_status = (
+            InvitationToGroup.SENT if error is None else InvitationToGroup.FAILED
+        )
+        invitation.mail_error = "" if error is None else str(error)
+        # store the state immediately, so an interrupted batch is not sent twice
+        invitation.save(update_fields=["mail_status", "mail_error"])
+
+    sent = send_each(invitations, build_emails, store_result)
+    if queued.exists():
+        send_invitation_batch.delay(batch_pk)
+    return sent
+
+
+def start_invitation_batch(waiters, group, text_template, created_by=None):
+    """
+    Invite all `waiters` to `group` and send the invitation mails by a background task.
+    Without `text_template`, the invitation text of the group is used.
+    """
+    if not text_template:
+        text_template = group.get_invitation_text_template()
+    batch = InvitationBatch.objects.create(
+        group=group, text_template=text_template, created_by=created_by
+    )
+    batch.queue_invitations(waiters)
+    send_invitation_batch.delay(batch.pk)
+    return batch
@@ -11,6 +11,11 @@ def blToColor(bl):
         return "red"
 
 
+@register.filter
+def attendance_color(present):
+    return blToColor(present)
+
+
 @register.simple_tag
 def has_attendee_wrapper(klettertreff, member):
     return blToColor(klettertreff.has_attendee(member))
@@ -1,14 +1,18 @@
+import csv
 import datetime
 import math
 import os
 import os.path
 import random
+import subprocess
 import tempfile
 from http import HTTPStatus
 from io import BytesIO
+from io import StringIO
 from unittest import mock
 from unittest import skip
 
+from contrib.media import ensure_media_dir
 from dateutil.relativedelta import relativedelta
 from django import template
 from django.conf import settings
@@ -50,18 +54,24 @@ from members.admin import MemberUnconfirmedAdmin
 from members.admin import MemberWaitingListAdmin
 from members.admin import ParticipantFilter
 from members.admin import StatementOnListForm
+from members.excel import annotate_member_counts
 from members.excel import generate_ljp_vbk
 from members.models import ActivityCategory
+from members.models import attendance_matrix
 from members.models import AUSBILDUNGS_TOUR
 from members.models import confirm_mail_by_key
 from members.models import DIVERSE
+from members.models import DocumentJob
+from members.models import EchoCampaign
 from members.models import EmergencyContact
 from members.models import FAHRGEMEINSCHAFT_ANREISE
 from members.models import FEMALE
 from members.models import Freizeit
 from members.models import FUEHRUNGS_TOUR
 from members.models import GEMEINSCHAFTS_TOUR
+from members.models import get_by_key
 from members.models import Group
+from members.models import InvitationBatch
 from members.models import InvitationToGroup
 from members.models import Klettertreff
 from members.models import KlettertreffAttendee
@@ -78,14 +88,19 @@ from members.models import NewMemberOnList
 from members.models import OEFFENTLICHE_ANREISE
 from members.models import PermissionGroup
 from members.models import PermissionMember
+from members.models import purge_expired_keys
 from members.models import RegistrationPassword
+from members.models import skill_matrix
 from members.models import TrainingCategory
 from members.models import WEEKDAYS
+from members.pdf import evict_pdf_cache
 from members.pdf import fill_pdf_form
 from members.pdf import find_template
+from members.pdf import media_dir
 from members.pdf import media_path
 from members.pdf import merge_pdfs
 from members.pdf import pdf_add_attachments
+from members.pdf import pdf_cache_path
 from members.pdf import render_docx
 from members.pdf import render_tex
 from members.pdf import scale_pdf_page_to_a4
@@ -227,6 +242,72 @@ class MemberTestCase(BasicMemberTestCase):
                     self.assertFalse(member.may_change(other))
                     self.assertFalse(member.may_delete(other))
 
+    def test_may_closure_invalidation(self):
+        # populate the cached closures
+        self.assertFalse(self.fritz.may_view(self.anna))
+        self.assertFalse(self.peter.may_view(self.fritz))
+
+        # personal permissions
+        self.fritz.permissions.view_members.add(self.anna)
+        self.assertTrue(self.fritz.may_view(self.anna))
+        self.fritz.permissions.view_members.remove(self.anna)
+        self.assertFalse(self.fritz.may_view(self.anna))
+
+        # group permissions
+        self.ja.permissions.view_members.add(self.fritz)
+        self.assertTrue(self.peter.may_view(self.fritz))
+
+        # group memberships, from both sides of the relation
+        self.assertFalse(self.fritz.may_view(self.peter))
+        self.peter.group.add(self.spiel)
+        self.assertTrue(self.fritz.may_view(self.peter))
+        self.spiel.member_set.remove(self.peter)
+        self.assertFalse(self.fritz.may_view(self.peter))
+        self.fritz.group.add(self.ja)
+        self.assertTrue(self.fritz.may_view(self.fritz))
+        self.assertTrue(self.fritz.may_change(self.lara))
+
+        # deleting permissions
+        self.fritz.permissions.delete()
+        self.fritz.group.remove(self.ja)
+        self.assertFalse(self.fritz.may_view(self.lara))
+
+    def test_may_closure_group_membership(self):
+        # populate the cached closures of the members of Jugendausschuss
+        self.assertFalse(self.peter.may_view(self.anna))
+        self.assertFalse(self.lisa.may_view(self.anna))
+
+        # Jugendausschuss may view the members of Spielkinder
+        self.anna.group.add(self.spiel)
+        self.assertTrue(self.peter.may_view(self.anna))
+        self.assertTrue(self.lisa.may_view(self.anna))
+        self.spiel.member_set.remove(self.anna)
+        self.assertFalse(self.peter.may_view(self.anna))
+
+        # new members of Spielkinder
+        member = Member.objects.create(
+            prename="Paul", lastname="Keks", birth_date=timezone.now().date(), gender=MALE
+        )
+        member.group.add(self.spiel)
+        self.assertTrue(self.peter.may_view(member))
+
+    def test_may_unconfirmed(self):
+        self.assertTrue(self.fritz.may_view(self.lara))
+        self.lara.unconfirm()
+        self.assertFalse(self.fritz.may_view(self.lara))
+        # unconfirmed members may still view themselves
+        self.assertTrue(self.lara.may_view(self.lara))
+        self.lara.confirmed = True
+        self.lara.save()
+        self.assertTrue(self.fritz.may_view(self.lara))
+
+    def test_may_cached(self):
+        self.fritz.may_view(self.lara)
+        members = list(Member.objects.all())
+        with self.assertNumQueries(0):
+            for member in members:
+                self.fritz.may_view(member)
+
     def test_filter_queryset(self):
         # lise may only list herself
         self.assertEqual(set(self.lise.filter_queryset_by_permissions(model=Member)), {self.lise})
@@ -251,6 +332,20 @@ class MemberTestCase(BasicMemberTestCase):
         # Anna may not view Peter.
         self.assertNotIn(self.peter, qs_a.filter(_viewable=True))
 
+    def test_filter_members_by_permissions_single_query(self):
+        # evaluating the filtered and annotated queryset should cost one query,
+        # independent of the number of involved permissions and groups
+        for member in Member.objects.all():
+            qs = member.filter_members_by_permissions(Member.objects.all(), annotate=True)
+            with self.assertNumQueries(1):
+                list(qs)
+
+    def test_filter_members_by_permissions_matches_may(self):
+        for member in Member.objects.all():
+            qs = member.filter_members_by_permissions(Member.objects.all(), annotate=True)
+            for other in qs:
+                self.assertEqual(other._viewable, member.may_view(other))
+
     def test_filter_messages_by_permissions(self):
         good = Message.objects.create(
             subject="Good message", content="This is a test message", created_by=self.fritz
@@ -364,6 +459,31 @@ class MemberTestCase(BasicMemberTestCase):
         p = Member.objects.get(pk=self.peter.pk)
         self.assertFalse(p.gets_newsletter)
 
+    def test_get_by_key(self):
+        key = self.peter.generate_key()
+        self.assertEqual(get_by_key(Member.objects, "unsubscribe_key", key), self.peter)
+        # empty keys belong to many members and must never match
+        for key in ["", "invalid"]:
+            with self.assertRaises(Member.DoesNotExist):
+                get_by_key(Member.objects, "unsubscribe_key", key)
+
+    def test_purge_expired_keys(self):
+        echo_key = self.peter.generate_echo_key()
+        self.peter.generate_key()
+        unsubscribe_key = self.lisa.generate_key()
+        Member.objects.filter(pk=self.peter.pk).update(
+            echo_expire=timezone.now() - timezone.timedelta(days=31),
+            unsubscribe_expire=timezone.now() - timezone.timedelta(days=31),
+        )
+        self.assertEqual(purge_expired_keys(), 2)
+        self.peter.refresh_from_db()
+        self.lisa.refresh_from_db()
+        self.assertEqual(self.peter.echo_key, "")
+        self.assertEqual(self.peter.unsubscribe_key, "")
+        self.assertEqual(self.lisa.unsubscribe_key, unsubscribe_key)
+        self.assertFalse(self.peter.may_echo(echo_key))
+        self.assertEqual(purge_expired_keys(), 0)
+
     def test_contact_phone_number(self):
         self.assertEqual(self.peter.phone_number, self.peter.contact_phone_number)
         self.assertEqual("---", self.lisa.contact_phone_number)
@@ -595,6 +715,46 @@ class PDFTestCase(TestCase):
             self.assertEqual(float(page.mediabox.width), 595.0)
             self.assertEqual(float(page.mediabox.height), 842.0)
 
+    @mock.patch("members.pdf.subprocess.run")
+    def test_render_tex_cached(self, mock_run):
+        def compile_tex(args, cwd, **kwargs):
+            # every build runs in its own directory
+            self.assertEqual(os.listdir(cwd), [args[-1]])
+            with open(os.path.join(cwd, args[-1].replace(".tex", ".pdf")), "w") as f:
+                f.write(args[-1])
+            with open(os.path.join(cwd, args[-1].replace(".tex", ".log")), "w") as f:
+                f.write("log")
+            return subprocess.CompletedProcess(args, 0, "", "")
+
+        mock_run.side_effect = compile_tex
+        context = dict(memberlist=self.ex, settings=settings, mode="basic")
+        with tempfile.TemporaryDirectory() as tmp, self.settings(MEDIA_ROOT=tmp):
+            fp1 = render_tex("Foo", "members/seminar_report.tex", context, save_only=True)
+            fp2 = render_tex("Bar", "members/seminar_report.tex", context, save_only=True)
+            self.assertEqual(mock_run.call_count, 1)
+            with open(media_path(fp1)) as f1, open(media_path(fp2)) as f2:
+                self.assertEqual(f1.read(), f2.read())
+
+            # a different source is compiled
+            render_tex("Foo", "members/crisis_intervention_list.tex", context, save_only=True)
+            self.assertEqual(mock_run.call_count, 2)
+            # only the pdfs are published, auxiliary files and build directories are removed
+            self.assertFalse(any(name.endswith(".tex") for name in os.listdir(media_dir())))
+            self.assertFalse(any(name.endswith(".log") for name in os.listdir(media_dir())))
+            self.assertFalse(any(name.startswith(".build-") for name in os.listdir(media_dir())))
+
+    def test_evict_pdf_cache(self):
+        with tempfile.TemporaryDirectory() as tmp, self.settings(MEDIA_ROOT=tmp):
+            os.makedirs(os.path.dirname(pdf_cache_path("a")))
+            for i, digest in enumerate(["a", "b", "c"]):
+                with open(pdf_cache_path(digest), "wb") as f:
+                    f.write(b"x" * 10)
+                os.utime(pdf_cache_path(digest), (i, i))
+            evict_pdf_cache(max_size=20)
+            self.assertFalse(os.path.exists(pdf_cache_path("a")))
+            self.assertTrue(os.path.exists(pdf_cache_path("b")))
+            self.assertTrue(os.path.exists(pdf_cache_path("c")))
+
     def test_merge_pdfs_serve(self):
         """Test merge_pdfs with save_only=False"""
         # First create two PDF files to merge
@@ -929,6 +1089,31 @@ class MemberAdminTestCase(AdminTestCase):
         self.assertEqual(response.status_code, HTTPStatus.OK)
         self.assertNotContains(response, _("Invite"))
 
+    def test_export_csv(self):
+        url = reverse("admin:members_member_changelist")
+        members = Member.objects.filter(group__name="cool kids").order_by("pk")
+        c = self._login("superuser")
+        response = c.post(
+            url,
+            data={"action": "export_csv", "_selected_action": [m.pk for m in members]},
+        )
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertTrue(response.streaming)
+        rows = list(csv.DictReader(StringIO(b"".join(response.streaming_content).decode())))
+        self.assertEqual([int(row["id"]) for row in rows], [m.pk for m in members])
+        self.assertEqual(rows[0]["groups"], "cool kids")
+
+    def test_export_csv_insufficient_permission(self):
+        url = reverse("admin:members_member_changelist")
+        c = self._login("standard")
+        response = c.post(
+            url,
+            data={"action": "export_csv", "_selected_action": [self.fritz.pk]},
+            follow=True,
+        )
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertFalse(response.streaming)
+
     @override_settings(ALLOWED_EMAIL_DOMAINS_FOR_INVITE_AS_USER=["test-organization.org"])
     def test_invite_as_user_action(self):
         url = reverse("admin:members_member_changelist")
@@ -1057,10 +1242,42 @@ class MemberAdminTestCase(AdminTestCase):
             ).format(name=self.peter.name),
         )
 
+    @mock.patch("members.tasks.send_echo_chunk.delay")
+    def test_request_echo_campaign(self, mocked_delay):
+        self.peter.birth_date = None
+        self.peter.save()
+
+        c = self._login("superuser")
+        url = reverse("admin:members_member_changelist")
+        response = c.post(
+            url,
+            data={
+                "action": "request_echo_campaign",
+                "_selected_action": [self.fritz.pk, self.peter.pk],
+            },
+        )
+        campaign = EchoCampaign.objects.get()
+        campaign_url = reverse("admin:members_echocampaign_change", args=(campaign.pk,))
+        self.assertRedirects(response, campaign_url, fetch_redirect_response=False)
+        mocked_delay.assert_called_once_with(campaign.pk, 0)
+        self.assertEqual(list(campaign.requests.values_list("member", flat=True)), [self.fritz.pk])
+
+        # the page reloads until all mails are sent
+        response = c.get(campaign_url)
+        self.assertContains(response, 'http-equiv="refresh"')
+        self.assertContains(response, self.fritz.name)
+
+        response = c.post(
+            reverse("admin:members_echocampaign_changelist"),
+            data={"action": "retry_failed_requests", "_selected_action": [campaign.pk]},
+            follow=True,
+        )
+        self.assertContains(response, _("There are no failed echo requests."))
+
     def test_activity_score(self):
         # manually set activity score
         for i in range(5):
-            self.fritz._activity_score = i * 10 - 1
+            self.fritz.activity_score = i * 10 - 1
             self.assertTrue("img" in self.admin.activity_score(self.fritz))
 
     def test_unconfirm(self):
@@ -1352,7 +1569,7 @@ class MemberAdminTestCase(AdminTestCase):
         self.assertContains(response, self.peter.name)
         self.assertContains(response, _("Location"))
 
-    @mock.patch("members.admin.render_tex")
+    @mock.patch("members.documents.render_tex")
     def test_crisis_intervention_list_form_with_youth_leaders_and_groups(self, mock_render_tex):
         """Test crisis intervention list form with youth leaders and groups."""
         # Mock render_tex to return a PDF response
@@ -1578,6 +1795,29 @@ class FreizeitTestCase(BasicMemberTestCase):
         for i in range(10):
             self._test_sjr_application_numbers(10, 10 - i, i)
 
+    def test_roster(self):
+        # youth leaders on the member list, participants of the correct age and too old ones
+        add_memberonlist_by_age(self.ex, 2, 4, 1)
+        self.ex.jugendleiter.add(self.fritz)
+        ex = Freizeit.objects.select_related("ljpproposal").get(pk=self.ex.pk)
+        with self.assertNumQueries(1):
+            self.assertEqual(ex.staff_count, 3)
+            self.assertEqual(ex.participant_count, 5)
+            self.assertEqual(ex.old_participant_count, 1)
+            self.assertEqual(ex.head_count, 5)
+            self.assertEqual(ex.approved_staff_count, 2)
+            self.assertEqual(ex.theoretic_ljp_participant_count, 8)
+            self.assertEqual(ex.ljp_participant_count, 8)
+        # changes of the member list or the youth leaders are picked up
+        NewMemberOnList.objects.create(member=self.fritz, memberlist=self.ex)
+        self.assertEqual(ex.head_count, 6)
+        self.assertEqual(ex.staff_on_memberlist, {self.fritz})
+        self.ex.jugendleiter.remove(self.fritz)
+        self.assertEqual(ex.staff_count, 2)
+        self.assertEqual(ex.participant_count, 6)
+        Member.objects.filter(pk=self.fritz.pk).delete()
+        self.assertEqual(ex.participant_count, 5)
+
     def test_notify_leaders_crisis_intervention_list(self):
         self.ex2.notification_crisis_intervention_list_sent = False
         self.ex2.notify_leaders_crisis_intervention_list()
@@ -2035,6 +2275,46 @@ class FreizeitAdminTestCase(AdminTestCase, PDFActionMixin):
         self._test_pdf("notes_list", self.ex.pk)
         self._test_pdf("notes_list", self.ex.pk, username="standard", invalid=True)
 
+    @override_settings(ASYNC_DOCUMENTS=True)
+    @mock.patch("members.tasks.render_document.delay")
+    def test_notes_list_async_post(self, mocked_delay):
+        c = self._login("superuser")
+        url = reverse("admin:members_freizeit_notes_list", args=(self.ex.pk,))
+        response = c.post(url)
+        job = DocumentJob.objects.get()
+        job_url = reverse("admin:members_documentjob_change", args=(job.pk,))
+        self.assertRedirects(response, job_url, fetch_redirect_response=False)
+        mocked_delay.assert_called_once_with(job.pk)
+        self.assertEqual(job.obj, self.ex)
+        self.assertEqual(job.status, DocumentJob.PENDING)
+
+        # the page reloads until the job is finished
+        response = c.get(job_url)
+        self.assertContains(response, 'http-equiv="refresh"')
+        download_url = reverse("admin:members_documentjob_download", args=(job.pk,))
+        self.assertNotContains(response, download_url)
+        response = c.get(download_url, follow=True)
+        self.assertContains(response, _("The document is not available."))
+
+        ensure_media_dir()
+        with open(media_path("notes.pdf"), "wb") as f:
+            f.write(b"%PDF")
+        job.status, job.filename = DocumentJob.DONE, "notes.pdf"
+        job.save()
+        response = c.get(job_url)
+        self.assertNotContains(response, 'http-equiv="refresh"')
+        self.assertContains(response, download_url)
+        response = c.get(download_url)
+        self.assertEqual(response["Content-Type"], "application/pdf")
+
+        # jobs of others are not visible
+        c = self._login("standard")
+        response = c.get(reverse("admin:members_documentjob_changelist"))
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertNotContains(response, job_url)
+        response = c.get(download_url, follow=True)
+        self.assertContains(response, _("Insufficient permissions."))
+
     def test_finance_overview_no_statement_post(self):
         url = reverse("admin:members_freizeit_finance_overview", args=(self.ex.pk,))
         c = self._login("superuser")
@@ -2364,7 +2644,8 @@ class MemberWaitingListAdminTestCase(AdminTestCase):
         response = c.post(url, data={"send": "", "group": self.staff.pk, "text_template": ""})
         self.assertEqual(response.status_code, HTTPStatus.FOUND)
 
-    def test_ask_for_registration_action(self):
+    @mock.patch("members.tasks.send_invitation_batch.delay")
+    def test_ask_for_registration_action(self, mocked_delay):
         c = self._login("superuser")
         url = reverse("admin:members_memberwaitinglist_changelist")
         qs = MemberWaitingList.objects.all()
@@ -2372,14 +2653,57 @@ class MemberWaitingListAdminTestCase(AdminTestCase):
             url,
             data={
                 "action": "ask_for_registration_action",
-                "_selected_action": [qs[0].pk],
+                "_selected_action": [qs[0].pk, qs[1].pk],
                 "send": "",
                 "text_template": "",
                 "group": self.staff.pk,
             },
+        )
+        batch = InvitationBatch.objects.get()
+        batch_url = reverse("admin:members_invitationbatch_change", args=(batch.pk,))
+        self.assertRedirects(response, batch_url, fetch_redirect_response=False)
+        mocked_delay.assert_called_once_with(batch.pk)
+        self.assertEqual(batch.invitations.filter(group=self.staff).count(), 2)
+        # without a text, the invitation text of the group is sent
+        self.assertEqual(batch.text_template, self.staff.get_invitation_text_template())
+
+        # the page reloads until all invitations are sent
+        response = c.get(batch_url)
+        self.assertContains(response, 'http-equiv="refresh"')
+        self.assertContains(response, qs[0].name)
+
+        mocked_delay.reset_mock()
+        batch.invitations.update(mail_status=InvitationToGroup.FAILED, mail_error="Boom")
+        response = c.post(
+            reverse("admin:members_invitationbatch_changelist"),
+            data={"action": "retry_failed_invitations", "_selected_action": [batch.pk]},
             follow=True,
         )
+        self.assertContains(response, _("Retrying failed invitations."))
+        mocked_delay.assert_called_once_with(batch.pk)
+        self.assertFalse(batch.is_finished)
+
+    @mock.patch("members.tasks.send_invitation_batch.delay")
+    def test_ask_for_registration_action_invalid_text(self, mocked_delay):
+        c = self._login("superuser")
+        url = reverse("admin:members_memberwaitinglist_changelist")
+        qs = MemberWaitingList.objects.all()
+        response = c.post(
+            url,
+            data={
+                "action": "ask_for_registration_action",
+                "_selected_action": [qs[0].pk, qs[1].pk],
+                "send": "",
+                "text_template": "Hello {Name}",
+                "group": self.staff.pk,
+            },
+        )
+        # the text is shown again with an error instead of being sent
         self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertContains(response, "Hello {Name}")
+        self.assertContains(response, "errorlist")
+        self.assertFalse(InvitationBatch.objects.exists())
+        mocked_delay.assert_not_called()
 
     def test_age(self):
         req = self._request()
@@ -3156,7 +3480,7 @@ class ConfirmWaitingViewTestCase(BasicMemberTestCase):
         super().setUp()
         self.waiter = MemberWaitingList.objects.create(**WAITER_DATA)
         self.waiter.ask_for_wait_confirmation()
-        self.key = self.waiter.generate_wait_confirmation_key()
+        self.key = self.waiter.wait_confirmation_key
 
     def test_get_no_key(self):
         url = reverse("members:confirm_waiting")
@@ -3462,6 +3786,16 @@ class KlettertreffAdminTestCase(AdminTestCase):
         self.assertEqual(response.status_code, HTTPStatus.OK)
         self.assertNotContains(response, "Lise")
 
+    def test_overview_excel(self):
+        qs = Klettertreff.objects.all()
+        url = reverse("admin:members_klettertreff_changelist")
+        c = self._login("superuser")
+        response = c.post(
+            url, data={"action": "overview_excel", "_selected_action": [kl.pk for kl in qs]}
+        )
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(response["Content-Type"], "application/xlsx")
+
 
 class GroupAdminTestCase(AdminTestCase):
     def setUp(self):
@@ -3643,6 +3977,20 @@ class GroupTestCase(BasicMemberTestCase):
         self.assertIn("17:00", self.alp.get_time_slot_info())
         self.assertEqual(self.spiel.get_time_slot_info(), "")
 
+    def test_annotate_member_counts(self):
+        leader = self.alp.member_set.first()
+        self.alp.leiters.add(leader, self.fritz)
+        for group in annotate_member_counts(Group.objects.all()):
+            members = group.member_set.all()
+            self.assertEqual(group.member_count or 0, members.count())
+            self.assertEqual(
+                group.leader_count or 0, len([m for m in members if m in group.leiters.all()])
+            )
+        alp = annotate_member_counts(Group.objects.filter(pk=self.alp.pk)).get()
+        self.assertEqual(
+            alp.leader_count, len({leader, self.fritz} & set(self.alp.member_set.all()))
+        )
+
     def test_get_invitation_text_template(self):
         alp_text = self.alp.get_invitation_text_template()
         spiel_text = self.spiel.get_invitation_text_template()
@@ -3681,6 +4029,36 @@ class NewMemberOnListTestCase(BasicMemberTestCase):
     def test_qualities_tex(self):
         self.assertGreater(len(self.mol.qualities_tex), 0)
 
+    def test_skill_matrix(self):
+        walking = ActivityCategory.objects.create(name="walking", description="foobar")
+        for difficulty, activities in [(2, [self.cat, walking]), (3, [self.cat])]:
+            ex = Freizeit.objects.create(
+                name="Past trip",
+                kilometers_traveled=120,
+                tour_type=GEMEINSCHAFTS_TOUR,
+                tour_approach=MUSKELKRAFT_ANREISE,
+                difficulty=difficulty,
+                date=timezone.now() - timezone.timedelta(days=30),
+            )
+            ex.activity.set(activities)
+            NewMemberOnList.objects.create(memberlist=ex, member=self.fritz)
+            NewMemberOnList.objects.create(memberlist=ex, member=self.lara)
+        # the wild trip has not happened yet
+        self.ex.date = timezone.now() + timezone.timedelta(days=30)
+        self.ex.save()
+        NewMemberOnList.objects.create(memberlist=self.ex, member=self.lara)
+        with self.assertNumQueries(2):
+            matrix = skill_matrix([self.fritz.pk, self.lara.pk, self.peter.pk])
+        expected = {"crazy climbing": 15, "walking": 6}
+        self.assertEqual(matrix[self.fritz.pk], expected)
+        self.assertEqual(matrix[self.lara.pk], expected)
+        self.assertEqual(matrix[self.peter.pk], {"crazy climbing": 0, "walking": 0})
+        self.assertEqual(self.fritz.get_skills(), expected)
+        with self.assertNumQueries(1):
+            self.assertEqual(
+                skill_matrix([self.fritz.pk], ["walking"]), {self.fritz.pk: {"walking": 6}}
+            )
+
 
 class TrainingCategoryTestCase(TestCase):
     def setUp(self):
@@ -3775,6 +4153,19 @@ class KlettertreffTestCase(BasicMemberTestCase):
         self.assertTrue(self.kt.has_attendee(self.peter))
         self.assertFalse(self.kt.has_attendee(self.fritz))
 
+    def test_attendance_matrix(self):
+        kt2 = Klettertreff.objects.create(location="bar", topic="baz", group=self.alp)
+        KlettertreffAttendee.objects.create(klettertreff=kt2, member=self.fritz)
+        members = [self.peter, self.fritz]
+        with self.assertNumQueries(2):
+            leader_rows, member_rows = attendance_matrix([self.kt, kt2], [self.fritz], members)
+        self.assertEqual([row.member for row in leader_rows], [self.fritz])
+        self.assertEqual(leader_rows[0].cells, [True, False])
+        self.assertEqual([row.cells for row in member_rows], [[True, False], [False, True]])
+        for row in member_rows:
+            for kt, cell in zip([self.kt, kt2], row.cells):
+                self.assertEqual(cell, kt.has_attendee(row.member))
+
 
 class EmergencyContactTestCase(TestCase):
     def setUp(self):
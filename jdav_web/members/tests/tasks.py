@@ -1,18 +1,46 @@
+import os
+import subprocess
+import tempfile
 from unittest.mock import patch
 
+from contrib.media import ensure_media_dir
+from contrib.media import media_path
+from contrib.media import unique_filename
 from django.conf import settings
+from django.core import mail
+from django.test import override_settings
 from django.test import TestCase
 from django.utils import timezone
 from mailer.models import EmailAddress
 
+from ..documents import Document
 from ..models import DIVERSE
+from ..models import DocumentJob
+from ..models import EchoRequest
 from ..models import Freizeit
 from ..models import GEMEINSCHAFTS_TOUR
 from ..models import Group
+from ..models import InvitationToGroup
+from ..models import Klettertreff
+from ..models import KlettertreffAttendee
+from ..models import Member
 from ..models import MemberWaitingList
+from ..models import NewMemberOnList
+from ..models import WaitingConfirmationRun
+from ..pdf import render_tex
 from ..tasks import ask_for_waiting_confirmation
+from ..tasks import purge_expired_document_jobs
+from ..tasks import purge_expired_member_keys
+from ..tasks import render_document
 from ..tasks import send_crisis_intervention_list
+from ..tasks import send_echo_chunk
+from ..tasks import send_invitation_batch
 from ..tasks import send_notification_crisis_intervention_list
+from ..tasks import send_wait_confirmation_chunk
+from ..tasks import start_document_job
+from ..tasks import start_echo_campaign
+from ..tasks import start_invitation_batch
+from ..tasks import update_activity_scores
 
 
 class TasksTestCase(TestCase):
@@ -120,14 +148,64 @@ class TasksTestCase(TestCase):
             notification_crisis_intervention_list_sent=True,
         )
 
-    @patch.object(MemberWaitingList, "ask_for_wait_confirmation")
-    def test_ask_for_waiting_confirmation(self, mock_ask):
-        """Test ask_for_waiting_confirmation task calls correct waiters."""
+    @patch("members.tasks.send_wait_confirmation_chunk.delay")
+    def test_ask_for_waiting_confirmation(self, mock_delay):
+        """Test ask_for_waiting_confirmation task asks correct waiters."""
         result = ask_for_waiting_confirmation()
 
-        # Should call ask_for_wait_confirmation for waiter1 and waiter2 only
+        # Should ask waiter1 and waiter2 only
         self.assertEqual(result, 2)
-        self.assertEqual(mock_ask.call_count, 2)
+        run = WaitingConfirmationRun.objects.get()
+        mock_delay.assert_called_once_with(run.pk, [self.waiter1.pk, self.waiter2.pk])
+        self.assertEqual((run.waiters, run.chunks), (2, 1))
+        self.assertIsNotNone(run.dispatched)
+        # the reminders are counted once the mails are sent
+        self.waiter1.refresh_from_db()
+        self.assertEqual(self.waiter1.sent_reminders, 0)
+
+    @override_settings(DELIVERY_CHUNK_SIZE=1)
+    @patch("members.tasks.send_wait_confirmation_chunk.delay")
+    def test_ask_for_waiting_confirmation_chunks(self, mock_delay):
+        # the number of queries does not depend on the number of waiters
+        with self.assertNumQueries(3):
+            self.assertEqual(ask_for_waiting_confirmation(), 2)
+        self.assertEqual(mock_delay.call_count, 2)
+        self.assertEqual(WaitingConfirmationRun.objects.get().chunks, 2)
+
+    @patch("members.tasks.send_wait_confirmation_chunk.delay")
+    def test_send_wait_confirmation_chunk(self, mock_delay):
+        ask_for_waiting_confirmation()
+        run = WaitingConfirmationRun.objects.get()
+        pks = [self.waiter1.pk, self.waiter2.pk, self.waiter3.pk]
+        self.assertEqual(send_wait_confirmation_chunk(run.pk, pks), 2)
+        self.assertEqual(len(mail.outbox), 2)
+        self.waiter1.refresh_from_db()
+        self.assertEqual(self.waiter1.sent_reminders, 1)
+        self.assertIn(self.waiter1.wait_confirmation_key, mail.outbox[0].body)
+        self.assertIn(self.waiter1.leave_key, mail.outbox[0].body)
+
+        # reminded waiters are skipped, so executing the task again does not send anything
+        self.assertEqual(send_wait_confirmation_chunk(run.pk, pks), 0)
+        self.assertEqual(len(mail.outbox), 2)
+        run.refresh_from_db()
+        self.assertEqual((run.sent, run.failed), (2, 0))
+
+    @patch("members.tasks.send_wait_confirmation_chunk.delay")
+    def test_send_wait_confirmation_chunk_failure(self, mock_delay):
+        ask_for_waiting_confirmation()
+        run = WaitingConfirmationRun.objects.get()
+        pks = [self.waiter1.pk, self.waiter2.pk]
+        with patch("mailer.mailutils.get_delivery_connection") as mock_connection:
+            mock_connection.return_value.send_messages.side_effect = [None, Exception("Boom")]
+            self.assertEqual(send_wait_confirmation_chunk(run.pk, pks), 1)
+        run.refresh_from_db()
+        self.assertEqual((run.sent, run.failed), (1, 1))
+        # a failed mail does not use up a reminder and is sent by the next run
+        self.waiter2.refresh_from_db()
+        self.assertEqual(self.waiter2.sent_reminders, settings.MAX_REMINDER_COUNT - 1)
+        self.assertEqual(self.waiter2.wait_confirmation_key, "")
+        self.assertEqual(ask_for_waiting_confirmation(), 1)
+        mock_delay.assert_called_with(run.pk + 1, [self.waiter2.pk])
 
     @patch.object(Freizeit, "send_crisis_intervention_list")
     def test_send_crisis_intervention_list(self, mock_send):
@@ -147,3 +225,354 @@ class TasksTestCase(TestCase):
         # that haven't been sent
         self.assertEqual(result, 2)
         self.assertEqual(mock_notify.call_count, 2)
+
+
+class ActivityScoreTestCase(TestCase):
+    def setUp(self):
+        self.group = Group.objects.create(name="Test Group")
+        self.leader = Member.objects.create(
+            prename="Lea",
+            lastname="Leader",
+            birth_date=timezone.now().date(),
+            email=settings.TEST_MAIL,
+            gender=DIVERSE,
+        )
+        self.participant = Member.objects.create(
+            prename="Paul",
+            lastname="Participant",
+            birth_date=timezone.now().date(),
+            email=settings.TEST_MAIL,
+            gender=DIVERSE,
+        )
+        self.excursion = Freizeit.objects.create(
+            name="Excursion",
+            date=timezone.now() - timezone.timedelta(days=10),
+            tour_type=GEMEINSCHAFTS_TOUR,
+            kilometers_traveled=10,
+            difficulty=1,
+        )
+        self.klettertreff = Klettertreff.objects.create(
+            location="Gym", topic="Bouldern", group=self.group
+        )
+
+    def assertScores(self, leader, participant):
+        self.leader.refresh_from_db()
+        self.participant.refresh_from_db()
+        self.assertEqual(self.leader.activity_score, leader)
+        self.assertEqual(self.participant.activity_score, participant)
+
+    def test_signals(self):
+        self.excursion.jugendleiter.add(self.leader)
+        self.assertScores(3, 0)
+        NewMemberOnList.objects.create(memberlist=self.excursion, member=self.participant)
+        self.assertScores(3, 3)
+        self.klettertreff.jugendleiter.add(self.leader)
+        KlettertreffAttendee.objects.create(klettertreff=self.klettertreff, member=self.participant)
+        self.assertScores(4, 4)
+
+        # moving the excursion out of the scored period
+        self.excursion.date = timezone.now() - timezone.timedelta(days=400)
+        self.excursion.save()
+        self.assertScores(1, 1)
+
+        self.leader.klettertreff_set.clear()
+        self.assertScores(0, 1)
+        self.klettertreff.delete()
+        self.assertScores(0, 0)
+
+    def test_excursion_deleted(self):
+        self.excursion.jugendleiter.add(self.leader)
+        NewMemberOnList.objects.create(memberlist=self.excursion, member=self.participant)
+        self.excursion.delete()
+        self.assertScores(0, 0)
+
+    def test_update_activity_scores(self):
+        self.excursion.jugendleiter.add(self.leader)
+        # bypasses the signals
+        Member.objects.update(activity_score=10)
+        self.assertEqual(update_activity_scores(), 2)
+        self.assertScores(3, 0)
+        self.assertEqual(update_activity_scores(), 0)
+
+    def test_purge_expired_member_keys(self):
+        self.leader.generate_echo_key()
+        Member.objects.filter(pk=self.leader.pk).update(
+            echo_expire=timezone.now() - timezone.timedelta(days=31)
+        )
+        self.assertEqual(purge_expired_member_keys(), 1)
+        self.assertEqual(purge_expired_member_keys(), 0)
+
+
+class DocumentJobTestCase(TestCase):
+    def setUp(self):
+        self.group = Group.objects.create(name="Test Group")
+        self.documents = {
+            "overview": Document("overview", "Overview", self.build_overview),
+            "broken": Document("broken", "Broken", lambda group: 1 / 0),
+            "missing": Document("missing", "Missing", lambda group: "missing.pdf"),
+            "checklist": Document(
+                "checklist",
+                "Checklist",
+                lambda group: render_tex(
+                    group.name,
+                    "members/tex_base.tex",
+                    {"settings": settings},
+                    save_only=True,
+                    unique=True,
+                ),
+            ),
+        }
+
+    def build_overview(self, group, suffix=""):
+        filename = unique_filename(f"{group.name}{suffix}", "pdf")
+        ensure_media_dir()
+        with open(media_path(filename), "wb") as f:
+            f.write(b"%PDF")
+        return filename
+
+    @patch("members.tasks.render_document.delay")
+    def test_start_document_job(self, mock_delay):
+        job = start_document_job("overview", self.group, suffix="_1")
+        mock_delay.assert_called_once_with(job.pk)
+        self.assertEqual(job.status, DocumentJob.PENDING)
+        self.assertEqual(job.obj, self.group)
+        self.assertEqual(job.options, {"suffix": "_1"})
+
+    @patch("members.tasks.render_document.delay")
+    def test_render_document(self, mock_delay):
+        job = start_document_job("overview", self.group, suffix="_1")
+        with patch.dict("members.tasks.DOCUMENTS", self.documents):
+            self.assertEqual(render_document(job.pk), 1)
+            job.refresh_from_db()
+            self.assertEqual(job.status, DocumentJob.DONE)
+            self.assertTrue(job.filename.startswith("Test Group_1_"))
+            self.assertIsNotNone(job.finished)
+            # finished jobs are skipped
+            self.assertEqual(render_document(job.pk), 0)
+            self.assertEqual(render_document(job.pk + 1), 0)
+
+            # a second job for the same object does not replace the file of the first
+            other = start_document_job("overview", self.group, suffix="_1")
+            render_document(other.pk)
+            other.refresh_from_db()
+            self.assertNotEqual(other.filename, job.filename)
+            self.assertTrue(os.path.exists(media_path(job.filename)))
+
+    @patch("members.pdf.subprocess.run")
+    @patch("members.tasks.render_document.delay")
+    def test_render_document_compilation_failure(self, mock_delay, mock_run):
+        mock_run.return_value = subprocess.CompletedProcess([], 1, "", "")
+        with tempfile.TemporaryDirectory() as tmp, self.settings(MEDIA_ROOT=tmp):
+            # the output of an earlier render with the same name is not picked up
+            ensure_media_dir()
+            with open(media_path(f"{self.group.name}_{timezone.now():%d_%m_%Y}.pdf"), "wb") as f:
+                f.write(b"%PDF")
+            job = start_document_job("checklist", self.group)
+            with patch.dict("members.tasks.DOCUMENTS", self.documents):
+                self.assertEqual(render_document(job.pk), 0)
+        mock_run.assert_called_once()
+        job.refresh_from_db()
+        self.assertEqual(job.status, DocumentJob.FAILED)
+
+    @patch("members.tasks.render_document.delay")
+    def test_render_document_failure(self, mock_delay):
+        with patch.dict("members.tasks.DOCUMENTS", self.documents):
+            for document in ["broken", "missing"]:
+                job = start_document_job(document, self.group)
+                self.assertEqual(render_document(job.pk), 0)
+                job.refresh_from_db()
+                self.assertEqual(job.status, DocumentJob.FAILED)
+                self.assertNotEqual(job.error, "")
+
+            job = start_document_job("overview", self.group)
+            self.group.delete()
+            self.assertEqual(render_document(job.pk), 0)
+            job.refresh_from_db()
+            self.assertEqual(job.status, DocumentJob.FAILED)
+
+    @patch("members.tasks.render_document.delay")
+    def test_delete_document_job(self, mock_delay):
+        job = start_document_job("overview", self.group)
+        with patch.dict("members.tasks.DOCUMENTS", self.documents):
+            render_document(job.pk)
+        job.refresh_from_db()
+        path = media_path(job.filename)
+        self.assertTrue(os.path.exists(path))
+        job.delete()
+        self.assertFalse(os.path.exists(path))
+
+    @patch("members.tasks.render_document.delay")
+    def test_purge_expired_document_jobs(self, mock_delay):
+        with patch.dict("members.tasks.DOCUMENTS", self.documents):
+            old = start_document_job("overview", self.group)
+            render_document(old.pk)
+            recent = start_document_job("overview", self.group)
+            render_document(recent.pk)
+        pending = start_document_job("overview", self.group)
+        finished = timezone.now() - timezone.timedelta(days=settings.DOCUMENT_JOB_EXPIRY + 1)
+        DocumentJob.objects.filter(pk__in=[old.pk, pending.pk]).update(finished=finished)
+        old.refresh_from_db()
+
+        self.assertEqual(purge_expired_document_jobs(), 1)
+        self.assertEqual(
+            set(DocumentJob.objects.values_list("pk", flat=True)), {recent.pk, pending.pk}
+        )
+        self.assertFalse(os.path.exists(media_path(old.filename)))
+        self.assertEqual(purge_expired_document_jobs(), 0)
+
+
+@override_settings(DELIVERY_CHUNK_SIZE=2)
+class EchoCampaignTestCase(TestCase):
+    def setUp(self):
+        self.members = [
+            Member.objects.create(
+                prename=f"Member{i}",
+                lastname="Test",
+                birth_date=timezone.now().date(),
+                email=f"member{i}@test.com",
+                gender=DIVERSE,
+            )
+            for i in range(3)
+        ]
+
+    @patch("members.tasks.send_echo_chunk.delay")
+    def test_start_echo_campaign(self, mock_delay):
+        with self.assertNumQueries(6):
+            campaign = start_echo_campaign(self.members, created_by=self.members[0])
+        self.assertEqual(mock_delay.call_count, 2)
+        mock_delay.assert_any_call(campaign.pk, 1)
+        keys = set()
+        for member in self.members:
+            member.refresh_from_db()
+            self.assertFalse(member.echoed)
+            self.assertGreater(member.echo_expire, timezone.now())
+            keys.add(member.echo_key)
+        self.assertEqual(len(keys), 3)
+        self.assertIn("0 of 3 sent", campaign.progress())
+
+        # queueing again does not generate new keys for known members
+        self.assertEqual(campaign.queue_requests(self.members), [0, 1])
+        self.assertEqual(campaign.requests.count(), 3)
+
+    @patch("members.tasks.send_echo_chunk.delay")
+    def test_send_echo_chunk(self, mock_delay):
+        campaign = start_echo_campaign(self.members)
+        self.assertEqual(send_echo_chunk(campaign.pk, 0), 2)
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertIn(self.members[0].echo_key, mail.outbox[0].body)
+        # executing the task again does not send anything
+        self.assertEqual(send_echo_chunk(campaign.pk, 0), 0)
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertFalse(campaign.is_finished)
+
+        self.assertEqual(send_echo_chunk(campaign.pk, 1), 1)
+        self.assertTrue(campaign.is_finished)
+        Member.objects.filter(pk=self.members[0].pk).update(echoed=True)
+        self.assertIn("3 of 3 sent, 0 failed, 1 echoed", campaign.progress())
+
+    @patch("members.tasks.send_echo_chunk.delay")
+    def test_send_echo_chunk_to_every_address(self, mock_delay):
+        Member.objects.filter(pk=self.members[2].pk).update(alternative_email="alt@test.com")
+        campaign = start_echo_campaign(self.members)
+        self.assertEqual(send_echo_chunk(campaign.pk, 1), 1)
+        self.assertEqual(
+            [email.to for email in mail.outbox], [["member2@test.com"], ["alt@test.com"]]
+        )
+
+    @patch("members.tasks.send_echo_chunk.delay")
+    def test_retry_failed_requests(self, mock_delay):
+        campaign = start_echo_campaign(self.members)
+        with patch("mailer.mailutils.get_delivery_connection") as mock_connection:
+            mock_connection.return_value.send_messages.side_effect = [None, Exception("Boom")]
+            self.assertEqual(send_echo_chunk(campaign.pk, 0), 1)
+        failed = campaign.requests.get(status=EchoRequest.FAILED)
+        self.assertEqual(failed.error, "Boom")
+
+        self.assertEqual(campaign.requeue_failed_requests(), [0])
+        failed.refresh_from_db()
+        self.assertEqual(failed.status, EchoRequest.QUEUED)
+
+
+class InvitationBatchTestCase(TestCase):
+    def setUp(self):
+        self.group = Group.objects.create(
+            name="Test Group", contact_email=EmailAddress.objects.create(name="test")
+        )
+        self.waiters = [
+            MemberWaitingList.objects.create(
+                prename=f"Waiter{i}",
+                lastname="Test",
+                birth_date=timezone.now().date(),
+                email=f"waiter{i}@test.com",
+                gender=DIVERSE,
+            )
+            for i in range(3)
+        ]
+
+    @patch("members.tasks.send_invitation_batch.delay")
+    def test_start_invitation_batch(self, mock_delay):
+        with self.assertNumQueries(2):
+            batch = start_invitation_batch(self.waiters, self.group, "Hi {name}: {link}")
+        mock_delay.assert_called_once_with(batch.pk)
+        self.assertEqual(batch.invitations.count(), 3)
+        self.assertFalse(batch.is_finished)
+        self.assertIn("0 of 3 sent", batch.progress())
+
+    @patch("members.tasks.send_invitation_batch.delay")
+    def test_start_invitation_batch_default_text(self, mock_delay):
+        batch = start_invitation_batch(self.waiters, self.group, "")
+        self.assertEqual(batch.text_template, self.group.get_invitation_text_template())
+        self.assertNotEqual(batch.text_template, "")
+
+    @patch("members.tasks.send_invitation_batch.delay")
+    def test_send_invitation_batch(self, mock_delay):
+        batch = start_invitation_batch(self.waiters, self.group, "Hi {name}: {link}")
+        with patch("mailer.mailutils.get_delivery_connection") as mock_connection:
+            mock_connection.return_value.send_messages.side_effect = [None, Exception("Boom"), None]
+            self.assertEqual(send_invitation_batch(batch.pk), 2)
+        # all mails are sent over one connection
+        mock_connection.return_value.open.assert_called_once()
+        self.assertEqual(mock_connection.return_value.send_messages.call_count, 3)
+        email = mock_connection.return_value.send_messages.call_args_list[0].args[0][0]
+        invitation = batch.invitations.get(waiter=self.waiters[0])
+        self.assertIn("Hi Waiter0: ", email.body)
+        self.assertIn(invitation.key, email.body)
+        self.assertEqual(email.cc, [self.group.contact_email.email])
+
+        self.assertTrue(batch.is_finished)
+        self.assertIn("2 of 3 sent, 1 failed", batch.progress())
+        failed = batch.invitations.get(mail_status=InvitationToGroup.FAILED)
+        self.assertEqual(failed.mail_error, "Boom")
+        # executing the task again does not send anything
+        self.assertEqual(send_invitation_batch(batch.pk), 0)
+
+    @patch("members.tasks.send_invitation_batch.delay")
+    def test_send_invitation_batch_invalid_text(self, mock_delay):
+        batch = start_invitation_batch(self.waiters, self.group, "Hi {Name}")
+        self.assertEqual(send_invitation_batch(batch.pk), 0)
+        self.assertEqual(len(mail.outbox), 0)
+        # the invitations fail instead of staying queued forever
+        self.assertTrue(batch.is_finished)
+        self.assertEqual(
+            list(batch.invitations.values_list("mail_status", "mail_error").distinct()),
+            [(InvitationToGroup.FAILED, "'Name'")],
+        )
+
+        batch.text_template = "Hi {name}"
+        batch.save()
+        self.assertEqual(batch.requeue_failed_invitations(), 3)
+        self.assertEqual(send_invitation_batch(batch.pk), 3)
+
+    @override_settings(DELIVERY_CHUNK_SIZE=2)
+    @patch("members.tasks.send_invitation_batch.delay")
+    def test_send_invitation_batch_in_chunks(self, mock_delay):
+        batch = start_invitation_batch(self.waiters, self.group, "Hi {name}")
+        mock_delay.reset_mock()
+        self.assertEqual(send_invitation_batch(batch.pk), 2)
+        # the remaining invitations are sent by another rate limited task
+        mock_delay.assert_called_once_with(batch.pk)
+        self.assertIn("2 of 3 sent", batch.progress())
+        mock_delay.reset_mock()
+        self.assertEqual(send_invitation_batch(batch.pk), 1)
+        mock_delay.assert_not_called()
+        self.assertTrue(batch.is_finished)
@@ -3,6 +3,8 @@ import os
 from io import StringIO
 
 from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import CommandError
 from django.test import TestCase
 from members.csv import export_generalized_csv
 from members.csv import import_generalized_csv
@@ -101,3 +103,61 @@ class CSVRoundtripTestCase(TestCase):
         self.assertEqual(emma.dav_badge_no, "114/00/245891")
         self.assertEqual(emma.emergencycontact_set.count(), 2)
         self.assertTrue(emma.swimming_badge)
+
+    def test_import_query_count(self):
+        """The number of queries does not depend on the number of rows"""
+        with open(self.test_csv_path, encoding="utf-8") as f:
+            with self.assertNumQueries(11):
+                import_generalized_csv(f)
+
+    def test_sync_by_badge_number(self):
+        """Importing the same file again with matching updates the existing members"""
+        with open(self.test_csv_path, encoding="utf-8") as f:
+            import_generalized_csv(f)
+        emma = Member.objects.get(prename="Emma", lastname="Bergmann")
+        emma.town = "Mannheim"
+        emma.save()
+        emma.group.clear()
+
+        with open(self.test_csv_path, encoding="utf-8") as f:
+            plan = import_generalized_csv(f, match_by="dav_badge_no", dry_run=True)
+        # two badge numbers appear twice in the test data
+        self.assertEqual(plan.summary(), {"created": 0, "updated": 26, "conflicts": 4})
+        self.assertEqual(plan.changes[emma], ["town"])
+        # nothing is written in a dry run
+        emma.refresh_from_db()
+        self.assertEqual(emma.town, "Mannheim")
+
+        with open(self.test_csv_path, encoding="utf-8") as f:
+            created = import_generalized_csv(f, match_by="dav_badge_no")
+        self.assertEqual(created, [])
+        self.assertEqual(Member.objects.count(), 30)
+        emma.refresh_from_db()
+        self.assertEqual(emma.town, "Heidelberg")
+        self.assertGreater(emma.group.count(), 0)
+        self.assertEqual(emma.emergencycontact_set.count(), 2)
+
+    def test_sync_conflicts(self):
+        csv_data = (
+            "id,prename,lastname,dav_badge_no\n"
+            "1,Anna,Alt,111\n"
+            "2,Ben,Bach,222\n"
+            "3,Carl,Cord,222\n"
+            "4,Dora,Dorn,\n"
+        )
+        import_generalized_csv(StringIO("prename,lastname,dav_badge_no\nAnna,Alt,111\n"))
+        plan = import_generalized_csv(StringIO(csv_data), match_by="dav_badge_no", dry_run=True)
+        self.assertEqual(plan.summary(), {"created": 1, "updated": 1, "conflicts": 2})
+        self.assertEqual([line for line, _ in plan.conflicts], [3, 4])
+
+        plan = import_generalized_csv(StringIO(csv_data), match_by="id", dry_run=True)
+        self.assertEqual(plan.summary()["conflicts"], 3)
+
+    def test_sync_by_unknown_field(self):
+        """Rows can only be matched by columns identifying a member"""
+        for field in ["dav_badg_no", "group"]:
+            with self.assertRaises(ValueError):
+                import_generalized_csv(StringIO("prename\nAnna\n"), match_by=field)
+        with self.assertRaises(CommandError):
+            call_command("import_members", self.test_csv_path, "--match", "group")
+        self.assertEqual(Member.objects.count(), 0)
@@ -13,6 +13,7 @@ from django.utils.translation import gettext_lazy as _
 from django.views.decorators.cache import never_cache
 from members.models import confirm_mail_by_key
 from members.models import EmergencyContact
+from members.models import get_by_key
 from members.models import InvitationToGroup
 from members.models import Member
 from members.models import MemberWaitingList
@@ -200,7 +201,7 @@ def echo(request):
         key = request.GET["key"]
         # try to get a member from the supplied echo key
         try:
-            member = Member.objects.get(echo_key=key)
+            member = get_by_key(Member.objects, "echo_key", key)
         except Member.DoesNotExist:
             return render_echo_failed(request, _("invalid"))
 
@@ -214,7 +215,7 @@ def echo(request):
     password = request.POST["password"]
     # try to get a member from the supplied echo key
     try:
-        member = Member.objects.get(echo_key=key)
+        member = get_by_key(Member.objects, "echo_key", key)
     except Member.DoesNotExist:
         return render_echo_failed(request, _("invalid"))
     # check if echo key is not expired
@@ -331,7 +332,7 @@ def register(request):
             return render_register_wrong_password(request)
     elif waiter_key:
         try:
-            invitation = InvitationToGroup.objects.get(key=waiter_key)
+            invitation = get_by_key(InvitationToGroup.objects, "key", waiter_key)
             waiter = invitation.waiter
             group = invitation.group
         except InvitationToGroup.DoesNotExist:
@@ -395,7 +396,7 @@ def download_registration_form(request):
         return render_upload_registration_form_invalid(request)
     key = request.GET["key"]
     try:
-        member = Member.all_objects.get(upload_registration_form_key=key)
+        member = get_by_key(Member.all_objects, "upload_registration_form_key", key)
         return render_download_registration_form(request, member)
     except Member.DoesNotExist:
         return render_upload_registration_form_invalid(request)
@@ -425,7 +426,7 @@ def upload_registration_form(request):
             return render_upload_registration_form_invalid(request)
         key = request.GET["key"]
         try:
-            member = Member.all_objects.get(upload_registration_form_key=key)
+            member = get_by_key(Member.all_objects, "upload_registration_form_key", key)
         except Member.DoesNotExist:
             return render_upload_registration_form_invalid(request)
         form = UploadRegistrationForm(instance=member)
@@ -434,7 +435,7 @@ def upload_registration_form(request):
         return render_upload_registration_form_invalid(request)
     key = request.POST["key"]
     try:
-        member = Member.all_objects.get(upload_registration_form_key=key)
+        member = get_by_key(Member.all_objects, "upload_registration_form_key", key)
     except Member.DoesNotExist:
         return render_upload_registration_form_invalid(request)
 
@@ -506,7 +507,7 @@ def invited_registration(request):
     if request.method == "GET" and "key" in request.GET:
         try:
             key = request.GET["key"]
-            invitation = InvitationToGroup.objects.get(key=key)
+            invitation = get_by_key(InvitationToGroup.objects, "key", key)
             waiter = invitation.waiter
             if invitation.is_expired() or invitation.rejected:
                 raise KeyError
@@ -556,7 +557,7 @@ def reject_invitation(request):
     if request.method == "GET" and "key" in request.GET:
         key = request.GET["key"]
         try:
-            invitation = InvitationToGroup.objects.get(key=key)
+            invitation = get_by_key(InvitationToGroup.objects, "key", key)
             if invitation.rejected or invitation.is_expired():
                 raise ValueError
             return render_reject_invitation(request, invitation)
@@ -566,7 +567,7 @@ def reject_invitation(request):
         return render_reject_invalid(request)
     key = request.POST["key"]
     try:
-        invitation = InvitationToGroup.objects.get(key=key)
+        invitation = get_by_key(InvitationToGroup.objects, "key", key)
     except InvitationToGroup.DoesNotExist:
         return render_reject_invalid(request)
     if "reject_invitation" in request.POST:
@@ -614,7 +615,7 @@ def confirm_invitation(request):
     if request.method == "GET" and "key" in request.GET:
         key = request.GET["key"]
         try:
-            invitation = InvitationToGroup.objects.get(key=key)
+            invitation = get_by_key(InvitationToGroup.objects, "key", key)
             if invitation.rejected or invitation.is_expired():
                 raise ValueError
             return render_confirm_invitation(request, invitation)
@@ -624,7 +625,7 @@ def confirm_invitation(request):
         return render_confirm_invalid(request)
     key = request.POST["key"]
     try:
-        invitation = InvitationToGroup.objects.get(key=key)
+        invitation = get_by_key(InvitationToGroup.objects, "key", key)
     except InvitationToGroup.DoesNotExist:
         return render_confirm_invalid(request)
     invitation.confirm()
@@ -635,7 +636,7 @@ def confirm_waiting(request):
     if request.method == "GET" and "key" in request.GET:
         key = request.GET["key"]
         try:
-            waiter = MemberWaitingList.objects.get(wait_confirmation_key=key)
+            waiter = get_by_key(MemberWaitingList.objects, "wait_confirmation_key", key)
         except MemberWaitingList.DoesNotExist:
             return render_waiting_confirmation_invalid(request)
         status = waiter.confirm_waiting(key)
@@ -685,7 +686,7 @@ def leave_waitinglist(request):
     if request.method == "GET" and "key" in request.GET:
         key = request.GET["key"]
         try:
-            waiter = MemberWaitingList.objects.get(leave_key=key)
+            waiter = get_by_key(MemberWaitingList.objects, "leave_key", key)
             return render_leave_waitinglist(request, waiter)
         except (MemberWaitingList.DoesNotExist, MemberWaitingList.MultipleObjectsReturned):
             raise Http404("Waiter with given leave key does not exist.")
@@ -693,7 +694,7 @@ def leave_waitinglist(request):
         raise Http404("Waiter with given leave key does not exist.")
     key = request.POST["key"]
     try:
-        waiter = MemberWaitingList.objects.get(leave_key=key)
+        waiter = get_by_key(MemberWaitingList.objects, "leave_key", key)
     except (MemberWaitingList.DoesNotExist, MemberWaitingList.MultipleObjectsReturned):
         raise Http404("Waiter with given leave key does not exist.")
     if "leave_waitinglist" not in request.POST: